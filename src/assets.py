@@ -0,0 +1,227 @@
+import errno
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from stats import Stats
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+MANIFEST_VERSION = 1
+COPY_MODES = ('copy', 'hardlink', 'reflink')
+FICLONE = 0x40049409  # Linux ioctl asking the filesystem to share extents
+
+class SyncStats(Stats):
+    FIELDS = ('copied_files', 'copied_bytes', 'skipped_files', 'skipped_bytes', 'deleted_files')
+    SUMMARY = ('copied {copied_files} files ({copied_bytes} bytes), '
+               'skipped {skipped_files} files ({skipped_bytes} bytes), '
+               'deleted {deleted_files} files')
+
+def file_hash(path, chunk_size=1 << 20):
+    '''Returns the sha256 hex digest of a file, read in chunks'''
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path):
+    '''Loads a sync manifest, returning an empty one if it is missing or unreadable'''
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('version') != MANIFEST_VERSION:
+        return {}
+    return manifest.get('files', {})
+
+def save_manifest(manifest_path, files):
+    '''Atomically writes the sync manifest'''
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    tmp_path = f'{manifest_path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'files': files}, f, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def walk_files(source_dir):
+    '''Yields (relative path, os.stat_result) for every file under source_dir
+
+    Walks with os.scandir and an explicit stack, which reuses the directory
+    entries' cached type information instead of stat-ing every path twice.
+    '''
+    stack = ['']
+    while stack:
+        rel_dir = stack.pop()
+        with os.scandir(os.path.join(source_dir, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                if entry.is_dir():
+                    stack.append(rel_path)
+                elif entry.is_file():
+                    yield rel_path, entry.stat()
+
+def _copy_contents(source_path, destination_path):
+    '''Copies file contents using the kernel's zero-copy paths when available'''
+    with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
+        size = os.fstat(src.fileno()).st_size
+        offset = 0
+        if hasattr(os, 'copy_file_range'):
+            try:
+                while offset < size:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), size - offset)
+                    if copied == 0:
+                        break
+                    offset += copied
+                return
+            except OSError as e:
+                if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+        if hasattr(os, 'sendfile'):
+            try:
+                while offset < size:
+                    sent = os.sendfile(dst.fileno(), src.fileno(), offset, size - offset)
+                    if sent == 0:
+                        break
+                    offset += sent
+                return
+            except OSError as e:
+                if e.errno not in (errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+                    raise
+        src.seek(offset)
+        dst.seek(offset)
+        shutil.copyfileobj(src, dst)
+
+def _reflink(source_path, destination_path):
+    '''Clones source_path into destination_path, returning False if unsupported'''
+    if fcntl is None:
+        return False
+    with open(source_path, 'rb') as src, open(destination_path, 'wb') as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        except OSError:
+            return False
+    return True
+
+def copy_file(source_path, destination_path, mode='copy'):
+    '''Copies a single file, keeping its mtime
+
+    mode "hardlink" links the destination to the source and "reflink" asks
+    the filesystem for a copy-on-write clone. Both fall back to a regular
+    copy when the source and destination can't share data.
+    '''
+    if mode not in COPY_MODES:
+        raise ValueError(f"copy mode must be one of {COPY_MODES}")
+    if os.path.lexists(destination_path):
+        # Never write through an existing hardlink back into the source
+        os.remove(destination_path)
+    if mode == 'hardlink':
+        try:
+            os.link(source_path, destination_path)
+            return
+        except OSError:
+            pass
+    if mode != 'reflink' or not _reflink(source_path, destination_path):
+        _copy_contents(source_path, destination_path)
+    shutil.copystat(source_path, destination_path)
+
+def copy_files(pairs, workers=None, mode='copy'):
+    '''Copies (source, destination) path pairs on a bounded thread pool'''
+    pairs = list(pairs)
+    for directory in {os.path.dirname(destination) for _, destination in pairs}:
+        os.makedirs(directory, exist_ok=True)
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4)
+    if workers <= 1 or len(pairs) <= 1:
+        for source, destination in pairs:
+            copy_file(source, destination, mode)
+        return
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Consuming the results re-raises the first copy error, if any
+        for _ in executor.map(lambda pair: copy_file(pair[0], pair[1], mode), pairs):
+            pass
+
+def copy_tree(source_dir, destination_dir, workers=None, mode='copy'):
+    '''Replaces destination_dir with a full copy of source_dir, returning a SyncStats'''
+    if not os.path.exists(source_dir):
+        raise Exception("source directory does not exist")
+    if os.path.exists(destination_dir):
+        shutil.rmtree(destination_dir)
+    os.makedirs(destination_dir)
+
+    stats = SyncStats()
+    pairs = []
+    for rel_path, st in walk_files(source_dir):
+        pairs.append((os.path.join(source_dir, rel_path), os.path.join(destination_dir, rel_path)))
+        stats.copied_files += 1
+        stats.copied_bytes += st.st_size
+    copy_files(pairs, workers, mode)
+    return stats
+
+def sync_dir(source_dir, destination_dir, manifest_path, use_hash=False, workers=None, mode='copy'):
+    '''Incrementally mirrors source_dir into destination_dir
+
+    Only files whose size or mtime changed since the last sync (or whose
+    destination copy went missing) are copied. With use_hash, a changed stat
+    is confirmed against the content hash before copying. Files synced
+    previously but no longer in source_dir are deleted, anything else in
+    destination_dir is left alone. Copies run on a thread pool through
+    copy_files. Returns a SyncStats.
+    '''
+    if not os.path.exists(source_dir):
+        raise Exception("source directory does not exist")
+
+    old_manifest = load_manifest(manifest_path)
+    new_manifest = {}
+    stats = SyncStats()
+    pairs = []
+
+    for rel_path, st in walk_files(source_dir):
+        source_path = os.path.join(source_dir, rel_path)
+        destination_path = os.path.join(destination_dir, rel_path)
+        entry = old_manifest.get(rel_path)
+        synced = entry is not None and os.path.exists(destination_path)
+        if synced and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            unchanged = True
+            digest = entry[2]
+        else:
+            unchanged = False
+            digest = None
+        if use_hash and digest is None:
+            digest = file_hash(source_path)
+            unchanged = unchanged or (synced and entry[0] == st.st_size and entry[2] == digest)
+
+        if unchanged:
+            stats.skipped_files += 1
+            stats.skipped_bytes += st.st_size
+        else:
+            pairs.append((source_path, destination_path))
+            stats.copied_files += 1
+            stats.copied_bytes += st.st_size
+        new_manifest[rel_path] = [st.st_size, st.st_mtime_ns, digest]
+
+    copy_files(pairs, workers, mode)
+
+    for rel_path in old_manifest.keys() - new_manifest.keys():
+        remove_file(destination_dir, rel_path)
+        stats.deleted_files += 1
+
+    save_manifest(manifest_path, new_manifest)
+    return stats
+
+def remove_file(root_dir, rel_path):
+    '''Deletes root_dir/rel_path and prunes any directories left empty'''
+    path = os.path.join(root_dir, rel_path)
+    if os.path.exists(path):
+        os.remove(path)
+    parent = os.path.dirname(path)
+    while os.path.abspath(parent) != os.path.abspath(root_dir):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            break
+        parent = os.path.dirname(parent)
@@ -0,0 +1,294 @@
+'''Benchmarks every pipeline stage on a synthetic corpus
+
+Usage: python3 src/benchmark.py [--pages N] [--save-baseline] [--tolerance 0.25]
+
+Each stage reports its best time over --repeat runs, throughput and peak
+traced memory. Results are compared against the stored baseline (by
+default .cache/benchmark-baseline.json, machine specific so not committed)
+and the run exits with status 1 if any stage is slower than the baseline
+by more than the tolerance.
+'''
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from assets import copy_tree
+from build import build_site
+from conversions import iter_blocks, iter_numbered_blocks, text_node_to_html_node, text_to_textnodes
+from corpus import CorpusGenerator
+import htmlnode
+from htmlnode import ParentNode, LeafNode, escape_html
+from markdown import BlockType, classify_block, disable_inline_memo, enable_inline_memo, markdown_to_html_node
+from textnode import TextNode, TextType
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'benchmark-baseline.json')
+
+class StageResult():
+    '''Timing of one stage; with per_item, it is reported as time and memory per item'''
+    def __init__(self, name, seconds, peak_bytes, input_bytes=0, items=0, unit='items', per_item=False):
+        self.name = name
+        self.seconds = seconds
+        self.peak_bytes = peak_bytes
+        self.input_bytes = input_bytes
+        self.items = items
+        self.unit = unit
+        self.per_item = per_item
+
+    def report(self):
+        if self.per_item:
+            item = self.unit[:-1] if self.unit.endswith('s') else self.unit
+            return (f'  {self.name:<38} {self.seconds / self.items * 1e9:10.1f} ns/{item} '
+                    f'{self.peak_bytes / self.items:8.1f} bytes/{item}')
+        rate = f'{self.input_bytes / self.seconds / 1e6:8.2f} MB/s' if self.input_bytes else ' ' * 13
+        count = f'{self.items / self.seconds:12.0f} {self.unit}/s' if self.items else ''
+        return (f'  {self.name:<38} {self.seconds * 1000:10.1f} ms {rate} '
+                f'{self.peak_bytes / 1024 / 1024:8.1f} MiB peak {count}')
+
+def measure(func, repeat=1):
+    '''Runs func, returning (best seconds over repeat runs, peak traced bytes)
+
+    Timing and memory tracing are separate runs since tracemalloc slows
+    allocation-heavy code down considerably.
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+def build_document(sections=2000, paragraphs=10, spans=20):
+    '''Builds a large, moderately nested HTMLNode tree for benchmarking'''
+    section_nodes = []
+    for s in range(sections):
+        paragraph_nodes = []
+        for p in range(paragraphs):
+            children = []
+            for i in range(spans):
+                if i % 4 == 0:
+                    children.append(LeafNode('b', f'bold {s}-{p}-{i}'))
+                elif i % 4 == 1:
+                    children.append(LeafNode('a', f'link {i}', {'href': f'/pages/{s}/{p}'}))
+                else:
+                    children.append(LeafNode(None, f'some plain text number {i} '))
+            paragraph_nodes.append(ParentNode('p', children))
+        section_nodes.append(ParentNode('section', paragraph_nodes))
+    return ParentNode('div', section_nodes)
+
+def inline_texts(blocks):
+    '''Returns the text run through inline parsing for each block, as the renderer would'''
+    texts = []
+    for block in blocks:
+        block_type, _, lines = classify_block(block)
+        if block_type in (BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST):
+            texts.extend(text for _, _, text in lines)  # (depth, tag, text) items
+        elif block_type == BlockType.QUOTE:
+            texts.append('\n'.join(text for _, text in lines))  # (depth, text) lines
+        elif block_type != BlockType.CODE:
+            texts.append('\n'.join(lines))
+    return texts
+
+def bench_pipeline(documents, repeat):
+    '''Times each in-memory pipeline stage separately over documents'''
+    results = []
+    doc_bytes = sum(len(doc.encode('utf-8')) for doc in documents)
+
+    # The splitter the build uses; markdown_to_blocks is no longer on the rendering path
+    seconds, peak = measure(lambda: [list(iter_numbered_blocks(doc)) for doc in documents], repeat)
+    results.append(StageResult('iter_numbered_blocks', seconds, peak, doc_bytes, len(documents), 'pages'))
+    # Large pages are streamed from an mmap, which iter_lines reads like any binary file
+    encoded = [doc.encode('utf-8') for doc in documents]
+    seconds, peak = measure(lambda: [list(iter_numbered_blocks(io.BytesIO(doc))) for doc in encoded], repeat)
+    results.append(StageResult('iter_numbered_blocks, bytes', seconds, peak, doc_bytes, len(documents), 'pages'))
+
+    blocks = [block for doc in documents for block in iter_blocks(doc)]
+    block_bytes = sum(len(block.encode('utf-8')) for block in blocks)
+    seconds, peak = measure(lambda: [classify_block(block) for block in blocks], repeat)
+    results.append(StageResult('block_to_block_type', seconds, peak, block_bytes, len(blocks), 'blocks'))
+
+    texts = inline_texts(blocks)
+    text_bytes = sum(len(text.encode('utf-8')) for text in texts)
+    seconds, peak = measure(lambda: [text_to_textnodes(text) for text in texts], repeat)
+    results.append(StageResult('text_to_textnodes', seconds, peak, text_bytes, len(texts), 'texts'))
+
+    text_nodes = [node for text in texts for node in text_to_textnodes(text)]
+    seconds, peak = measure(lambda: [text_node_to_html_node(node) for node in text_nodes], repeat)
+    results.append(StageResult('text_node_to_html_node', seconds, peak, 0, len(text_nodes), 'nodes'))
+
+    trees = [markdown_to_html_node(doc) for doc in documents]
+    html_bytes = sum(len(tree.to_html().encode('utf-8')) for tree in trees)
+    seconds, peak = measure(lambda: [tree.to_html() for tree in trees], repeat)
+    results.append(StageResult('ParentNode.to_html', seconds, peak, html_bytes, len(trees), 'pages'))
+
+    with open(os.devnull, 'w') as sink:
+        seconds, peak = measure(lambda: [tree.write_to(sink) for tree in trees], repeat)
+    results.append(StageResult('HTMLNode.write_to', seconds, peak, html_bytes, len(trees), 'pages'))
+
+    seconds, peak = measure(lambda: [markdown_to_html_node(doc).to_html() for doc in documents], repeat)
+    results.append(StageResult('render end to end', seconds, peak, doc_bytes, len(documents), 'pages'))
+
+    enable_inline_memo()
+    try:
+        seconds, peak = measure(lambda: [markdown_to_html_node(doc).to_html() for doc in documents], repeat)
+    finally:
+        disable_inline_memo()
+    results.append(StageResult('render end to end, inline memo', seconds, peak, doc_bytes, len(documents), 'pages'))
+    return results
+
+class DictTextNode():
+    '''TextNode as it was before __slots__, kept as a baseline for bench_nodes'''
+    def __init__(self, text, text_type, url=None):
+        self.text = text
+        self.text_type = TextType(text_type)
+        self.url = url
+
+class DictLeafNode():
+    '''LeafNode as it was before __slots__, kept as a baseline for bench_nodes'''
+    def __init__(self, tag, value, props=None):
+        self.tag = tag
+        self.value = value
+        self.children = None
+        self.props = props
+
+def bench_nodes(count, repeat):
+    '''Measures time and memory per node for TextNodes and LeafNodes, against __dict__ based nodes
+
+    Memory is the traced peak of building count nodes, divided by count, so
+    it includes the list holding them (the same 8 bytes per node for both).
+    '''
+    text_types = list(TextType)
+    results = []
+    for name, node_class in (('TextNode()', TextNode), ('TextNode() with __dict__', DictTextNode)):
+        seconds, peak = measure(
+            lambda: [node_class('span text', text_types[i % len(text_types)], '/url') for i in range(count)], repeat)
+        results.append(StageResult(name, seconds, peak, 0, count, 'nodes', per_item=True))
+    for name, node_class in (('LeafNode()', LeafNode), ('LeafNode() with __dict__', DictLeafNode)):
+        seconds, peak = measure(lambda: [node_class('b', 'span text') for _ in range(count)], repeat)
+        results.append(StageResult(name, seconds, peak, 0, count, 'nodes', per_item=True))
+    text_nodes = [TextNode('span text', text_types[i % len(text_types)], '/url') for i in range(count)]
+    seconds, peak = measure(lambda: [text_node_to_html_node(node) for node in text_nodes], repeat)
+    results.append(StageResult('TextNode -> LeafNode', seconds, peak, 0, count, 'nodes', per_item=True))
+    return results
+
+def bench_render_tree(repeat):
+    '''Compares to_html against streaming write_to on one very large tree
+
+    Also times to_html with escaping swapped for a no-op, to show what
+    escaping text and attribute values costs.
+    '''
+    document = build_document()
+    with open(os.devnull, 'w') as sink:
+        to_html = measure(lambda: sink.write(document.to_html()), repeat)
+        write_to = measure(lambda: document.write_to(sink), repeat)
+        htmlnode.escape_html = lambda text: text
+        try:
+            unescaped = measure(lambda: sink.write(document.to_html()), repeat)
+        finally:
+            htmlnode.escape_html = escape_html
+    return [
+        StageResult('large tree to_html', *to_html),
+        StageResult('large tree write_to', *write_to),
+        StageResult('large tree to_html, escaping off', *unescaped),
+    ]
+
+def bench_files(generator, pages, assets, asset_size, repeat):
+    '''Times copy_dir on generated assets and full site builds on generated pages'''
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        static_dir = os.path.join(tmp, 'static')
+        content_dir = os.path.join(tmp, 'content')
+        asset_bytes = generator.write_assets(static_dir, assets, asset_size)
+        content_bytes = generator.write_site(content_dir, pages)
+
+        seconds, peak = measure(lambda: copy_tree(static_dir, os.path.join(tmp, 'public_assets')), repeat)
+        results.append(StageResult('copy_dir', seconds, peak, asset_bytes, assets, 'files'))
+
+        seconds, peak = measure(lambda: build_site(content_dir, os.path.join(tmp, 'serial'), workers=1), repeat)
+        results.append(StageResult('build_site serial', seconds, peak, content_bytes, pages, 'pages'))
+
+        seconds, peak = measure(lambda: build_site(content_dir, os.path.join(tmp, 'parallel')), repeat)
+        results.append(StageResult('build_site parallel', seconds, peak, content_bytes, pages, 'pages'))
+    return results
+
+def compare_to_baseline(results, baseline, tolerance):
+    '''Returns a list of regression messages for stages slower than baseline * (1 + tolerance)'''
+    regressions = []
+    for result in results:
+        expected = baseline.get(result.name)
+        if expected and result.seconds > expected * (1 + tolerance):
+            regressions.append(f'{result.name}: {result.seconds * 1000:.1f} ms vs baseline '
+                               f'{expected * 1000:.1f} ms (+{(result.seconds / expected - 1) * 100:.0f}%)')
+    return regressions
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark every stage of the site generator")
+    parser.add_argument("--pages", type=int, default=200, help="number of synthetic pages")
+    parser.add_argument("--blocks", type=int, default=40, help="blocks per page")
+    parser.add_argument("--inline-density", type=float, default=0.1, help="fraction of decorated words")
+    parser.add_argument("--list-length", type=int, nargs=2, default=(2, 8), help="min and max list items")
+    parser.add_argument("--pathological", type=int, default=20,
+                        help="unmatched bracket/delimiter tokens per paragraph in the pathological corpus")
+    parser.add_argument("--assets", type=int, default=200, help="number of static files to copy")
+    parser.add_argument("--asset-size", type=int, default=64 * 1024, help="size of each static file in bytes")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the best is kept")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown before failing")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    generator = CorpusGenerator(seed=args.seed, blocks=args.blocks, inline_density=args.inline_density,
+                                list_length=tuple(args.list_length))
+    documents = [generator.document() for _ in range(args.pages)]
+    pathological = CorpusGenerator(seed=args.seed, blocks=args.blocks, pathological=args.pathological)
+    pathological_documents = [pathological.document() for _ in range(args.pages)]
+
+    sections = [
+        ('pipeline', bench_pipeline(documents, args.repeat)),
+        ('pathological pipeline', bench_pipeline(pathological_documents, args.repeat)),
+        ('nodes', bench_nodes(200000, args.repeat)),
+        ('render', bench_render_tree(args.repeat)),
+        ('files', bench_files(generator, args.pages, args.assets, args.asset_size, args.repeat)),
+    ]
+    results = []
+    for title, section in sections:
+        print(title)
+        for result in section:
+            if title.startswith('pathological'):
+                result.name = f'pathological {result.name}'
+            print(result.report())
+            results.append(result)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump({result.name: result.seconds for result in results}, f, indent=2, sort_keys=True)
+        print(f'Saved baseline to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'No baseline at {args.baseline}, run with --save-baseline to create one')
+        return 0
+    with open(args.baseline) as f:
+        regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+    if regressions:
+        print('REGRESSIONS:')
+        for regression in regressions:
+            print(f'  {regression}')
+        return 1
+    print(f'No regressions against {args.baseline}')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
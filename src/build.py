@@ -0,0 +1,347 @@
+import copy
+import json
+import mmap
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from markdown import (PageMeta, enable_inline_memo, extract_title, inline_memo, iter_markdown_html,
+                      markdown_to_html_node)
+from assets import load_manifest, remove_file, save_manifest
+from cache import content_key, write_atomic
+from conversions import asset_urls, set_asset_urls, set_image_sizes
+from htmlnode import escape_html
+from shard import in_shard
+from stats import Stats
+from template import load_template
+import instrument
+
+MARKDOWN_EXTENSION = '.md'
+HTML_EXTENSION = '.html'
+CHUNKS_PER_WORKER = 4
+# Bump whenever rendering changes, so cached pages from older builds are not reused
+GENERATOR_VERSION = '7'
+# Pages larger than this are streamed block by block and never cached
+STREAM_THRESHOLD = 32 * 1024 * 1024
+
+class BuildStats(Stats):
+    FIELDS = ('pages', 'cached_pages', 'bytes_read', 'bytes_written', 'memo_hits', 'memo_misses')
+    SUMMARY = ('built {pages} pages ({cached_pages} from cache, '
+               '{bytes_read} bytes read, {bytes_written} bytes written)')
+
+    def add(self, bytes_read, bytes_written, cached=False):
+        self.pages += 1
+        self.cached_pages += cached
+        self.bytes_read += bytes_read
+        self.bytes_written += bytes_written
+
+    def add_memo(self, hits, misses):
+        self.memo_hits += hits
+        self.memo_misses += misses
+
+    def summary(self):
+        summary = super().summary()
+        lookups = self.memo_hits + self.memo_misses
+        if lookups:
+            summary += f', inline memo {self.memo_hits / lookups * 100:.1f}% hit rate'
+        return summary
+
+class RenderOptions():
+    '''How the pages of a build are rendered, passed once to every rendering process
+
+    template_path: template every page is wrapped in
+    memo_size: inline texts each rendering process memoizes (0 is off)
+    asset_urls: fingerprinted URLs that link, image and template URLs are rewritten to
+    image_sizes: dimensions added to images, by URL
+    shard: (i, N) pair, only the pages in_shard are built
+    collect: page_data kinds collected from every page, set by build_site from its indexes
+    '''
+    def __init__(self, template_path=None, memo_size=0, asset_urls=None, image_sizes=None, shard=None):
+        self.template_path = template_path
+        self.memo_size = memo_size
+        self.asset_urls = asset_urls
+        self.image_sizes = image_sizes
+        self.shard = shard
+        self.collect = ()
+
+    def context(self):
+        '''Returns the render_context of pages rendered with these options'''
+        return render_context(self.template_path, self.asset_urls, self.image_sizes)
+
+def find_pages(content_dir):
+    '''Returns (relative path, size) for every markdown file under content_dir, sorted by path'''
+    pages = []
+    for dirpath, _, filenames in os.walk(content_dir):
+        for filename in filenames:
+            if filename.endswith(MARKDOWN_EXTENSION):
+                path = os.path.join(dirpath, filename)
+                pages.append((os.path.relpath(path, content_dir), os.path.getsize(path)))
+    pages.sort()
+    return pages
+
+def output_path_for(public_dir, rel_path):
+    '''Maps content/<path>.md to public/<path>.html'''
+    return os.path.join(public_dir, rel_path[:-len(MARKDOWN_EXTENSION)] + HTML_EXTENSION)
+
+def render_page(markdown, template=None, meta=None):
+    '''Renders a markdown document to an HTML string, wrapped in template if given
+
+    The template's Title slot is filled with the text of the first h1,
+    collected while the blocks are rendered into meta (a new PageMeta by
+    default).
+    '''
+    if meta is None:
+        meta = PageMeta()
+    node = markdown_to_html_node(markdown, meta)
+    with instrument.stage('to_html'):
+        if template is None:
+            return node.to_html()
+        return template.render({'Title': escape_html(meta.title or ''), 'Content': node.iter_html()})
+
+def render_context(template_path=None, asset_urls=None, image_sizes=None):
+    '''Returns a string standing for everything other than its source that a page's HTML depends on'''
+    template = load_template(template_path).source if template_path else ''
+    if not asset_urls and not image_sizes:
+        return template
+    return content_key(template, json.dumps([asset_urls, image_sizes], sort_keys=True))
+
+def set_page_assets(asset_urls=None, image_sizes=None):
+    '''Installs the asset URL rewrites and image sizes for rendering in this process
+
+    Clears the inline memo when either changed, since memoized nodes hold
+    URLs and dimensions from before.
+    '''
+    changed = set_asset_urls(asset_urls)
+    changed = set_image_sizes(image_sizes) or changed
+    memo = inline_memo()
+    if changed and memo is not None:
+        memo.clear()
+
+def page_cache_key(source, context=''):
+    '''Returns the page cache key for a page's source bytes and its render_context'''
+    return content_key(GENERATOR_VERSION, context, source)
+
+def page_template(template_path):
+    '''Returns the compiled page template with the current asset URL rewrites applied, or None'''
+    if not template_path:
+        return None
+    return load_template(template_path).with_asset_urls(asset_urls())
+
+def page_data_cache_key(key, kind):
+    '''Returns the cache key for one kind of page_data of the page cached under key'''
+    return content_key(key, kind)
+
+def page_data(meta):
+    '''Returns what meta collected as {kind: JSON serializable arguments for that index's add_page}
+
+    'links' goes to a LinkIndex, 'search' to a SearchIndex and 'outline' to a PageIndex.
+    '''
+    data = {}
+    if meta.links is not None:
+        data['links'] = [meta.links, sorted(meta.anchors)]
+    if meta.terms is not None:
+        data['search'] = [meta.title, sorted(meta.anchors), meta.terms]
+    if meta.headings is not None:
+        data['outline'] = [meta.title, meta.headings, meta.word_count]
+    return data
+
+def write_page(public_dir, rel_path, html):
+    destination_path = output_path_for(public_dir, rel_path)
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    with open(destination_path, 'wb') as f:
+        f.write(html)
+
+def build_page(content_dir, public_dir, rel_path, cache_path=None, template_path=None, meta=None):
+    '''Renders a single page, returning (bytes read, bytes written)
+
+    When cache_path is given the rendered HTML is also stored there. A given
+    PageMeta is filled in while the page is rendered.
+    '''
+    start = time.perf_counter()
+    source_path = os.path.join(content_dir, rel_path)
+    template = page_template(template_path)
+    if os.path.getsize(source_path) > STREAM_THRESHOLD:
+        bytes_read, bytes_written = stream_page(source_path, output_path_for(public_dir, rel_path), template, meta)
+    else:
+        with instrument.stage('read'):
+            with open(source_path, 'rb') as f:
+                source = f.read()
+        html = render_page(source.decode('utf-8'), template, meta).encode('utf-8')
+        with instrument.stage('write'):
+            write_page(public_dir, rel_path, html)
+            if cache_path:
+                write_atomic(cache_path, html)
+        bytes_read, bytes_written = len(source), len(html)
+    instrument.count('bytes_read', bytes_read)
+    instrument.count('bytes_written', bytes_written)
+    instrument.page(rel_path, time.perf_counter() - start)
+    return bytes_read, bytes_written
+
+def stream_page(source_path, destination_path, template=None, meta=None):
+    '''Renders a large page without holding the document or its HTML in memory'''
+    os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+    with open(source_path, 'rb') as source, open(destination_path, 'w', encoding='utf-8') as destination:
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if template is None:
+                destination.writelines(iter_markdown_html(mapped, meta))
+            else:
+                # The title comes before the content, so it needs its own scan
+                title = escape_html(extract_title(mapped) or '')
+                mapped.seek(0)
+                template.write_to(destination, {'Title': title, 'Content': iter_markdown_html(mapped, meta)})
+    return os.path.getsize(source_path), os.path.getsize(destination_path)
+
+def _build_chunk(content_dir, public_dir, options, jobs, profile=False):
+    '''Process pool entry point, builds a chunk of (path, cache path) jobs in order with RenderOptions
+
+    Returns (results, profiler snapshot, (memo hits, memo misses), page
+    data). With profile, the chunk is instrumented in this process and the
+    snapshot is merged by the caller. The inline memo stays enabled, so
+    later chunks built by this process reuse it. Page data holds the
+    page_data of every page when options collect any, otherwise it is None.
+    '''
+    profiler = instrument.enable() if profile else None
+    memo = inline_memo()
+    if options.memo_size and (memo is None or memo.max_entries != options.memo_size):
+        memo = enable_inline_memo(options.memo_size)
+    set_page_assets(options.asset_urls, options.image_sizes)
+    hits, misses = (memo.hits, memo.misses) if memo else (0, 0)
+    collect = options.collect
+    results = []
+    pages_data = [] if collect else None
+    for rel_path, cache_path in jobs:
+        meta = PageMeta('links' in collect, 'search' in collect, 'outline' in collect) if collect else None
+        results.append(build_page(content_dir, public_dir, rel_path, cache_path, options.template_path, meta))
+        if meta is not None:
+            pages_data.append(page_data(meta))
+    memo_counts = (memo.hits - hits, memo.misses - misses) if memo else (0, 0)
+    if profiler is None:
+        return results, None, memo_counts, pages_data
+    instrument.disable()
+    return results, profiler.snapshot(), memo_counts, pages_data
+
+def chunk_pages(pages, chunk_count):
+    '''Splits (page, size) pairs into about chunk_count runs of similar total size
+
+    Pages stay in their given order, so the chunks (and the results gathered
+    from them) are deterministic.
+    '''
+    total_size = sum(size for _, size in pages) or 1
+    target = total_size / max(chunk_count, 1)
+    chunks = []
+    chunk, chunk_size = [], 0
+    for page, size in pages:
+        chunk.append(page)
+        chunk_size += size
+        if chunk_size >= target:
+            chunks.append(chunk)
+            chunk, chunk_size = [], 0
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def build_site(content_dir, public_dir, workers=None, cache=None, options=None, indexes=None):
+    '''Converts every markdown file in content_dir into the mirrored HTML tree in public_dir
+
+    Pages are rendered with RenderOptions on a process pool, or serially
+    with workers=1, with identical output. A PageCache serves unchanged
+    pages without parsing. indexes maps page_data kinds to the indexes
+    whose add_page takes them; that data is cached alongside each page.
+    Returns a BuildStats.
+    '''
+    if not os.path.exists(content_dir):
+        raise Exception("content directory does not exist")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    stats = BuildStats()
+    indexes = indexes or {}
+    options = copy.copy(options) if options is not None else RenderOptions()
+    options.collect = collect = tuple(sorted(indexes))
+    context = options.context()
+
+    jobs, keys = [], []
+    for rel_path, size in find_pages(content_dir):
+        if not in_shard(rel_path, options.shard):
+            continue
+        key = cache_path = None
+        if cache is not None and size <= STREAM_THRESHOLD:
+            with instrument.stage('page_cache'):
+                with open(os.path.join(content_dir, rel_path), 'rb') as f:
+                    source = f.read()
+                key = page_cache_key(source, context)
+                data, html = {}, None
+                for kind in collect:
+                    cached = cache.read(page_data_cache_key(key, kind))
+                    if cached is None:
+                        break
+                    data[kind] = json.loads(cached)
+                # Without everything collect asks for, the page must be rendered again
+                if len(data) == len(collect):
+                    html = cache.read(key)
+                # One hit or miss per page, its page_data entries are part of the same lookup
+                cache.count_lookup(key, html)
+                if html is not None:
+                    for kind in collect:
+                        cache.touch(page_data_cache_key(key, kind))
+                    write_page(public_dir, rel_path, html)
+            if html is not None:
+                instrument.count('cached_pages')
+                stats.add(len(source), len(html), cached=True)
+                for kind, arguments in data.items():
+                    indexes[kind].add_page(rel_path, *arguments)
+                continue
+            cache_path = cache.entry_path(key)
+        jobs.append(((rel_path, cache_path), size))
+        keys.append(key)
+
+    if workers <= 1 or len(jobs) <= 1:
+        results, _, memo_counts, pages_data = _build_chunk(content_dir, public_dir, options,
+                                                           [job for job, _ in jobs])
+        stats.add_memo(*memo_counts)
+    else:
+        chunks = chunk_pages(jobs, workers * CHUNKS_PER_WORKER)
+        profiler = instrument.active()
+        build_chunk = partial(_build_chunk, content_dir, public_dir, options, profile=profiler is not None)
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as executor:
+            chunk_results = executor.map(build_chunk, chunks)
+            results = []
+            pages_data = [] if collect else None
+            for chunk_result, snapshot, memo_counts, chunk_data in chunk_results:
+                results.extend(chunk_result)
+                if chunk_data is not None:
+                    pages_data.extend(chunk_data)
+                stats.add_memo(*memo_counts)
+                if snapshot is not None:
+                    profiler.merge(snapshot)
+
+    for index, (key, (bytes_read, bytes_written)) in enumerate(zip(keys, results)):
+        stats.add(bytes_read, bytes_written)
+        if key is not None:
+            cache.record(key, bytes_written)
+        if pages_data is not None:
+            for kind, arguments in pages_data[index].items():
+                indexes[kind].add_page(jobs[index][0][0], *arguments)
+                if key is not None:
+                    cache.put(page_data_cache_key(key, kind), json.dumps(arguments).encode('utf-8'))
+    if cache is not None:
+        cache.save()
+    return stats
+
+def prune_pages(content_dir, public_dir, manifest_path, shard=None):
+    '''Deletes the pages in public_dir whose markdown source is gone, returning their paths
+
+    The manifest records every page output of the last build, as sync_dir's
+    does for static files, so only HTML a page build wrote is ever deleted
+    and whatever else is in public_dir is left alone. With shard, only the
+    pages in_shard count as built.
+    '''
+    old_manifest = load_manifest(manifest_path)
+    new_manifest = {}
+    for rel_path, _ in find_pages(content_dir):
+        if in_shard(rel_path, shard):
+            new_manifest[os.path.relpath(output_path_for(public_dir, rel_path), public_dir)] = rel_path
+    removed = sorted(old_manifest.keys() - new_manifest.keys())
+    for rel_path in removed:
+        remove_file(public_dir, rel_path)
+    save_manifest(manifest_path, new_manifest)
+    return removed
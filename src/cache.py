@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+CACHE_INDEX_VERSION = 1
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+def content_key(*parts):
+    '''Returns a sha256 hex digest over the given str/bytes parts'''
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        # Length prefix so ('ab', 'c') and ('a', 'bc') hash differently
+        digest.update(len(part).to_bytes(8, 'little'))
+        digest.update(part)
+    return digest.hexdigest()
+
+def write_atomic(path, data):
+    '''Writes bytes to path via a temporary file and rename, so readers never see partial data'''
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+class PageCache():
+    '''On-disk cache of rendered pages keyed by content hash, with LRU eviction
+
+    Entries live in cache_dir as one file per key. The index of entry sizes,
+    kept in least to most recently used order, is only written by the process
+    that owns the PageCache; worker processes may write entry files with
+    entry_path/write_atomic and report them back through record().
+    '''
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return
+        if index.get('version') != CACHE_INDEX_VERSION:
+            return
+        for key, size in index.get('entries', []):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def save(self):
+        '''Evicts down to max_bytes and persists the index'''
+        self.evict()
+        data = json.dumps({'version': CACHE_INDEX_VERSION, 'entries': list(self.entries.items())})
+        write_atomic(self.index_path, data.encode('utf-8'))
+
+    def entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def get(self, key):
+        '''Returns the cached bytes for key, or None on a miss'''
+        data = self.read(key)
+        if data is None and key in self.entries:
+            self._forget(key)  # Its entry file is gone
+        self.count_lookup(key, data)
+        return data
+
+    def read(self, key):
+        '''Returns the cached bytes for key, or None, without touching the index or counters
+
+        Only the entry file is read, so this can run on an I/O thread while the
+        owner of the cache reports the result with count_lookup.
+        '''
+        if key not in self.entries:
+            return None
+        try:
+            with open(self.entry_path(key), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def count_lookup(self, key, data):
+        '''Counts a read of key that returned data as a hit or a miss, marking hits most recently used'''
+        if data is None:
+            self.misses += 1
+            return
+        self.touch(key)
+        self.hits += 1
+
+    def touch(self, key):
+        '''Marks key most recently used without counting a lookup, for entries read alongside another'''
+        if key in self.entries:
+            self.entries.move_to_end(key)
+
+    def put(self, key, data):
+        '''Stores bytes under key'''
+        write_atomic(self.entry_path(key), data)
+        self.record(key, len(data))
+
+    def record(self, key, size):
+        '''Registers an entry file that was already written, marking it most recently used'''
+        if key in self.entries:
+            self.total_bytes -= self.entries[key]
+        self.entries[key] = size
+        self.entries.move_to_end(key)
+        self.total_bytes += size
+
+    def evict(self):
+        '''Deletes least recently used entries until the cache fits in max_bytes'''
+        while self.entries and self.total_bytes > self.max_bytes:
+            key = next(iter(self.entries))
+            self._forget(key)
+            try:
+                os.remove(self.entry_path(key))
+            except OSError:
+                pass
+            self.evictions += 1
+
+    def _forget(self, key):
+        self.total_bytes -= self.entries.pop(key)
+
+    def summary(self):
+        '''Returns a one line, human readable summary of cache usage'''
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0
+        return (f'{self.hits} hits, {self.misses} misses ({hit_rate:.1f}% hit rate), '
+                f'{self.evictions} evictions, {len(self.entries)} entries ({self.total_bytes} bytes)')
@@ -0,0 +1,57 @@
+'''Thin client for the build daemon started with main.py --daemon
+
+Usage: client.py [--socket PATH] build [main.py options...]
+       client.py [--socket PATH] rebuild PATH...
+       client.py [--socket PATH] status
+       client.py [--socket PATH] stop
+
+Only imports what it needs to talk to the socket, so a request costs an
+interpreter start and a round trip rather than a cold build.
+'''
+import json
+import os
+import socket
+import sys
+
+# Matches main.py's default: .cache/build.sock next to src/
+DEFAULT_SOCKET = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.cache', 'build.sock')
+
+def send(socket_path, request):
+    '''Sends one request to the daemon and returns its response'''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as reader:
+            return json.loads(reader.readline())
+
+def request_for(command, arguments):
+    if command == 'build':
+        return {'command': 'build', 'args': arguments}
+    if command == 'rebuild':
+        return {'command': 'rebuild', 'paths': [os.path.abspath(path) for path in arguments]}
+    if command in ('status', 'stop') and not arguments:
+        return {'command': command}
+    return None
+
+def main(argv):
+    socket_path = DEFAULT_SOCKET
+    if argv[:1] == ['--socket'] and len(argv) > 1:
+        socket_path, argv = argv[1], argv[2:]
+    request = request_for(argv[0], argv[1:]) if argv else None
+    if request is None:
+        sys.stderr.write(__doc__)
+        return 2
+    try:
+        response = send(socket_path, request)
+    except OSError as e:
+        sys.stderr.write(f"can't reach the build daemon at {socket_path}: {e}\n")
+        return 1
+    sys.stdout.write(response.get('output', ''))
+    if 'status' in response:
+        print(json.dumps(response['status'], indent=2))
+    if 'elapsed_ms' in response:
+        print(f"({response['elapsed_ms']:.1f} ms in the daemon)")
+    return 0 if response.get('ok') else 1
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,147 @@
+import hashlib
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from assets import load_manifest, remove_file, save_manifest, walk_files
+from cache import write_atomic
+from stats import Stats
+
+GZIP_EXTENSION = '.gz'
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.mjs', '.json', '.svg', '.xml', '.txt', '.md', '.map')
+DEFAULT_LEVEL = 9
+# Files smaller than this gain too little to be worth a second request path
+DEFAULT_MIN_SIZE = 1024
+# Compressed size / original size above which the .gz is not kept
+DEFAULT_MAX_RATIO = 0.9
+
+class CompressStats(Stats):
+    FIELDS = ('compressed_files', 'unchanged_files', 'small_files', 'poor_ratio_files', 'removed_files',
+              'bytes_in', 'bytes_out')
+    SUMMARY = ('compressed {compressed_files} files ({bytes_in} -> {bytes_out} bytes), '
+               '{unchanged_files} unchanged, skipped {small_files} small and '
+               '{poor_ratio_files} poorly compressing files, removed {removed_files} stale .gz files')
+
+def gzip_bytes(data, level=DEFAULT_LEVEL):
+    '''Returns data in gzip format, with a zeroed header timestamp so output is reproducible'''
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush()
+
+def is_compressible(rel_path):
+    return rel_path.endswith(COMPRESSIBLE_EXTENSIONS)
+
+def _compress_file(path, entry, level, max_ratio):
+    '''Compresses one file unless its manifest entry shows it is unchanged
+
+    Returns (manifest entry, action). The entry [digest, level, compressed
+    size] remembers the compressed size even for files whose .gz is not
+    kept, so a changed max_ratio never forces recompression.
+    '''
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.sha256(data).hexdigest()
+    gz_path = path + GZIP_EXTENSION
+    if entry is not None and entry[0] == digest and entry[1] == level:
+        keep = entry[2] <= len(data) * max_ratio
+        if not keep:
+            if os.path.exists(gz_path):
+                os.remove(gz_path)
+            return entry, 'poor_ratio'
+        if os.path.exists(gz_path):
+            return entry, 'unchanged'
+    compressed = gzip_bytes(data, level)
+    entry = [digest, level, len(compressed)]
+    if len(compressed) > len(data) * max_ratio:
+        if os.path.exists(gz_path):
+            os.remove(gz_path)
+        return entry, 'poor_ratio'
+    write_atomic(gz_path, compressed)
+    return entry, 'compressed'
+
+def compress_dir(public_dir, manifest_path, level=DEFAULT_LEVEL, workers=None,
+                 min_size=DEFAULT_MIN_SIZE, max_ratio=DEFAULT_MAX_RATIO):
+    '''Writes a .gz sibling next to every compressible file in public_dir
+
+    Files whose content hash and level match the manifest keep their
+    existing .gz. Files under min_size, or whose gzip is larger than
+    max_ratio of the original, get no .gz. A .gz written by an earlier
+    run is removed once its file is gone or no longer qualifies. zlib and
+    hashlib release the GIL on large buffers, so files are compressed on
+    a thread pool using every core. Returns a CompressStats.
+    '''
+    if not 0 <= level <= 9:
+        raise ValueError("compression level must be between 0 and 9")
+    old_manifest = load_manifest(manifest_path)
+    new_manifest = {}
+    stats = CompressStats()
+
+    jobs = []
+    for rel_path, st in walk_files(public_dir):
+        if not is_compressible(rel_path):
+            continue
+        if st.st_size < min_size:
+            stats.small_files += 1
+            continue
+        jobs.append((rel_path, st.st_size))
+
+    def compress(job):
+        rel_path, _ = job
+        return _compress_file(os.path.join(public_dir, rel_path), old_manifest.get(rel_path), level, max_ratio)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (rel_path, size), (entry, action) in zip(jobs, executor.map(compress, jobs)):
+            new_manifest[rel_path] = entry
+            if action == 'compressed':
+                stats.compressed_files += 1
+                stats.bytes_in += size
+                stats.bytes_out += entry[2]
+            elif action == 'unchanged':
+                stats.unchanged_files += 1
+            else:
+                stats.poor_ratio_files += 1
+
+    for rel_path in old_manifest.keys() - new_manifest.keys():
+        gz_rel_path = rel_path + GZIP_EXTENSION
+        if os.path.exists(os.path.join(public_dir, gz_rel_path)):
+            remove_file(public_dir, gz_rel_path)
+            stats.removed_files += 1
+
+    save_manifest(manifest_path, new_manifest)
+    return stats
+
+def compress_paths(public_dir, rel_paths, manifest_path, level=DEFAULT_LEVEL,
+                   min_size=DEFAULT_MIN_SIZE, max_ratio=DEFAULT_MAX_RATIO):
+    '''Brings the .gz siblings of a few rewritten or deleted files in public_dir up to date
+
+    For incremental rebuilds, which would otherwise leave a stale .gz of
+    the old content in place. Follows the same rules and manifest as
+    compress_dir, without walking the whole directory. Returns a CompressStats.
+    '''
+    manifest = load_manifest(manifest_path)
+    stats = CompressStats()
+    for rel_path in rel_paths:
+        path = os.path.join(public_dir, rel_path)
+        entry = manifest.pop(rel_path, None)
+        if not is_compressible(rel_path):
+            continue
+        size = os.path.getsize(path) if os.path.exists(path) else None
+        if size is None or size < min_size:
+            if size is not None:
+                stats.small_files += 1
+            if os.path.exists(path + GZIP_EXTENSION):
+                os.remove(path + GZIP_EXTENSION)
+                stats.removed_files += 1
+            continue
+        entry, action = _compress_file(path, entry, level, max_ratio)
+        manifest[rel_path] = entry
+        if action == 'compressed':
+            stats.compressed_files += 1
+            stats.bytes_in += size
+            stats.bytes_out += entry[2]
+        elif action == 'unchanged':
+            stats.unchanged_files += 1
+        else:
+            stats.poor_ratio_files += 1
+    save_manifest(manifest_path, manifest)
+    return stats
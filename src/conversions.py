@@ -1,23 +1,66 @@
 from textnode import TextType, TextNode
-from htmlnode import LeafNode
+from htmlnode import LeafNode, ParentNode
+import instrument
 import re
+from operator import attrgetter
+
+# Original asset URL -> fingerprinted URL, applied to link and image URLs as they are converted
+_asset_urls = {}
+
+def set_asset_urls(asset_urls):
+    '''Sets the asset URL rewrites used by text_node_to_html_node, returning True if they changed'''
+    global _asset_urls
+    asset_urls = asset_urls or {}
+    if asset_urls == _asset_urls:
+        return False
+    _asset_urls = asset_urls
+    return True
+
+def asset_urls():
+    return _asset_urls
+
+# Image URL -> (width, height), added to images as they are converted
+_image_sizes = {}
+
+def set_image_sizes(image_sizes):
+    '''Sets the image dimensions used by text_node_to_html_node, returning True if they changed'''
+    global _image_sizes
+    image_sizes = image_sizes or {}
+    if image_sizes == _image_sizes:
+        return False
+    _image_sizes = image_sizes
+    return True
+
+def _image_props(node):
+    props = {'src': _asset_urls.get(node.url, node.url), 'alt': node.text}
+    size = _image_sizes.get(node.url)
+    if size is not None:
+        props['width'] = str(size[0])
+        props['height'] = str(size[1])
+    return props
+
+_node_text = attrgetter('text')
+
+# TextType -> (tag, value getter, props builder or None)
+TEXT_TYPE_TO_HTML = {
+    TextType.TEXT: (None, _node_text, None),
+    TextType.BOLD: ('b', _node_text, None),
+    TextType.ITALIC: ('i', _node_text, None),
+    TextType.CODE: ('code', _node_text, None),
+    TextType.LINK: ('a', _node_text, lambda node: {'href': _asset_urls.get(node.url, node.url)}),
+    # The alt text goes in the props, images have no content
+    TextType.IMAGE: ('img', lambda node: '', _image_props),
+}
 
 def text_node_to_html_node(text_node):
     '''Converts text node to equivalent HTML node'''
-    if text_node.text_type == TextType.TEXT:
-        return LeafNode(tag=None, value=text_node.text)
-    elif text_node.text_type == TextType.BOLD:
-        return LeafNode(tag='b', value=text_node.text)
-    elif text_node.text_type == TextType.ITALIC:
-        return LeafNode(tag='i', value=text_node.text)
-    elif text_node.text_type == TextType.CODE:
-        return LeafNode(tag='code', value=text_node.text)
-    elif text_node.text_type == TextType.LINK:
-        return LeafNode(tag='a', value=text_node.text, props={'href': text_node.url})
-    elif text_node.text_type == TextType.IMAGE:
-        return LeafNode(tag='img', value='', props={'src': text_node.url, 'alt': text_node.text})
-    else:
+    conversion = TEXT_TYPE_TO_HTML.get(text_node.text_type)
+    if conversion is None:
         raise Exception("text_type is invalid")
+    tag, value_getter, props_builder = conversion
+    if text_node.children is not None:
+        return ParentNode(tag, [text_node_to_html_node(child) for child in text_node.children])
+    return LeafNode(tag, value_getter(text_node), props_builder(text_node) if props_builder else None)
     
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     '''Splits text type nodes based on text_type syntax'''
@@ -102,19 +145,182 @@ def split_nodes_link(old_nodes):
             
     return new_nodes
 
-def text_to_textnodes(text):
-    '''Takes a string with markdown text and returns a list of TextNodes'''
-    node = TextNode(text, TextType.TEXT)
-    nodes = split_nodes_image([node])
-    nodes = split_nodes_link(nodes)
-    nodes = split_all_delimiters(nodes)
+INLINE_TOKEN_PATTERN = re.compile(r'!\[|\[|`|\*\*|_')
+INLINE_DELIMITERS = {
+    '`': TextType.CODE,
+    '**': TextType.BOLD,
+    '_': TextType.ITALIC,
+}
+
+class _ForwardFinder():
+    '''Memoized str.find for searches whose start position never moves backwards'''
+    def __init__(self, text):
+        self.text = text
+        self.found = {}
+
+    def find(self, needle, start):
+        '''Returns the first index of needle at or after start, or -1'''
+        last = self.found.get(needle)
+        if last is not None and (last == -1 or last >= start):
+            return last
+        last = self.text.find(needle, start)
+        self.found[needle] = last
+        return last
+
+def _match_bracket_pair(text, finder, start):
+    '''Matches [alt](url) with the "[" at start, returning (alt, url, end) or None'''
+    line_end = finder.find('\n', start)
+    if line_end == -1:
+        line_end = len(text)
+    middle = finder.find('](', start + 1)
+    if middle == -1 or middle >= line_end:
+        return None
+    close = finder.find(')', middle + 2)
+    if close == -1 or close >= line_end:
+        return None
+    return text[start + 1:middle], text[middle + 2:close], close + 1
+
+def _intraword(text, index):
+    '''Whether the character at index has a letter or digit on both sides, as in snake_case'''
+    return 0 < index < len(text) - 1 and text[index - 1].isalnum() and text[index + 1].isalnum()
 
+def _nested_textnodes(inner, offset, links):
+    '''Returns the children of a span with text inner at offset, or None when it is plain text'''
+    inner_links = [] if links is not None else None
+    children = text_to_textnodes(inner, inner_links)
+    if len(children) == 1 and children[0].text_type == TextType.TEXT:
+        return None
+    if links is not None:
+        links.extend((offset + link_offset, node) for link_offset, node in inner_links)
+    return children
+
+def text_to_textnodes(text, links=None):
+    '''Takes a string with markdown text and returns a list of TextNodes
+
+    Scans the text once from left to right. Every search for a closing token
+    starts after the previous one, so the whole scan is linear in the length
+    of the text. Unmatched delimiters are kept as literal text, and so are
+    empty pairs such as ____ and an _ inside a word, which neither opens nor
+    closes italics. The text of a bold or italic span is scanned again for
+    links, images, code and the other emphasis, which become its children;
+    a span can't contain its own delimiter, so that is at most two more
+    scans. When a links list is given, (offset in text, node) is appended to
+    it for every link and image found.
+    '''
+    nodes = []
+    finder = _ForwardFinder(text)
+    literal_start = 0
+    pos = 0
+    while True:
+        match = INLINE_TOKEN_PATTERN.search(text, pos)
+        if match is None:
+            break
+        token, start = match.group(), match.start()
+        node = None
+        if token == '![' or token == '[':
+            if token == '[' and start > 0 and text[start - 1] == '!':
+                # Left over from a failed image; links can't follow a "!"
+                pos = start + 1
+                continue
+            bracket = start + 1 if token == '![' else start
+            pair = _match_bracket_pair(text, finder, bracket)
+            if pair and token == '[' and -1 < finder.find('![', start + 1) < start + 1 + len(pair[0]):
+                # Images take precedence over a link wrapped around them
+                pair = None
+            if pair:
+                alt_text, url, end = pair
+                text_type = TextType.IMAGE if token == '![' else TextType.LINK
+                node = TextNode(alt_text, text_type, url)
+                if links is not None:
+                    links.append((start, node))
+        elif token != '_' or not _intraword(text, start):
+            close = finder.find(token, start + len(token))
+            while token == '_' and close != -1 and _intraword(text, close):
+                close = finder.find(token, close + 1)
+            inner_start = start + len(token)
+            if close == inner_start:
+                # An empty pair, as in __init__ or ****, stays literal text
+                pos = close + len(token)
+                continue
+            if close != -1:
+                inner = text[inner_start:close]
+                node = TextNode(inner, INLINE_DELIMITERS[token])
+                end = close + len(token)
+                if token != '`' and INLINE_TOKEN_PATTERN.search(inner):
+                    node.children = _nested_textnodes(inner, inner_start, links)
+
+        if node is None:
+            # Unmatched token, keep it as literal text
+            pos = start + 1
+            continue
+        if start > literal_start:
+            nodes.append(TextNode(text[literal_start:start], TextType.TEXT))
+        nodes.append(node)
+        literal_start = pos = end
+
+    if literal_start < len(text):
+        nodes.append(TextNode(text[literal_start:], TextType.TEXT))
+    instrument.count('text_nodes', len(nodes))
     return nodes
 
 def markdown_to_blocks(markdown):
     '''Splits a markdown string into a list of blocks'''
     return [block.strip() for block in markdown.split('\n\n') if block.strip()]
 
+def iter_lines(source):
+    '''Lazily yields the lines of a str, text file, binary file or mmap, without line endings'''
+    if isinstance(source, str):
+        start = 0
+        while start < len(source):
+            end = source.find('\n', start)
+            if end == -1:
+                end = len(source)
+            yield source[start:end]
+            start = end + 1
+        return
+    # mmap objects can't be iterated by line, but they share readline with files
+    line = source.readline()
+    while line:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        yield line[:-1] if line.endswith('\n') else line
+        line = source.readline()
+
+def iter_blocks(source):
+    '''Lazily yields the same blocks as markdown_to_blocks from a str, file object or mmap
+
+    Only the lines of the current block are held in memory, so peak memory is
+    proportional to the largest block rather than to the whole document.
+    '''
+    for _, block in iter_numbered_blocks(source):
+        yield block
+
+def _numbered_block(lines, first_line):
+    text = '\n'.join(lines)
+    block = text.strip()
+    if not block:
+        return None
+    # Lines of whitespace stripped from the front of the block don't count
+    return first_line + text.count('\n', 0, text.find(block[0])), block
+
+def iter_numbered_blocks(source):
+    '''Like iter_blocks, but yields (line number of the block's first line, block)'''
+    lines = []
+    first_line = 1
+    for number, line in enumerate(iter_lines(source), start=1):
+        if line:
+            if not lines:
+                first_line = number
+            lines.append(line)
+            continue
+        numbered = _numbered_block(lines, first_line)
+        lines = []
+        if numbered:
+            yield numbered
+    numbered = _numbered_block(lines, first_line)
+    if numbered:
+        yield numbered
+
 
 # markdown = """
 # This is **bolded** paragraph
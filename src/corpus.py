@@ -0,0 +1,101 @@
+import os
+import random
+
+WORDS = (
+    'the quick brown fox jumps over lazy dog hobbit ring shire wizard mountain '
+    'river forest dragon elf dwarf road journey fellowship tower shadow light'
+).split()
+DEFAULT_BLOCK_MIX = {
+    'paragraph': 6,
+    'heading': 2,
+    'code': 1,
+    'quote': 1,
+    'unordered_list': 1,
+    'ordered_list': 1,
+}
+PATHOLOGICAL_PATTERNS = ('[', '![', '](', '_', '**', '`')
+
+class CorpusGenerator():
+    '''Deterministic generator of synthetic markdown documents
+
+    blocks: blocks per document
+    block_mix: relative weights of each block type
+    inline_density: fraction of words wrapped in bold/italic/code/link/image
+    list_length: (min, max) items per list
+    pathological: unmatched bracket/delimiter tokens sprinkled into each paragraph
+    '''
+    def __init__(self, seed=0, blocks=40, block_mix=None, inline_density=0.1,
+                 words_per_paragraph=(20, 80), list_length=(2, 8), pathological=0):
+        self.random = random.Random(seed)
+        self.blocks = blocks
+        self.block_mix = block_mix or DEFAULT_BLOCK_MIX
+        self.inline_density = inline_density
+        self.words_per_paragraph = words_per_paragraph
+        self.list_length = list_length
+        self.pathological = pathological
+
+    def word(self):
+        return self.random.choice(WORDS)
+
+    def inline_word(self):
+        word = self.word()
+        if self.random.random() >= self.inline_density:
+            return word
+        kind = self.random.randrange(5)
+        if kind == 0:
+            return f'**{word}**'
+        if kind == 1:
+            return f'_{word}_'
+        if kind == 2:
+            return f'`{word}`'
+        if kind == 3:
+            return f'[{word}](https://example.com/{word})'
+        return f'![{word}](/images/{word}.png)'
+
+    def text(self, word_count):
+        words = [self.inline_word() for _ in range(word_count)]
+        for _ in range(self.pathological):
+            words.insert(self.random.randrange(len(words) + 1), self.random.choice(PATHOLOGICAL_PATTERNS))
+        return ' '.join(words)
+
+    def block(self, block_type):
+        if block_type == 'heading':
+            return '#' * self.random.randint(1, 6) + ' ' + self.text(self.random.randint(2, 8))
+        if block_type == 'code':
+            lines = [' '.join(self.word() for _ in range(6)) for _ in range(self.random.randint(1, 10))]
+            return '```\n' + '\n'.join(lines) + '\n```'
+        if block_type == 'quote':
+            return '\n'.join(f'> {self.text(12)}' for _ in range(self.random.randint(1, 4)))
+        if block_type == 'unordered_list':
+            return '\n'.join(f'- {self.text(8)}' for _ in range(self.random.randint(*self.list_length)))
+        if block_type == 'ordered_list':
+            return '\n'.join(f'{i}. {self.text(8)}' for i in range(1, self.random.randint(*self.list_length) + 1))
+        return self.text(self.random.randint(*self.words_per_paragraph))
+
+    def document(self):
+        '''Returns one markdown document'''
+        types = list(self.block_mix)
+        weights = [self.block_mix[block_type] for block_type in types]
+        chosen = self.random.choices(types, weights=weights, k=self.blocks)
+        return '\n\n'.join(self.block(block_type) for block_type in chosen) + '\n'
+
+    def write_site(self, content_dir, pages, pages_per_dir=100):
+        '''Writes pages documents into content_dir, returning their total size in bytes'''
+        total = 0
+        for i in range(pages):
+            path = os.path.join(content_dir, f'section{i // pages_per_dir}', f'page{i}.md')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            data = self.document().encode('utf-8')
+            with open(path, 'wb') as f:
+                f.write(data)
+            total += len(data)
+        return total
+
+    def write_assets(self, static_dir, files, size):
+        '''Writes files random binary assets of size bytes into static_dir'''
+        for i in range(files):
+            path = os.path.join(static_dir, f'dir{i % 10}', f'asset{i}.bin')
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(self.random.randbytes(size))
+        return files * size
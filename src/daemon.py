@@ -0,0 +1,130 @@
+import gc
+import io
+import json
+import os
+import resource
+import socket
+import sys
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+
+SOCKET_NAME = 'build.sock'
+# After a trim, the caches are trimmed again once the process grew by another 1/TRIM_HEADROOM of max_memory
+TRIM_HEADROOM = 8
+
+def memory_usage():
+    '''Returns (current, peak) resident set size of this process in bytes'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':  # kilobytes everywhere but macOS
+        peak *= 1024
+    try:
+        with open('/proc/self/statm') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        current = peak
+    return current, peak
+
+class BuildDaemon():
+    '''Serves build requests from a Unix domain socket in one long lived process
+
+    Requests and responses are single lines of JSON. The builder does the
+    work and keeps its caches warm between requests: it needs build(argv),
+    rebuild(paths), status() and trim() methods. After a request leaves
+    the process using more than max_memory bytes, the builder is asked to
+    trim its in memory caches. CPython rarely returns freed memory to the
+    system, so the process may stay above max_memory after a trim; it is
+    only trimmed again once it has grown past what it used right after the
+    last trim, rather than after every request.
+    '''
+    def __init__(self, socket_path, builder, max_memory=None):
+        self.socket_path = socket_path
+        self.builder = builder
+        self.max_memory = max_memory
+        self.requests = 0
+        self.trims = 0
+        self.trim_above = max_memory
+        self.running = False
+
+    def handle(self, request):
+        '''Runs one request, returning the response with everything it printed as its output'''
+        command = request.get('command')
+        start = time.perf_counter()
+        output = io.StringIO()
+        response = {'ok': True}
+        try:
+            with redirect_stdout(output), redirect_stderr(output):
+                if command == 'build':
+                    self.builder.build(request.get('args', []))
+                elif command == 'rebuild':
+                    targets = self.builder.rebuild(request.get('paths', []))
+                    print(f"Rebuilt {len(targets)} outputs: " + ', '.join(rel_path for _, rel_path in targets))
+                elif command == 'status':
+                    response['status'] = self.status()
+                elif command == 'stop':
+                    self.running = False
+                    print("Stopping")
+                else:
+                    raise ValueError(f'unknown command {command!r}')
+        except SystemExit as e:
+            response['ok'] = e.code in (None, 0)
+            if e.code not in (None, 0):
+                output.write(f'{e.code}\n')
+        except Exception:
+            response['ok'] = False
+            output.write(traceback.format_exc())
+        self.requests += 1
+        current, _ = memory_usage()
+        if self.max_memory is not None and current > self.trim_above:
+            self.builder.trim()
+            gc.collect()
+            self.trims += 1
+            trimmed, _ = memory_usage()
+            self.trim_above = max(self.max_memory, trimmed + self.max_memory // TRIM_HEADROOM)
+        response['output'] = output.getvalue()
+        response['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return response
+
+    def status(self):
+        current, peak = memory_usage()
+        return {
+            'pid': os.getpid(),
+            'requests': self.requests,
+            'memory_bytes': current,
+            'peak_memory_bytes': peak,
+            'max_memory_bytes': self.max_memory,
+            'trims': self.trims,
+            'caches': self.builder.status(),
+        }
+
+    def serve_connection(self, connection):
+        with connection.makefile('rb') as reader:
+            line = reader.readline()
+        try:
+            request = json.loads(line)
+        except ValueError:
+            response = {'ok': False, 'output': 'malformed request\n'}
+        else:
+            response = self.handle(request)
+        connection.sendall(json.dumps(response).encode('utf-8') + b'\n')
+
+    def serve(self):
+        '''Accepts and answers requests one at a time until a stop request'''
+        if os.path.exists(self.socket_path):
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                if probe.connect_ex(self.socket_path) == 0:
+                    raise Exception(f"a build daemon is already listening on {self.socket_path}")
+            os.remove(self.socket_path)  # left behind by a daemon that didn't exit cleanly
+        os.makedirs(os.path.dirname(self.socket_path) or '.', exist_ok=True)
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+            server.bind(self.socket_path)
+            server.listen()
+            self.running = True
+            print(f"Build daemon listening on {self.socket_path}", flush=True)
+            try:
+                while self.running:
+                    connection, _ = server.accept()
+                    with connection:
+                        self.serve_connection(connection)
+            finally:
+                os.remove(self.socket_path)
@@ -0,0 +1,92 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from assets import copy_file, copy_files, file_hash, load_manifest, remove_file, save_manifest, walk_files
+from cache import write_atomic
+from stats import Stats
+
+DIGEST_LENGTH = 8
+ASSET_MANIFEST_NAME = 'asset-manifest.json'
+
+class FingerprintStats(Stats):
+    FIELDS = ('hashed_files', 'cached_hashes', 'copied_files', 'removed_files')
+    SUMMARY = ('hashed {hashed_files} files ({cached_hashes} unchanged), '
+               'copied {copied_files} fingerprinted files, removed {removed_files} stale ones')
+
+def fingerprinted_path(rel_path, digest):
+    '''Maps images/tolkien.png to images/tolkien.<digest prefix>.png'''
+    directory, name = os.path.split(rel_path)
+    stem, extension = os.path.splitext(name)
+    return os.path.join(directory, f'{stem}.{digest[:DIGEST_LENGTH]}{extension}')
+
+def asset_url(rel_path):
+    '''Returns the site absolute URL a static file is served at'''
+    return '/' + rel_path.replace(os.sep, '/')
+
+def write_asset_manifest(public_dir, asset_urls):
+    data = json.dumps(asset_urls, indent=2, sort_keys=True)
+    write_atomic(os.path.join(public_dir, ASSET_MANIFEST_NAME), data.encode('utf-8'))
+
+def fingerprint_file(static_dir, public_dir, rel_path, mode='copy'):
+    '''Hashes one static file and copies it to its fingerprinted name, returning that relative path'''
+    source_path = os.path.join(static_dir, rel_path)
+    hashed_path = fingerprinted_path(rel_path, file_hash(source_path))
+    destination_path = os.path.join(public_dir, hashed_path)
+    if not os.path.exists(destination_path):
+        os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+        copy_file(source_path, destination_path, mode)
+    return hashed_path
+
+def fingerprint_assets(static_dir, public_dir, cache_path, workers=None, mode='copy'):
+    '''Copies every static file to a content addressed name alongside its original
+
+    Hashes are cached in cache_path by size and mtime, so unchanged files are
+    not rehashed, and fingerprinted copies that already exist are not copied
+    again. Copies left over from older versions of a file are removed.
+    Writes public_dir/asset-manifest.json and returns ({original URL:
+    fingerprinted URL}, FingerprintStats).
+    '''
+    if not os.path.exists(static_dir):
+        raise Exception("source directory does not exist")
+    old_hashes = load_manifest(cache_path)
+    new_hashes = {}
+    stats = FingerprintStats()
+
+    to_hash = []
+    for rel_path, st in walk_files(static_dir):
+        entry = old_hashes.get(rel_path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            new_hashes[rel_path] = entry
+            stats.cached_hashes += 1
+        else:
+            to_hash.append((rel_path, st))
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = [os.path.join(static_dir, rel_path) for rel_path, _ in to_hash]
+        for (rel_path, st), digest in zip(to_hash, executor.map(file_hash, paths)):
+            new_hashes[rel_path] = [st.st_size, st.st_mtime_ns, digest]
+            stats.hashed_files += 1
+
+    asset_urls = {}
+    pairs = []
+    for rel_path, (_, _, digest) in sorted(new_hashes.items()):
+        hashed_path = fingerprinted_path(rel_path, digest)
+        asset_urls[asset_url(rel_path)] = asset_url(hashed_path)
+        destination_path = os.path.join(public_dir, hashed_path)
+        if not os.path.exists(destination_path):
+            pairs.append((os.path.join(static_dir, rel_path), destination_path))
+    copy_files(pairs, workers, mode)
+    stats.copied_files = len(pairs)
+
+    for rel_path, (_, _, digest) in old_hashes.items():
+        entry = new_hashes.get(rel_path)
+        if entry is None or entry[2] != digest:
+            hashed_path = fingerprinted_path(rel_path, digest)
+            if os.path.exists(os.path.join(public_dir, hashed_path)):
+                remove_file(public_dir, hashed_path)
+                stats.removed_files += 1
+
+    save_manifest(cache_path, new_hashes)
+    write_asset_manifest(public_dir, asset_urls)
+    return asset_urls, stats
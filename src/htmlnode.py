@@ -1,4 +1,25 @@
+# One translate table escapes both text and (double quoted) attribute values
+_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+def escape_html(text):
+    '''Escapes &, <, > and " in text, returning it unchanged when there is nothing to escape'''
+    # Four C level scans are much cheaper than translate, and most text has none of these
+    if '&' in text or '<' in text or '>' in text or '"' in text:
+        return text.translate(_ESCAPES)
+    return text
+
+# Serialized attribute strings keyed by the props' items, so identical props
+# (every link to the same page, every image with the same alt) are built once.
+# Keying on the current items keeps this correct if a props dict is mutated.
+PROPS_CACHE_SIZE = 4096
+_props_html = {}
+
+def clear_props_cache():
+    _props_html.clear()
+
 class HTMLNode():
+    __slots__ = ('tag', 'value', 'children', 'props')
+
     def __init__(self, tag=None, value=None, children=None, props=None):
         self.tag = tag  # str representing HTML tag name (p/a/h1/etc.)
         self.value = value  # str representing value inside the tag
@@ -6,41 +27,99 @@ class HTMLNode():
         self.props = props  # dict of HTML tag attributes (ex: href:url)
 
     def to_html(self):
-        '''TODO'''
+        '''Renders the node and its children as a single HTML string'''
+        return ''.join(self.iter_html())
+
+    def open_html(self):
+        '''Returns the HTML emitted before this node's children'''
+        raise NotImplementedError
+
+    def close_html(self):
+        '''Returns the HTML emitted after this node's children'''
         raise NotImplementedError
+
+    def iter_html(self):
+        '''Yields the HTML for this node in chunks, walking the tree without recursion'''
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if isinstance(node, str):
+                yield node
+                continue
+            yield node.open_html()
+            if node.children:
+                stack.append(node.close_html())
+                stack.extend(reversed(node.children))
+
+    def write_to(self, stream):
+        '''Streams the HTML for this node into a file-like object'''
+        stream.writelines(self.iter_html())
     
     def props_to_html(self):
         if not self.props:
             return ''
-        return ''.join(f' {k}="{v}"' for k,v in self.props.items())
+        key = tuple(self.props.items())
+        if 'id' in self.props:  # unique per page, caching them would only evict reusable entries
+            return ''.join(f' {k}="{escape_html(str(v))}"' for k,v in key)
+        try:
+            html = _props_html.get(key)
+        except TypeError:  # unhashable prop value, serialize without caching
+            return ''.join(f' {k}="{escape_html(str(v))}"' for k,v in key)
+        if html is None:
+            html = ''.join(f' {k}="{escape_html(str(v))}"' for k,v in key)
+            if len(_props_html) >= PROPS_CACHE_SIZE:
+                _props_html.clear()
+            _props_html[key] = html
+        return html
     
     def __repr__(self):
         return f'tag: {self.tag}\nvalue: {self.value}\nchildren: {self.children}\nprops: {self.props}'  
     
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, value, props=None):
-        super().__init__(tag=tag, value=value, children=None, props=props)
+        # Assigned directly rather than through HTMLNode.__init__, leaves are built per inline span
+        self.tag = tag
+        self.value = value
+        self.children = None
+        self.props = props
 
     def to_html(self):
         '''Renders a lead node as an HTML string'''
-        if not self.value:
+        # Images legitimately have an empty value, only a missing one is an error
+        if self.value is None:
             raise ValueError("missing value")
         
         if not self.tag:
-            return self.value
+            return escape_html(self.value)
         
-        return f'<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>'
+        return f'<{self.tag}{self.props_to_html()}>{escape_html(self.value)}</{self.tag}>'
+
+    def open_html(self):
+        '''Leaf nodes have no children, so their whole HTML is emitted up front'''
+        return self.to_html()
+
+    def close_html(self):
+        return ''
     
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props=None):
-        super().__init__(tag=tag, value=None, children=children, props=props)
+        self.tag = tag
+        self.value = None
+        self.children = children
+        self.props = props
 
-    def to_html(self):
+    def open_html(self):
         if not self.tag:
             raise ValueError("missing tag")
         
         if not self.children:
             raise ValueError("missing children")
         
-        child_html = ''.join(child.to_html() for child in self.children)
-        return f'<{self.tag}{self.props_to_html()}>{child_html}</{self.tag}>'
\ No newline at end of file
+        return f'<{self.tag}{self.props_to_html()}>'
+
+    def close_html(self):
+        return f'</{self.tag}>'
@@ -0,0 +1,99 @@
+import os
+import struct
+from assets import load_manifest, save_manifest, walk_files
+from fingerprint import asset_url
+from stats import Stats
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+# Bytes needed to read PNG, GIF and WebP dimensions; JPEG is walked segment by segment
+HEADER_SIZE = 30
+# JPEG start of frame markers, which carry the dimensions (C4, C8 and CC are not frames)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+class ImageIndexStats(Stats):
+    FIELDS = ('read_files', 'cached_files', 'unknown_files')
+    SUMMARY = ('read {read_files} image headers ({cached_files} unchanged, '
+               '{unknown_files} without readable dimensions)')
+
+def _jpeg_size(f):
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        if marker[1] == 0xFF:  # fill byte, the marker starts one byte later
+            f.seek(-1, os.SEEK_CUR)
+            continue
+        if marker[1] in (0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7):
+            continue  # standalone markers have no length
+        length = f.read(2)
+        if len(length) < 2:
+            return None
+        if marker[1] in JPEG_SOF_MARKERS:
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack('>HH', frame[1:5])
+            return width, height
+        f.seek(struct.unpack('>H', length)[0] - 2, os.SEEK_CUR)
+
+def read_image_size(path):
+    '''Returns (width, height) from a PNG, JPEG, GIF or WebP file's header, or None
+
+    Only the header bytes are read (for JPEG, the segment headers up to the
+    frame header), the image data is never decoded.
+    '''
+    with open(path, 'rb') as f:
+        head = f.read(HEADER_SIZE)
+        if head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+        if head[:6] in (b'GIF87a', b'GIF89a'):
+            return struct.unpack('<HH', head[6:10])
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            chunk = head[12:16]
+            if chunk == b'VP8 ' and head[23:26] == b'\x9d\x01\x2a':
+                width, height = struct.unpack('<HH', head[26:30])
+                return width & 0x3FFF, height & 0x3FFF
+            if chunk == b'VP8L' and head[20:21] == b'\x2f':
+                bits = int.from_bytes(head[21:25], 'little')
+                return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+            if chunk == b'VP8X':
+                return int.from_bytes(head[24:27], 'little') + 1, int.from_bytes(head[27:30], 'little') + 1
+            return None
+        if head[:2] == b'\xff\xd8':
+            return _jpeg_size(f)
+    return None
+
+def index_image_sizes(static_dir, index_path):
+    '''Updates the persisted image dimension index for static_dir
+
+    Entries are [size, mtime_ns, width, height] keyed by relative path, so
+    only new or changed images have their headers read. Returns ({image URL:
+    (width, height)}, ImageIndexStats), leaving out images whose dimensions
+    couldn't be read.
+    '''
+    old_index = load_manifest(index_path)
+    new_index = {}
+    stats = ImageIndexStats()
+    for rel_path, st in walk_files(static_dir):
+        if not rel_path.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        entry = old_index.get(rel_path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            stats.cached_files += 1
+        else:
+            try:
+                size = read_image_size(os.path.join(static_dir, rel_path))
+            except (OSError, struct.error):
+                size = None
+            entry = [st.st_size, st.st_mtime_ns] + list(size or (None, None))
+            stats.read_files += 1
+        if entry[2] is None:
+            stats.unknown_files += 1
+        new_index[rel_path] = entry
+    save_manifest(index_path, new_index)
+    image_sizes = {
+        asset_url(rel_path): (entry[2], entry[3])
+        for rel_path, entry in sorted(new_index.items()) if entry[2] is not None
+    }
+    return image_sizes, stats
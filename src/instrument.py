@@ -0,0 +1,130 @@
+import contextlib
+import heapq
+import json
+import os
+import time
+
+DEFAULT_SLOWEST = 10
+
+class Profiler():
+    '''Collects per-stage wall/CPU time, counters and per-page timings for one build'''
+    def __init__(self, slowest=DEFAULT_SLOWEST):
+        self.slowest = slowest
+        self.stages = {}    # name -> [wall seconds, cpu seconds, calls]
+        self.counters = {}  # name -> int
+        self.page_times = []  # min-heap of (wall seconds, path), at most `slowest` long
+        self.pages = 0
+        self.started = time.perf_counter()
+
+    def stage(self, name):
+        return _Stage(self, name)
+
+    def add_stage(self, name, wall, cpu, calls=1):
+        totals = self.stages.get(name)
+        if totals is None:
+            self.stages[name] = [wall, cpu, calls]
+        else:
+            totals[0] += wall
+            totals[1] += cpu
+            totals[2] += calls
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def page(self, path, wall):
+        '''Records a page's render time, keeping only the slowest pages'''
+        self.pages += 1
+        if len(self.page_times) < self.slowest:
+            heapq.heappush(self.page_times, (wall, path))
+        elif self.page_times and wall > self.page_times[0][0]:
+            heapq.heapreplace(self.page_times, (wall, path))
+
+    def snapshot(self):
+        '''Returns the collected data as plain, picklable values'''
+        return {
+            'stages': self.stages,
+            'counters': self.counters,
+            'page_times': self.page_times,
+            'pages': self.pages,
+        }
+
+    def merge(self, snapshot):
+        '''Adds a snapshot taken in another process, such as a build worker'''
+        for name, (wall, cpu, calls) in snapshot['stages'].items():
+            self.add_stage(name, wall, cpu, calls)
+        for name, amount in snapshot['counters'].items():
+            self.count(name, amount)
+        pages = self.pages
+        for wall, path in snapshot['page_times']:
+            self.page(path, wall)
+        self.pages = pages + snapshot['pages']
+
+    def report(self):
+        '''Returns the JSON serializable build report'''
+        return {
+            'wall_seconds': time.perf_counter() - self.started,
+            'stages': {
+                name: {'wall_seconds': wall, 'cpu_seconds': cpu, 'calls': calls}
+                for name, (wall, cpu, calls) in sorted(self.stages.items())
+            },
+            'counters': dict(sorted(self.counters.items())),
+            'pages': self.pages,
+            'slowest_pages': [
+                {'path': path, 'wall_seconds': wall}
+                for wall, path in sorted(self.page_times, reverse=True)
+            ],
+        }
+
+    def write_report(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+class _Stage():
+    __slots__ = ('profiler', 'name', 'wall', 'cpu')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add_stage(self.name, time.perf_counter() - self.wall, time.process_time() - self.cpu)
+        return False
+
+# Instrumentation is off unless a Profiler is enabled. The helpers below are
+# what the pipeline calls; while disabled they cost a global lookup and return.
+_active = None
+_NULL_STAGE = contextlib.nullcontext()
+
+def enable(slowest=DEFAULT_SLOWEST):
+    '''Starts collecting into a new Profiler and returns it'''
+    global _active
+    _active = Profiler(slowest)
+    return _active
+
+def disable():
+    global _active
+    _active = None
+
+def active():
+    '''Returns the active Profiler, or None when instrumentation is off'''
+    return _active
+
+def stage(name):
+    '''Context manager timing a named stage, a shared no-op while disabled'''
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+def count(name, amount=1):
+    if _active is not None:
+        _active.count(name, amount)
+
+def page(path, wall):
+    if _active is not None:
+        _active.page(path, wall)
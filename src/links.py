@@ -0,0 +1,103 @@
+import os
+import posixpath
+from urllib.parse import unquote
+from assets import walk_files
+from build import HTML_EXTENSION, MARKDOWN_EXTENSION
+from fingerprint import asset_url
+
+# Targets starting with these leave the site and are not checked
+EXTERNAL_PREFIXES = ('http:', 'https:', 'mailto:', 'tel:', 'data:', 'ftp:', '//')
+INDEX_PAGE = 'index' + HTML_EXTENSION
+
+class BrokenLink():
+    def __init__(self, source, line, kind, target, reason):
+        self.source = source
+        self.line = line
+        self.kind = kind
+        self.target = target
+        self.reason = reason
+
+    def sort_key(self):
+        return (self.source, self.line, self.target)
+
+    def __str__(self):
+        return f'{self.source}:{self.line}: {self.kind} {self.target}: {self.reason}'
+
+    def __repr__(self):
+        return f'BrokenLink({self})'
+
+def page_url(rel_path):
+    '''Maps the content path blog/post.md to the URL it is served at, /blog/post.html'''
+    return asset_url(rel_path[:-len(MARKDOWN_EXTENSION)] + HTML_EXTENSION)
+
+def static_urls(static_dir):
+    '''Returns the set of URLs of every file under static_dir'''
+    if not os.path.exists(static_dir):
+        return set()
+    return {asset_url(rel_path) for rel_path, _ in walk_files(static_dir)}
+
+class LinkIndex():
+    '''Every page's links and heading anchors, gathered while the site is built
+
+    check() resolves each link once against sets of page URLs, static file
+    URLs and per page anchors, so it takes time linear in the number of
+    links whatever the size of the site.
+    '''
+    def __init__(self):
+        self.pages = {}  # page URL -> content relative path
+        self.anchors = {}  # page URL -> set of heading anchors
+        self.links = []  # (page URL, line, kind, target)
+
+    def add_page(self, rel_path, links, anchors):
+        '''Adds a page's (line, kind, target) links and its heading anchors'''
+        url = page_url(rel_path)
+        self.pages[url] = rel_path
+        self.anchors[url] = set(anchors)
+        self.links.extend((url, line, kind, target) for line, kind, target in links)
+
+    def _resolve(self, source_url, path, static):
+        '''Returns the page or static URL a link path points at, or None'''
+        if not path.startswith('/'):
+            path = posixpath.join(posixpath.dirname(source_url), path)
+        trailing_slash = path.endswith('/')
+        path = posixpath.normpath(path)
+        if path.startswith('//'):  # normpath keeps a leading double slash
+            path = path[1:]
+        if trailing_slash:
+            candidates = (posixpath.join(path, INDEX_PAGE),)
+        else:
+            candidates = (path, path + HTML_EXTENSION, posixpath.join(path, INDEX_PAGE))
+        for candidate in candidates:
+            if candidate in self.pages or candidate in static:
+                return candidate
+        return None
+
+    def check(self, static=frozenset()):
+        '''Returns the BrokenLinks among all links, sorted by source file and line
+
+        static is the set of static file URLs, see static_urls.
+        '''
+        broken = []
+        for source_url, line, kind, target in self.links:
+            if not target or target.lower().startswith(EXTERNAL_PREFIXES):
+                continue
+            path, _, fragment = target.partition('#')
+            path = unquote(path.split('?', 1)[0])
+            if not path:
+                resolved = source_url
+            else:
+                resolved = self._resolve(source_url, path, static)
+                if resolved is None:
+                    broken.append(BrokenLink(self.pages[source_url], line, kind, target, 'no such page or file'))
+                    continue
+            if fragment and resolved in self.anchors and unquote(fragment) not in self.anchors[resolved]:
+                broken.append(BrokenLink(self.pages[source_url], line, kind, target, 'no such heading'))
+        broken.sort(key=BrokenLink.sort_key)
+        return broken
+
+    def summary(self):
+        '''Returns a one line, human readable summary of the index'''
+        return f'{len(self.links)} links on {len(self.pages)} pages'
+
+    def __repr__(self):
+        return f'LinkIndex({self.summary()})'
@@ -1,35 +1,337 @@
+import argparse
+import cProfile
 import os
-import shutil
+import sys
 from textnode import TextNode, TextType
+from assets import COPY_MODES, copy_tree, sync_dir
+from build import RenderOptions, build_site, prune_pages
+from fingerprint import fingerprint_assets
+from imagesize import index_image_sizes
+from links import LinkIndex, static_urls
+from pageindex import PageIndex
+from search import SearchIndex
+from shard import merge_shards, parse_shard, write_shard_manifest
+from pipeline import DEFAULT_IO_THREADS, build_site_pipelined
+from cache import PageCache
+from daemon import SOCKET_NAME, BuildDaemon
+from htmlnode import clear_props_cache
+from markdown import enable_inline_memo, inline_memo
+from template import clear_template_cache, compiled_templates
+from watch import SiteWatcher
+import compress
+import instrument
 
-def copy_dir(source_dir, destination_dir):
-    if not os.path.exists(source_dir):
-        raise Exception("source directory does not exist")
-    
-    if os.path.exists(destination_dir):
-        shutil.rmtree(destination_dir)
-    os.makedirs(destination_dir)
-
-    for item in os.listdir(source_dir):
-        path = os.path.join(source_dir, item)
-        if os.path.isfile(path):
-            print(f"Copying {path}")
-            shutil.copy(path, destination_dir)
+def copy_dir(source_dir, destination_dir, workers=None, mode="copy"):
+    '''Replaces destination_dir with a full copy of source_dir, returning a SyncStats'''
+    return copy_tree(source_dir, destination_dir, workers=workers, mode=mode)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site into public/")
+    parser.add_argument("--site", default=None, metavar="DIR",
+                        help="directory holding static/, content/ and template.html (default: this repository)")
+    parser.add_argument("--output", default=None, metavar="DIR",
+                        help="directory the site is built into (default: public/ in the site directory)")
+    parser.add_argument("--cache-dir", default=None, metavar="DIR",
+                        help="directory holding the build caches (default: .cache/ in the site directory)")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                        help="build only the pages of shard I of N into a clean output (as --clean), and write a shard manifest of it")
+    parser.add_argument("--merge-shards", nargs="+", default=None, metavar="DIR",
+                        help="instead of building, combine the outputs of shard builds 1/N to N/N into the output")
+    parser.add_argument("--clean", action="store_true",
+                        help="delete public/ and recopy every static file instead of syncing")
+    parser.add_argument("--hash", action="store_true",
+                        help="confirm changed static files by content hash before copying")
+    parser.add_argument("--jobs", type=int, default=None,
+                        help="number of threads copying static files")
+    parser.add_argument("--copy-mode", choices=COPY_MODES, default="copy",
+                        help="copy static files, or hardlink/reflink them when on the same filesystem")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="also copy static files to content hashed names and point links and images at them")
+    parser.add_argument("--no-image-sizes", action="store_true",
+                        help="don't add width and height, read from static image headers, to images")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes rendering pages (default: one per core)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="render every page instead of reusing cached pages")
+    parser.add_argument("--cache-size", type=int, default=256,
+                        help="maximum size of the rendered page cache in MiB")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="overlap page reads, rendering and writes with asyncio, for high latency filesystems")
+    parser.add_argument("--io-threads", type=int, default=DEFAULT_IO_THREADS,
+                        help="with --pipeline, number of threads reading and writing pages")
+    parser.add_argument("--inline-memo", type=int, default=0, metavar="ENTRIES",
+                        help="memoize up to ENTRIES repeated inline texts per rendering process (default: off, "
+                             "not used with --pipeline)")
+    parser.add_argument("--gzip", action="store_true",
+                        help="write .gz siblings of compressible files in public/ for servers serving pre-compressed files")
+    parser.add_argument("--gzip-level", type=int, default=compress.DEFAULT_LEVEL,
+                        help="zlib compression level for --gzip, 0-9")
+    parser.add_argument("--gzip-min-size", type=int, default=compress.DEFAULT_MIN_SIZE,
+                        help="files smaller than this many bytes get no .gz")
+    parser.add_argument("--check-links", action="store_true",
+                        help="report links and images pointing at missing pages, files or headings (not with --pipeline)")
+    parser.add_argument("--fail-on-broken-links", action="store_true",
+                        help="with --check-links, exit with an error when any link is broken")
+    parser.add_argument("--search-index", action="store_true",
+                        help="write a sharded search index of every page's terms to public/search/ (not with --pipeline)")
+    parser.add_argument("--page-index", action="store_true",
+                        help="keep every page's title, date, headings and word count in .cache/pages.sqlite "
+                             "(not with --pipeline)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="after building, serve build and rebuild requests from client.py on a Unix socket")
+    parser.add_argument("--socket", default=None, metavar="PATH",
+                        help="socket the daemon listens on (default: build.sock in the cache directory)")
+    parser.add_argument("--max-memory", type=int, default=None, metavar="MIB",
+                        help="drop the daemon's in memory caches when it grows past this many MiB")
+    parser.add_argument("--watch", action="store_true",
+                        help="after building, keep rebuilding the outputs affected by each change")
+    parser.add_argument("--profile", nargs="?", const="build-report.json", default=None, metavar="REPORT",
+                        help="write per-stage timings, counters and the slowest pages as JSON (default: build-report.json)")
+    parser.add_argument("--cprofile", default=None, metavar="PATH",
+                        help="also dump cProfile stats of this process to PATH (use --workers 1 to include rendering)")
+    parser.add_argument("--slowest", type=int, default=instrument.DEFAULT_SLOWEST,
+                        help="number of slowest pages listed in the profile report")
+    args = parser.parse_args(argv)
+    if args.check_links and args.pipeline:
+        parser.error("--check-links can't be combined with --pipeline")
+    if args.search_index and args.pipeline:
+        parser.error("--search-index can't be combined with --pipeline")
+    if args.page_index and args.pipeline:
+        # The pipeline collects no page_data, so every changed page would be parsed a second time
+        parser.error("--page-index can't be combined with --pipeline")
+    if args.shard and (args.check_links or args.search_index):
+        parser.error("--check-links and --search-index need every page, they can't be combined with --shard")
+    if args.daemon and (args.merge_shards or args.profile or args.cprofile):
+        parser.error("--merge-shards, --profile and --cprofile can't be combined with --daemon")
+    return args
+
+def run_build(args, static_dir, content_dir, public_dir, cache_dir, template_path=None, cache=None):
+    '''Builds the site once, returning the (asset URLs, image sizes) pages were rendered with
+
+    Reuses the given PageCache instead of loading one from cache_dir, unless
+    --no-cache is set. Exits with an error when --fail-on-broken-links finds
+    broken links.
+    '''
+    manifest_path = os.path.join(cache_dir, "static-manifest.json")
+    page_manifest_path = os.path.join(cache_dir, "page-manifest.json")
+    with instrument.stage("static"):
+        # A shard's manifest records everything in its output, so nothing from an earlier build may linger there
+        if args.clean or args.shard:
+            print(f"Copying from {static_dir} to {public_dir}")
+            stats = copy_dir(static_dir, public_dir, workers=args.jobs, mode=args.copy_mode)
+            for path in (manifest_path, page_manifest_path):
+                if os.path.exists(path):
+                    os.remove(path)
         else:
-            destination_path = os.path.join(destination_dir, item)
-            print(f"Copying dir {path} to {destination_path}")
-            copy_dir(path, destination_path)
+            print(f"Syncing {static_dir} to {public_dir}")
+            stats = sync_dir(static_dir, public_dir, manifest_path, use_hash=args.hash,
+                             workers=args.jobs, mode=args.copy_mode)
+    instrument.count("static_files_copied", stats.copied_files)
+    instrument.count("static_bytes_copied", stats.copied_bytes)
+    print(f"Static files: {stats.summary()}")
+
+    asset_urls = None
+    if args.fingerprint:
+        with instrument.stage("fingerprint"):
+            asset_urls, fingerprint_stats = fingerprint_assets(
+                static_dir, public_dir, os.path.join(cache_dir, "fingerprints.json"),
+                workers=args.jobs, mode=args.copy_mode)
+        print(f"Fingerprints: {fingerprint_stats.summary()}")
+
+    image_sizes = None
+    if not args.no_image_sizes:
+        with instrument.stage("image_sizes"):
+            image_sizes, image_stats = index_image_sizes(static_dir, os.path.join(cache_dir, "image-sizes.json"))
+        print(f"Image sizes: {image_stats.summary()}")
+
+    link_index = LinkIndex() if args.check_links else None
+    search_index = SearchIndex() if args.search_index else None
+    if os.path.exists(content_dir):
+        print(f"Building pages from {content_dir}")
+        # Opened before the build, which hands it the metadata of the pages it renders
+        page_index = PageIndex(os.path.join(cache_dir, "pages.sqlite")) if args.page_index else None
+        if args.no_cache:
+            cache = None
+        elif cache is None:
+            cache = PageCache(os.path.join(cache_dir, "pages"), max_bytes=args.cache_size * 1024 * 1024)
+        options = RenderOptions(template_path, args.inline_memo, asset_urls, image_sizes, args.shard)
+        indexes = {kind: index for kind, index in (('links', link_index), ('search', search_index),
+                                                   ('outline', page_index)) if index is not None}
+        with instrument.stage("pages"):
+            if args.pipeline:
+                build_stats = build_site_pipelined(content_dir, public_dir, workers=args.workers, cache=cache,
+                                                   options=options, io_threads=args.io_threads)
+            else:
+                build_stats = build_site(content_dir, public_dir, workers=args.workers, cache=cache,
+                                         options=options, indexes=indexes)
+        print(f"Pages: {build_stats.summary()}")
+        if cache is not None:
+            print(f"Page cache: {cache.summary()}")
+        if search_index is not None:
+            with instrument.stage("search_index"):
+                search_stats = search_index.write(public_dir)
+            print(f"Search index: {search_stats.summary()}")
+        if page_index is not None:
+            with instrument.stage("page_index"):
+                with page_index:
+                    page_index_stats = page_index.update(content_dir)
+            print(f"Page index: {page_index_stats.summary()}")
 
-def main():
+    # Pages whose markdown was deleted (or the whole content directory) leave no output behind
+    with instrument.stage("prune_pages"):
+        removed = prune_pages(content_dir, public_dir, page_manifest_path, args.shard)
+    if removed:
+        print(f"Stale pages: removed {len(removed)}")
+
+    if link_index is not None:
+        with instrument.stage("check_links"):
+            broken = link_index.check(static_urls(static_dir))
+        for link in broken:
+            print(link)
+        print(f"Links: {len(broken)} broken of {link_index.summary()}")
+        if broken and args.fail_on_broken_links:
+            raise SystemExit(f"{len(broken)} broken links")
+
+    if args.gzip:
+        with instrument.stage("compress"):
+            compress_stats = compress.compress_dir(public_dir, **gzip_options(args, cache_dir))
+        print(f"Gzip: {compress_stats.summary()}")
+
+    if args.shard:
+        with instrument.stage("shard_manifest"):
+            files = write_shard_manifest(public_dir, args.shard, os.path.join(cache_dir, "shard-hashes.json"),
+                                         workers=args.jobs)
+        print(f"Shard {args.shard[0]}/{args.shard[1]}: recorded {len(files)} output files")
+    return asset_urls, image_sizes
+
+def gzip_options(args, cache_dir):
+    '''Returns the compress_dir and compress_paths keyword arguments for --gzip, or None without it'''
+    if not args.gzip:
+        return None
+    return {'manifest_path': os.path.join(cache_dir, "gzip-manifest.json"),
+            'level': args.gzip_level, 'min_size': args.gzip_min_size}
+
+def site_paths(args):
+    '''Returns the absolute (static, content, public, cache directories, template path or None) for args'''
     root_dir = os.path.dirname(os.path.abspath(__file__))  # This gets 'root_dir/src'
-    static_dir = os.path.join(root_dir, "..", "static")
-    public_dir = os.path.join(root_dir, "..", "public")
+    site_dir = args.site or os.path.join(root_dir, "..")
+    static_dir = os.path.join(site_dir, "static")
+    content_dir = os.path.join(site_dir, "content")
+    public_dir = args.output or os.path.join(site_dir, "public")
+    cache_dir = args.cache_dir or os.path.join(site_dir, ".cache")
+    template_path = os.path.join(site_dir, "template.html")
 
     # Normalize paths (resolves "..")
     static_dir = os.path.abspath(static_dir)
+    content_dir = os.path.abspath(content_dir)
     public_dir = os.path.abspath(public_dir)
+    cache_dir = os.path.abspath(cache_dir)
+    template_path = os.path.abspath(template_path)
+    if not os.path.exists(template_path):
+        template_path = None
+    return static_dir, content_dir, public_dir, cache_dir, template_path
+
+class SiteBuilder():
+    '''Builds the site over and over in one process, for BuildDaemon
+
+    Templates, compiled patterns, the inline memo, the page cache's index and
+    the dependency graph of the last build stay in memory between requests.
+    Each build parses base_argv followed by the request's own options.
+    '''
+    def __init__(self, base_argv):
+        self.base_argv = list(base_argv)
+        self.page_cache = None
+        self.watcher = None
+        self.builds = 0
+        self.rebuilds = 0
+
+    def build(self, argv=()):
+        args = parse_args(self.base_argv + list(argv))
+        if args.merge_shards or args.profile or args.cprofile:
+            # Only main() merges and profiles, a daemon build would silently do neither
+            raise SystemExit("--merge-shards, --profile and --cprofile can't be used in daemon builds")
+        static_dir, content_dir, public_dir, cache_dir, template_path = site_paths(args)
+        cache_path = os.path.join(cache_dir, "pages")
+        max_bytes = args.cache_size * 1024 * 1024
+        if self.page_cache is None or self.page_cache.cache_dir != cache_path:
+            self.page_cache = PageCache(cache_path, max_bytes=max_bytes)
+        self.page_cache.max_bytes = max_bytes
+        asset_urls, image_sizes = run_build(args, static_dir, content_dir, public_dir, cache_dir, template_path,
+                                            cache=self.page_cache)
+        if args.inline_memo and inline_memo() is None:
+            enable_inline_memo(args.inline_memo)
+        self.watcher = SiteWatcher(static_dir, content_dir, public_dir, template_path, asset_urls, image_sizes,
+                                   gzip_options(args, cache_dir))
+        self.builds += 1
+
+    def rebuild(self, paths):
+        '''Rebuilds what depends on the given changed paths, returning the targets rebuilt'''
+        if self.watcher is None:
+            self.build()
+        self.rebuilds += 1
+        targets = self.watcher.rebuild_changed({os.path.abspath(path) for path in paths})
+        self.watcher.report_failures()
+        return targets
+
+    def status(self):
+        memo = inline_memo()
+        return {
+            'builds': self.builds,
+            'rebuilds': self.rebuilds,
+            'templates': compiled_templates(),
+            'inline_memo': memo.summary() if memo is not None else None,
+            'page_cache': self.page_cache.summary() if self.page_cache is not None else None,
+        }
+
+    def trim(self):
+        '''Drops the in memory caches, which refill on later builds'''
+        memo = inline_memo()
+        if memo is not None:
+            memo.clear()
+        clear_template_cache()
+        clear_props_cache()
+
+def main(argv=None):
+    args = parse_args(argv)
+    static_dir, content_dir, public_dir, cache_dir, template_path = site_paths(args)
+
+    if args.merge_shards:
+        print(f"Merging {len(args.merge_shards)} shards into {public_dir}")
+        merge_stats = merge_shards(args.merge_shards, public_dir, os.path.join(cache_dir, "merge-manifest.json"),
+                                   workers=args.jobs, mode=args.copy_mode)
+        print(f"Merge: {merge_stats.summary()}")
+        return
+
+    if args.daemon:
+        # The daemon's builder makes the first build itself, so its caches start warm
+        builder = SiteBuilder(sys.argv[1:] if argv is None else argv)
+        builder.build()
+        socket_path = args.socket or os.path.join(cache_dir, SOCKET_NAME)
+        max_memory = args.max_memory * 1024 * 1024 if args.max_memory else None
+        BuildDaemon(socket_path, builder, max_memory).serve()
+        return
+
+    profiler = instrument.enable(args.slowest) if args.profile else None
+    python_profiler = cProfile.Profile() if args.cprofile else None
+    if python_profiler is not None:
+        python_profiler.enable()
+
+    asset_urls, image_sizes = run_build(args, static_dir, content_dir, public_dir, cache_dir, template_path)
+
+    if python_profiler is not None:
+        python_profiler.disable()
+        python_profiler.dump_stats(args.cprofile)
+        print(f"cProfile stats written to {args.cprofile}")
+    if profiler is not None:
+        instrument.disable()
+        profiler.write_report(args.profile)
+        print(f"Build report written to {args.profile}")
 
-    print(f"Copying from {static_dir} to {public_dir}")
-    copy_dir(static_dir, public_dir)
+    if args.watch:
+        if args.inline_memo and inline_memo() is None:
+            enable_inline_memo(args.inline_memo)
+        SiteWatcher(static_dir, content_dir, public_dir, template_path, asset_urls, image_sizes,
+                    gzip_options(args, cache_dir)).run()
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
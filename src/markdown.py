@@ -1,7 +1,9 @@
-from enum import Enum
 import re
-from conversions import markdown_to_blocks, text_to_textnodes, text_node_to_html_node
+from enum import Enum
+from conversions import iter_blocks, iter_numbered_blocks, text_to_textnodes, text_node_to_html_node
 from htmlnode import ParentNode, LeafNode
+from memo import DEFAULT_MAX_ENTRIES, LRUMemo
+import instrument
 
 class BlockType(Enum):
     PARAGRAPH = 'paragraph'
@@ -11,49 +13,201 @@ class BlockType(Enum):
     UNORDERED_LIST = 'unordered_list'
     ORDERED_LIST = 'ordered_list'
 
+BLOCK_TYPE_TAGS = {
+    BlockType.PARAGRAPH: 'p',
+    BlockType.CODE: 'code',
+    BlockType.QUOTE: 'blockquote',
+    BlockType.UNORDERED_LIST: 'ul',
+    BlockType.ORDERED_LIST: 'ol',
+}
+
+# First character of a block -> classifiers to try, in order. Each classifier
+# takes (block, lines) and returns (block_type, tag, cleaned lines) or None.
+BLOCK_CLASSIFIERS = {}
+# Block type -> renderer taking (tag, cleaned lines) and returning an HTMLNode
+BLOCK_RENDERERS = {}
+
+def register_block_type(block_type, first_chars, classifier, renderer):
+    '''Registers a block type recognised by classify_block and rendered by block_to_html_node
+
+    The classifier only runs for blocks starting with one of first_chars, so
+    new block types don't add passes over unrelated blocks.
+    '''
+    for char in first_chars:
+        BLOCK_CLASSIFIERS.setdefault(char, []).append(classifier)
+    BLOCK_RENDERERS[block_type] = renderer
+
+def classify_block(block):
+    '''Classifies a markdown block in a single pass over its lines
+
+    Returns (block_type, tag, lines) where lines are the block's cleaned
+    lines: a (depth, tag, text) triple per list item, a (depth, text) pair
+    per quote line, the heading/paragraph text split on newlines, or a
+    single item holding the contents of a code block. Depths count from 0
+    for list items and from 1 for quote lines.
+    '''
+    lines = block.split('\n')
+    for classifier in BLOCK_CLASSIFIERS.get(block[:1], ()):
+        classified = classifier(block, lines)
+        if classified is not None:
+            return classified
+    return BlockType.PARAGRAPH, 'p', lines
+
+def _classify_heading(block, lines):
+    first_line = lines[0]
+    level = len(first_line) - len(first_line.lstrip('#'))
+    if level > 6 or first_line[level:level + 1] != ' ' or len(first_line) == level + 1:
+        return None
+    return BlockType.HEADING, f'h{level}', [first_line[level + 1:]] + lines[1:]
+
+def _classify_code(block, lines):
+    if not (block.startswith('```') and block.endswith('```')):
+        return None
+    return BlockType.CODE, 'code', [block[3:-3].strip()]
+
+def _quote_line(line):
+    '''Splits a quote line into (number of leading > markers, text), each marker may be followed by a space'''
+    if not line.startswith('>', 1) and not line.startswith('>', 2):  # the common single marker
+        return 1, line[1:].strip()
+    depth = start = 0
+    while line.startswith('>', start):
+        depth += 1
+        start += 1
+        if line.startswith(' ', start):
+            start += 1
+    return depth, line[start:].strip()
+
+def _classify_quote(block, lines):
+    cleaned = []
+    for line in lines:
+        if not line.startswith('>'):
+            return None
+        cleaned.append(_quote_line(line))
+    return BlockType.QUOTE, 'blockquote', cleaned
+
+TAB_WIDTH = 4
+
+def _list_item(line):
+    '''Splits a list line into (indent width, tag, number or None, text), or returns None if it isn't one'''
+    if line.startswith('- '):  # the common unindented item
+        return 0, 'ul', None, line[2:].strip()
+    text = line.lstrip(' \t')
+    indent = line[:len(line) - len(text)]
+    width = len(indent) + indent.count('\t') * (TAB_WIDTH - 1)
+    if text.startswith('- '):
+        return width, 'ul', None, text[2:].strip()
+    number_end = text.find('. ')
+    if number_end > 0 and text[:number_end].isdigit():
+        return width, 'ol', text[:number_end], text[number_end + 2:].strip()
+    return None
+
+def _classify_list(block, lines):
+    '''Classifies a list, nested by indentation, in one pass with a stack of the open lists
+
+    An item indented deeper than the one before it starts a list nested in
+    that item, and a dedent closes every list indented deeper than the
+    item. Each list must keep one kind of marker, and ordered lists must
+    count up from 1, otherwise the block is a paragraph.
+    '''
+    items = []
+    open_lists = []  # [indent, tag, next number] of each open list, outermost first
+    for line in lines:
+        item = _list_item(line)
+        if item is None:
+            return None
+        indent, tag, number, text = item
+        if not open_lists or indent > open_lists[-1][0]:
+            open_lists.append([indent, tag, 1])
+        else:
+            while len(open_lists) > 1 and indent < open_lists[-1][0]:
+                open_lists.pop()
+        current = open_lists[-1]
+        if tag != current[1] or (number is not None and number != str(current[2])):
+            return None
+        current[2] += 1
+        items.append((len(open_lists) - 1, tag, text))
+    if open_lists[0][1] == 'ol':
+        return BlockType.ORDERED_LIST, 'ol', items
+    return BlockType.UNORDERED_LIST, 'ul', items
+
 def block_to_block_type(markdown_block):
     '''Takes a single markdown block and returns its BlockType'''
-    # Heading
-    heading_pattern = r'^#{1,6} .+'
-    if re.match(heading_pattern, markdown_block):
-        return BlockType.HEADING
-    # Code
-    if markdown_block.startswith('```') and markdown_block.endswith('```'):
-        return BlockType.CODE
-    # Quote/Unordered List/Ordered List
-    lines = [line for line in markdown_block.split('\n')]
-    if all(item.startswith('>') for item in lines):
-        return BlockType.QUOTE
-    if all(item.startswith('- ') for item in lines):
-        return BlockType.UNORDERED_LIST
-    for i, line in enumerate(lines):
-        if not line.startswith(f'{i + 1}. '):
-            break
-    else:
-        return BlockType.ORDERED_LIST
-    return BlockType.PARAGRAPH
+    return classify_block(markdown_block)[0]
+
+# Opt-in memo of inline text -> (frozen (tag, value, props items, children) tuples, frozen links), see enable_inline_memo
+_inline_memo = None
+# The _LinkRecorder of the block being rendered, while a PageMeta is collecting links
+_link_recorder = None
+
+def enable_inline_memo(max_entries=DEFAULT_MAX_ENTRIES):
+    '''Starts memoizing text_to_children in a new LRUMemo and returns it'''
+    global _inline_memo
+    _inline_memo = LRUMemo(max_entries)
+    return _inline_memo
+
+def disable_inline_memo():
+    global _inline_memo
+    _inline_memo = None
+
+def inline_memo():
+    '''Returns the active inline LRUMemo, or None when memoization is off'''
+    return _inline_memo
+
+def _freeze_nodes(nodes):
+    # Inline nodes only nest as deep as bold and italic spans do, so recursion stays shallow
+    return tuple((node.tag, node.value, tuple(node.props.items()) if node.props else None,
+                  _freeze_nodes(node.children) if node.children is not None else None) for node in nodes)
+
+def _thaw_nodes(frozen):
+    return [LeafNode(tag, value, dict(props) if props else None) if children is None
+            else ParentNode(tag, _thaw_nodes(children)) for tag, value, props, children in frozen]
+
+def _parse_children(text, links=None):
+    with instrument.stage('text_to_textnodes'):
+        text_nodes = text_to_textnodes(text, links)
+    with instrument.stage('text_node_to_html_node'):
+        return [text_node_to_html_node(node) for node in text_nodes]
+
+def _freeze_links(links):
+    return tuple((offset, node.text_type.value, node.url) for offset, node in links)
 
 def text_to_children(text):
-    '''Converts text into a list of component HTMLNodes'''
-    return [text_node_to_html_node(node) for node in text_to_textnodes(text)]
+    '''Converts text into a list of component HTMLNodes
+
+    With the inline memo enabled, repeated text skips parsing. The memo holds
+    frozen tuples and every call gets freshly built nodes, so callers may
+    mutate what they are given.
+    '''
+    memo = _inline_memo
+    recorder = _link_recorder
+    if memo is None:
+        if recorder is None:
+            return _parse_children(text)
+        links = []
+        children = _parse_children(text, links)
+        recorder.record(text, _freeze_links(links))
+        return children
+    cached = memo.get(text)
+    if cached is None:
+        links = []
+        children = _parse_children(text, links)
+        cached = (_freeze_nodes(children), _freeze_links(links))
+        memo.put(text, cached)
+    else:
+        children = _thaw_nodes(cached[0])
+    if recorder is not None:
+        recorder.record(text, cached[1])
+    return children
 
 def get_tag_for_block_type(block_type, block):
     '''Accepts a block_type and block, and returns the proper tag'''
-    tag_map = {
-        BlockType.PARAGRAPH: 'p',
-        BlockType.CODE: 'code',
-        BlockType.QUOTE: 'blockquote',
-        BlockType.UNORDERED_LIST: 'ul',
-        BlockType.ORDERED_LIST: 'ol',
-    }
-
     if block_type == BlockType.HEADING:
         header_num = len(block.split(' ')[0]) # Count number of # characters
         return f'h{header_num}'
     else:
-        if block_type not in tag_map:
-            return ValueError('block_type is invalid')
-        return tag_map[block_type]
+        if block_type not in BLOCK_TYPE_TAGS:
+            raise ValueError('block_type is invalid')
+        return BLOCK_TYPE_TAGS[block_type]
     
 def get_text_for_block(block_type, block):
     '''Accepts a non-list-type block and returns a cleaned string'''
@@ -64,14 +218,14 @@ def get_text_for_block(block_type, block):
     elif block_type == BlockType.CODE:
         return block[3:-3].strip()
     elif block_type == BlockType.QUOTE:
-        return '\n'.join([line.lstrip('> ').strip() for line in block.split('\n')])
+        return '\n'.join([line.removeprefix('>').strip() for line in block.split('\n')])
     else:
         raise ValueError("unsupported block_type")
     
 def get_list_items_for_block(block_type, block):
     '''Accepts a list-type block and returns a list of cleaned strings'''
     if block_type == BlockType.UNORDERED_LIST:
-        return [line.lstrip('- ').strip() for line in block.split('\n')]
+        return [line.removeprefix('- ').strip() for line in block.split('\n')]
     elif block_type == BlockType.ORDERED_LIST:
         return [line.split('. ', maxsplit=1)[1].strip() for line in block.split('\n')]
     else:
@@ -85,40 +239,232 @@ def get_cleaned_text(block_type, block):
         return get_text_for_block(block_type, block)
 
 
-def markdown_to_html_node(markdown):
-    '''Converts a full markdown document into a single parent HTMLNode'''
-    # Convert to blocks
-    blocks = markdown_to_blocks(markdown)
-    html_children = []
-    # Loop over each block
-    for block in blocks:
-        # Determine block type
-        block_type = block_to_block_type(block)
-        # Based on the type of block, create a new HTMLNode with the proper data
-        if block_type == BlockType.CODE:
-            # Special case – no inline markdown parsing
-            tag = get_tag_for_block_type(block_type, block)
-            text = get_cleaned_text(block_type, block)
-            html_children.append(LeafNode(tag=tag, value=text))
-        elif block_type in [BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST]:
-            # Handle list blocks
-            items = get_list_items_for_block(block_type, block)
-            list_item_nodes = []
-            for item in items:
-                children = text_to_children(item)
-                list_item_nodes.append(ParentNode('li', children))
-            
-            tag = get_tag_for_block_type(block_type, block)
-            html_children.append(ParentNode(tag, list_item_nodes))
+def _render_code(tag, lines):
+    # Special case – no inline markdown parsing
+    return LeafNode(tag=tag, value=lines[0])
 
+def _render_list(tag, items):
+    '''Builds the list tree from (depth, tag, text) items with a stack of the open lists, without recursion'''
+    root = ParentNode(tag, [])
+    open_lists = [root]
+    item_node = None
+    for depth, list_tag, text in items:
+        if depth == len(open_lists):
+            # Nested in the item before, _classify_list never skips a level
+            nested = ParentNode(list_tag, [])
+            item_node.children.append(nested)
+            open_lists.append(nested)
         else:
-            # All other block types
-            text = get_text_for_block(block_type, block)
-            children = text_to_children(text)
-            tag = get_tag_for_block_type(block_type, block)
-            html_children.append(ParentNode(tag, children))
+            del open_lists[depth + 1:]
+        item_node = ParentNode('li', text_to_children(text))
+        open_lists[-1].children.append(item_node)
+    return root
+
+def _render_quote(tag, lines):
+    '''Builds nested blockquotes from (depth, text) lines with a stack of the open quotes
+
+    Consecutive lines at the same depth are joined by newlines into one run
+    of inline text, so a flat quote renders exactly like a paragraph.
+    '''
+    root = ParentNode(tag, [])
+    open_quotes = [root]
+    run = []
+    for depth, text in lines:
+        if depth != len(open_quotes):
+            if run:
+                open_quotes[-1].children.extend(text_to_children('\n'.join(run)))
+                run = []
+            del open_quotes[depth:]
+            while len(open_quotes) < depth:
+                nested = ParentNode(tag, [])
+                open_quotes[-1].children.append(nested)
+                open_quotes.append(nested)
+        run.append(text)
+    open_quotes[-1].children.extend(text_to_children('\n'.join(run)))
+    return root
+
+def _render_text(tag, lines):
+    return ParentNode(tag, text_to_children('\n'.join(lines)))
+
+register_block_type(BlockType.HEADING, '#', _classify_heading, _render_text)
+register_block_type(BlockType.CODE, '`', _classify_code, _render_code)
+register_block_type(BlockType.QUOTE, '>', _classify_quote, _render_quote)
+register_block_type(BlockType.UNORDERED_LIST, '-', _classify_list, _render_list)
+register_block_type(BlockType.ORDERED_LIST, '1', _classify_list, _render_list)
+BLOCK_RENDERERS[BlockType.PARAGRAPH] = _render_text
+
+class PageMeta():
+    '''Page details picked up while its blocks are rendered
+
+    With collect_links, links holds a (line, 'link' or 'image', url) tuple
+    for every link and image. With collect_terms, terms maps every search
+    term in the page's text to the anchor of the first section it appears
+    in ('' before the first heading). With collect_outline, headings holds a
+    (level, text, anchor) tuple for every heading and word_count counts the
+    words outside code blocks. anchors holds the id of every heading, so
+    later headings with the same text get unique ones.
+    '''
+    def __init__(self, collect_links=False, collect_terms=False, collect_outline=False):
+        self.title = None
+        self.links = [] if collect_links else None
+        self.terms = {} if collect_terms else None
+        self.headings = [] if collect_outline else None
+        self.word_count = 0
+        self.anchors = set()
+        self.section = ''
+
+class _LinkRecorder():
+    '''Turns the links found in one block's inline texts into PageMeta.links entries
+
+    Renderers call text_to_children on the block's lines in order, one line
+    or a run of newline joined lines at a time, so a link's line is the
+    block's first line plus the lines passed so far plus the newlines
+    before it.
+    '''
+    __slots__ = ('meta', 'line')
+
+    def __init__(self, meta, line):
+        self.meta = meta
+        self.line = line
+
+    def record(self, text, links):
+        for offset, kind, url in links:
+            self.meta.links.append((self.line + text.count('\n', 0, offset), kind, url))
+        self.line += text.count('\n') + 1
+
+HEADING_ANCHOR_STRIP = re.compile(r'[^\w\- ]')
+# The anchor of headings without a single word character, such as "???"
+HEADING_ANCHOR_FALLBACK = 'section'
+TERM_PATTERN = re.compile(r'\w{2,}')
+WORD_PATTERN = re.compile(r"\w+(?:['-]\w+)*")
+
+def heading_anchor(text):
+    '''Returns the GitHub style anchor for a heading: lowercased, punctuation dropped, spaces as dashes'''
+    anchor = HEADING_ANCHOR_STRIP.sub('', text.lower()).replace(' ', '-')
+    if not anchor.strip('-'):
+        return HEADING_ANCHOR_FALLBACK
+    return anchor
+
+def unique_anchor(text, anchors):
+    '''Returns heading_anchor(text), suffixed with -1, -2... if already in anchors, and adds it to them'''
+    anchor = base = heading_anchor(text)
+    suffix = 0
+    while anchor in anchors:
+        suffix += 1
+        anchor = f'{base}-{suffix}'
+    anchors.add(anchor)
+    return anchor
+
+def heading_text(node):
+    '''Returns the plain text of a rendered heading, without inline markup'''
+    return ''.join(iter_text(node))
+
+def iter_text(node):
+    '''Yields the text of every leaf under a rendered block, without an explicit recursion'''
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        if node.children is None:
+            if node.value:
+                yield node.value
+        else:
+            stack.extend(reversed(node.children))
+
+def _record_terms(meta, node):
+    terms = meta.terms
+    for text in iter_text(node):
+        for term in TERM_PATTERN.findall(text.lower()):
+            if term not in terms:
+                terms[term] = meta.section
+
+def _count_words(meta, node):
+    for text in iter_text(node):
+        meta.word_count += len(WORD_PATTERN.findall(text))
+
+def block_to_html_node(block, meta=None, line=1):
+    '''Converts a single markdown block into an HTMLNode
+
+    Headings get their anchor as their id, unique among the anchors of meta.
+    When meta is given, the text of the first h1 is recorded as its title,
+    and when it collects links, terms or the outline, so are the links of
+    the block (which starts at line), its search terms, or its heading and
+    words.
+    '''
+    global _link_recorder
+    with instrument.stage('block_to_block_type'):
+        block_type, tag, lines = classify_block(block)
+    instrument.count('blocks')
+    if meta is None or meta.links is None:
+        node = BLOCK_RENDERERS[block_type](tag, lines)
+    else:
+        _link_recorder = _LinkRecorder(meta, line)
+        try:
+            node = BLOCK_RENDERERS[block_type](tag, lines)
+        finally:
+            _link_recorder = None
+    if block_type == BlockType.HEADING:
+        text = heading_text(node)
+        anchor = unique_anchor(text, meta.anchors if meta is not None else set())
+        node.props = {'id': anchor}
+        if meta is not None:
+            meta.section = anchor
+            if meta.title is None and tag == 'h1':
+                meta.title = text
+            if meta.headings is not None:
+                meta.headings.append((int(tag[1]), text, anchor))
+    if meta is not None and meta.terms is not None:
+        _record_terms(meta, node)
+    if meta is not None and meta.headings is not None and block_type != BlockType.CODE:
+        _count_words(meta, node)
+    return node
+
+def iter_block_nodes(markdown, meta=None):
+    '''Lazily yields one HTMLNode per block of a markdown str, file object or mmap'''
+    if meta is None:
+        meta = PageMeta()  # Heading ids must be unique across the page even when nothing is collected
+    blocks = iter_numbered_blocks(markdown)
+    while True:
+        with instrument.stage('markdown_to_blocks'):
+            numbered = next(blocks, None)
+        if numbered is None:
+            return
+        yield block_to_html_node(numbered[1], meta, numbered[0])
+
+def markdown_to_html_node(markdown, meta=None):
+    '''Converts a full markdown document into a single parent HTMLNode'''
+    children = list(iter_block_nodes(markdown, meta))
+    if not children:
+        # A ParentNode needs children; an empty document renders as <div></div>, as in iter_markdown_html
+        return LeafNode('div', '')
+    return ParentNode(tag='div', children=children)
+
+def extract_title(markdown):
+    '''Returns the text of the first h1 in a markdown document, or None
+
+    Only needed for streamed pages, whose title must be known before their
+    content is rendered; other pages get it from PageMeta for free.
+    '''
+    for block in iter_blocks(markdown):
+        block_type, tag, lines = classify_block(block)
+        if tag == 'h1':
+            return heading_text(BLOCK_RENDERERS[block_type](tag, lines))
+    return None
+
+def iter_markdown_html(markdown, meta=None):
+    '''Lazily yields the HTML for a markdown str, file object or mmap
+
+    Produces the same output as markdown_to_html_node(markdown).to_html(), but
+    each block is parsed, yielded and dropped before the next one is read,
+    so only one block's tree is in memory at a time.
+    '''
+    yield '<div>'
+    for node in iter_block_nodes(markdown, meta):
+        yield from node.iter_html()
+    yield '</div>'
 
-    return ParentNode(tag='div', children=html_children)
+def write_markdown_html(markdown, stream):
+    '''Streams the HTML for a markdown str, file object or mmap into stream'''
+    stream.writelines(iter_markdown_html(markdown))
 
 # md = '- item one\n- item two'
 # print(markdown_to_html_node(md).to_html())
\ No newline at end of file
@@ -0,0 +1,47 @@
+from collections import OrderedDict
+
+DEFAULT_MAX_ENTRIES = 4096
+
+class LRUMemo():
+    '''In-memory memo table holding at most max_entries values, evicting the least recently used
+
+    Values must be immutable (or copied by the caller on the way out), since
+    every hit returns the same object.
+    '''
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError('max_entries must be at least 1')
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        '''Returns the value stored for key, or None on a miss'''
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def summary(self):
+        '''Returns a one line, human readable summary of memo usage'''
+        return (f'{self.hits} hits, {self.misses} misses ({self.hit_rate() * 100:.1f}% hit rate), '
+                f'{self.evictions} evictions, {len(self.entries)}/{self.max_entries} entries')
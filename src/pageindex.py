@@ -0,0 +1,161 @@
+import os
+import re
+import sqlite3
+from assets import walk_files
+from build import MARKDOWN_EXTENSION
+from links import page_url
+from markdown import PageMeta, iter_block_nodes
+from stats import Stats
+
+# Bump whenever the schema or the extracted metadata changes, the index is then rebuilt
+PAGE_INDEX_VERSION = 1
+# Pages named like 2024-01-31-title.md are dated by their name
+DATE_PATTERN = re.compile(r'(\d{4}-\d{2}-\d{2})(?:[-_]|$)')
+
+SCHEMA = '''
+CREATE TABLE pages (
+    path TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    title TEXT,
+    date TEXT,
+    word_count INTEGER NOT NULL
+);
+CREATE INDEX pages_by_date ON pages (date DESC, path);
+CREATE TABLE headings (
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    level INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    anchor TEXT NOT NULL,
+    PRIMARY KEY (path, position)
+);
+'''
+
+class PageIndexStats(Stats):
+    FIELDS = ('indexed_pages', 'unchanged_pages', 'removed_pages', 'parsed_pages')
+    SUMMARY = ('indexed {indexed_pages} pages ({unchanged_pages} unchanged, '
+               '{parsed_pages} parsed outside the build), removed {removed_pages} pages')
+
+def page_date(rel_path):
+    '''Returns the YYYY-MM-DD date a page's file name starts with, or None'''
+    match = DATE_PATTERN.match(os.path.basename(rel_path))
+    return match[1] if match else None
+
+def page_metadata(markdown):
+    '''Returns (title, [(level, text, anchor), ...], word count) of a markdown str, file object or mmap
+
+    Words in code blocks aren't counted. A build collects the same in its
+    PageMeta while it renders the page, so this is only for pages it didn't.
+    '''
+    meta = PageMeta(collect_outline=True)
+    for _ in iter_block_nodes(markdown, meta):
+        pass
+    return meta.title, meta.headings, meta.word_count
+
+class PageIndex():
+    '''A SQLite index of every page's title, URL, date, headings and word count
+
+    update() keeps it in step with the content directory, looking only at
+    pages whose size or mtime changed, so generators such as listings,
+    sitemaps and feeds query it in bulk instead of parsing every page. A
+    build passes it what it collected while rendering through add_page, and
+    update() only parses changed pages the build didn't render.
+    '''
+    def __init__(self, db_path):
+        self.rendered = {}  # content relative path with / separators -> (title, headings, word count)
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.connection.row_factory = sqlite3.Row
+        version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if version != PAGE_INDEX_VERSION:
+            with self.connection:
+                self.connection.execute('DROP TABLE IF EXISTS pages')
+                self.connection.execute('DROP TABLE IF EXISTS headings')
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f'PRAGMA user_version = {PAGE_INDEX_VERSION}')
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def add_page(self, rel_path, title, headings, word_count):
+        '''Takes the metadata of a page the build just rendered, for the next update()'''
+        self.rendered[rel_path.replace(os.sep, '/')] = (title, headings, word_count)
+
+    def update(self, content_dir):
+        '''Reindexes new and changed pages under content_dir and drops deleted ones, returning a PageIndexStats'''
+        if not os.path.exists(content_dir):
+            raise Exception("content directory does not exist")
+        stats = PageIndexStats()
+        known = {row[0]: (row[1], row[2]) for row in self.connection.execute('SELECT path, size, mtime_ns FROM pages')}
+        pages, headings, changed = [], [], []
+        for rel_path, st in walk_files(content_dir):
+            if not rel_path.endswith(MARKDOWN_EXTENSION):
+                continue
+            path = rel_path.replace(os.sep, '/')
+            if known.pop(path, None) == (st.st_size, st.st_mtime_ns):
+                stats.unchanged_pages += 1
+                continue
+            metadata = self.rendered.get(path)
+            if metadata is None:
+                with open(os.path.join(content_dir, rel_path), encoding='utf-8') as f:
+                    metadata = page_metadata(f)
+                stats.parsed_pages += 1
+            title, page_headings, word_count = metadata
+            changed.append((path,))
+            pages.append((path, page_url(rel_path), st.st_size, st.st_mtime_ns, title, page_date(rel_path), word_count))
+            headings.extend((path, position, level, text, anchor)
+                            for position, (level, text, anchor) in enumerate(page_headings))
+        removed = [(path,) for path in known]
+        with self.connection:
+            self.connection.executemany('DELETE FROM headings WHERE path = ?', changed + removed)
+            self.connection.executemany('DELETE FROM pages WHERE path = ?', removed)
+            self.connection.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)', pages)
+            self.connection.executemany('INSERT INTO headings VALUES (?, ?, ?, ?, ?)', headings)
+        self.rendered.clear()
+        stats.indexed_pages = len(pages)
+        stats.removed_pages = len(removed)
+        return stats
+
+    def page(self, path):
+        '''Returns the row of the page at a content relative path, or None'''
+        return self.connection.execute('SELECT * FROM pages WHERE path = ?', (path,)).fetchone()
+
+    def listing(self, directory=None, limit=None):
+        '''Returns the rows of every page (under directory), newest first, in one indexed query
+
+        Undated pages come last, and pages with the same date are ordered by path.
+        '''
+        query = 'SELECT path, url, title, date, word_count FROM pages'
+        parameters = []
+        if directory:
+            # A range on the primary key rather than LIKE, so special characters need no escaping
+            prefix = directory.replace(os.sep, '/').rstrip('/') + '/'
+            query += ' WHERE path >= ? AND path < ?'
+            parameters += [prefix, prefix[:-1] + chr(ord('/') + 1)]
+        # NULLs sort lowest in SQLite, so undated pages come last and pages_by_date serves the order
+        query += ' ORDER BY date DESC, path'
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+        return self.connection.execute(query, parameters).fetchall()
+
+    def headings(self, path=None):
+        '''Returns the heading rows of one page, or of every page, in document order'''
+        if path is None:
+            return self.connection.execute('SELECT * FROM headings ORDER BY path, position').fetchall()
+        return self.connection.execute(
+            'SELECT * FROM headings WHERE path = ? ORDER BY position', (path,)).fetchall()
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM pages').fetchone()[0]
+
+    def __repr__(self):
+        return f'PageIndex({len(self)} pages)'
@@ -0,0 +1,131 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from build import (BuildStats, RenderOptions, STREAM_THRESHOLD, build_page, find_pages, page_cache_key,
+                   page_template, render_page, set_page_assets, write_page)
+from cache import write_atomic
+from shard import in_shard
+import instrument
+
+DEFAULT_IO_THREADS = 8
+DEFAULT_QUEUE_SIZE = 16
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _write(public_dir, rel_path, html, cache_path):
+    write_page(public_dir, rel_path, html)
+    if cache_path:
+        write_atomic(cache_path, html)
+
+def _render(source, template_path):
+    '''Render executor entry point, the same page conversion build_page uses'''
+    return render_page(source.decode('utf-8'), page_template(template_path)).encode('utf-8')
+
+async def _close_after(tasks, queue, consumers):
+    '''Waits for a stage's tasks to finish, then tells each consumer of its queue to stop'''
+    await asyncio.gather(*tasks)
+    for _ in range(consumers):
+        await queue.put(None)
+
+async def build_site_async(content_dir, public_dir, workers=None, cache=None, options=None,
+                           io_threads=DEFAULT_IO_THREADS, queue_size=DEFAULT_QUEUE_SIZE):
+    '''Builds the site like build_site, overlapping file reads, rendering and writes
+
+    Readers and writers run blocking file operations on a pool of io_threads
+    threads, so many requests are in flight on high latency filesystems.
+    Sources flow to the renderers (worker processes, or one thread with
+    workers=1) and rendered pages to the writers through queues holding at
+    most queue_size pages. A full queue stalls the stage feeding it, which
+    bounds the number of pages in memory. The memo_size and collect of the
+    RenderOptions are not supported. Returns a BuildStats.
+    '''
+    if not os.path.exists(content_dir):
+        raise Exception("content directory does not exist")
+    if workers is None:
+        workers = os.cpu_count() or 1
+    options = options or RenderOptions()
+    template_path = options.template_path
+    loop = asyncio.get_running_loop()
+    context = options.context()
+    stats = BuildStats()
+
+    pending = asyncio.Queue()
+    to_render = asyncio.Queue(queue_size)
+    to_write = asyncio.Queue(queue_size)
+
+    async def read():
+        while not pending.empty():
+            rel_path, size = pending.get_nowait()
+            if size > STREAM_THRESHOLD:
+                # Rendered and written in one go by build_page, which streams it
+                await to_render.put((rel_path, None, None))
+                continue
+            source = await loop.run_in_executor(io_pool, _read, os.path.join(content_dir, rel_path))
+            key = None
+            if cache is not None:
+                key = page_cache_key(source, context)
+                # The entry is read on an I/O thread, the index is only touched from the event loop thread
+                html = await loop.run_in_executor(io_pool, cache.read, key)
+                cache.count_lookup(key, html)
+                if html is not None:
+                    instrument.count('cached_pages')
+                    stats.add(len(source), len(html), cached=True)
+                    await to_write.put((rel_path, html, None))
+                    continue
+            await to_render.put((rel_path, source, key))
+
+    async def render():
+        while (job := await to_render.get()) is not None:
+            rel_path, source, key = job
+            start = time.perf_counter()
+            if source is None:
+                stats.add(*await loop.run_in_executor(
+                    renderer, build_page, content_dir, public_dir, rel_path, None, template_path))
+                continue
+            html = await loop.run_in_executor(renderer, _render, source, template_path)
+            instrument.page(rel_path, time.perf_counter() - start)
+            stats.add(len(source), len(html))
+            await to_write.put((rel_path, html, key))
+
+    async def write():
+        while (job := await to_write.get()) is not None:
+            rel_path, html, key = job
+            cache_path = cache.entry_path(key) if key is not None else None
+            await loop.run_in_executor(io_pool, _write, public_dir, rel_path, html, cache_path)
+            if key is not None:
+                cache.record(key, len(html))
+
+    # The initializer installs asset URLs and image sizes once per renderer, not per page
+    assets = (options.asset_urls, options.image_sizes)
+    if workers > 1:
+        renderer = ProcessPoolExecutor(max_workers=workers, initializer=set_page_assets, initargs=assets)
+    else:
+        renderer = ThreadPoolExecutor(max_workers=1, initializer=set_page_assets, initargs=assets)
+    io_pool = ThreadPoolExecutor(max_workers=io_threads)
+    try:
+        for page in await loop.run_in_executor(io_pool, find_pages, content_dir):
+            if in_shard(page[0], options.shard):
+                pending.put_nowait(page)
+        async with asyncio.TaskGroup() as group:
+            readers = [group.create_task(read()) for _ in range(io_threads)]
+            # Two renderers per worker, so a worker never waits on the loop for its next page
+            renderers = [group.create_task(render()) for _ in range(workers * 2)]
+            writers = [group.create_task(write()) for _ in range(io_threads)]
+            group.create_task(_close_after(readers, to_render, len(renderers)))
+            group.create_task(_close_after(renderers, to_write, len(writers)))
+    except ExceptionGroup as errors:
+        # Surface the first failure itself, as the other build paths do
+        raise errors.exceptions[0]
+    finally:
+        renderer.shutdown(cancel_futures=True)
+        io_pool.shutdown()
+    if cache is not None:
+        cache.save()
+    return stats
+
+def build_site_pipelined(content_dir, public_dir, **kwargs):
+    '''Runs build_site_async to completion from synchronous code'''
+    return asyncio.run(build_site_async(content_dir, public_dir, **kwargs))
@@ -0,0 +1,95 @@
+import json
+import os
+from cache import write_atomic
+from links import page_url
+from stats import Stats
+
+SEARCH_DIR = 'search'
+SEARCH_INDEX_NAME = 'index.json'
+SEARCH_INDEX_VERSION = 1
+DEFAULT_PREFIX_LENGTH = 2
+
+class SearchStats(Stats):
+    FIELDS = ('pages', 'terms', 'postings', 'shards', 'bytes_written', 'removed_shards')
+    SUMMARY = ('indexed {terms} terms ({postings} postings) from {pages} pages '
+               'into {shards} shards ({bytes_written} bytes), removed {removed_shards} stale shards')
+
+def shard_name(term, prefix_length=DEFAULT_PREFIX_LENGTH):
+    '''Returns the shard holding term: its prefix, or _ and the prefix's UTF-8 hex when not ASCII alphanumeric'''
+    prefix = term[:prefix_length]
+    if prefix.isascii() and prefix.isalnum():
+        return prefix
+    return '_' + prefix.encode('utf-8').hex()
+
+class SearchIndex():
+    '''An inverted index of page terms, written out as shards a browser loads on demand
+
+    Pages can be added in any order, as they come back from worker
+    processes: page ids are assigned by sorting page URLs when the index is
+    written, so the output only depends on the set of pages.
+
+    search/index.json lists the pages as [url, title, anchors] (a page's id
+    is its position) and the shard names. Each search/<shard>.json maps the
+    terms sharing a prefix (see shard_name) to a flat list of postings,
+    [page id delta, section, ...] in page id order: the first delta is the
+    page id itself, and section is 0 for the top of the page or 1 + the
+    position in the page's anchors of the heading the term first appears
+    under.
+    '''
+    def __init__(self, prefix_length=DEFAULT_PREFIX_LENGTH):
+        self.prefix_length = prefix_length
+        self.pages = {}  # page URL -> (title, anchors, {term: anchor})
+
+    def add_page(self, rel_path, title, anchors, terms):
+        self.pages[page_url(rel_path)] = (title, list(anchors), terms)
+
+    def shards(self):
+        '''Returns ([[url, title, anchors], ...], {shard name: {term: postings}})'''
+        pages = []
+        postings = {}  # term -> [postings, last page id]
+        for page_id, url in enumerate(sorted(self.pages)):
+            title, anchors, terms = self.pages[url]
+            pages.append([url, title, anchors])
+            sections = {anchor: position for position, anchor in enumerate(anchors, start=1)}
+            for term, anchor in terms.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = [[], 0]
+                entry[0] += (page_id - entry[1], sections.get(anchor, 0))
+                entry[1] = page_id
+        shards = {}
+        for term, (term_postings, _) in postings.items():
+            shards.setdefault(shard_name(term, self.prefix_length), {})[term] = term_postings
+        return pages, shards
+
+    def write(self, public_dir):
+        '''Writes the index under public_dir/search, removing shards left over from older builds'''
+        search_dir = os.path.join(public_dir, SEARCH_DIR)
+        stats = SearchStats()
+        pages, shards = self.shards()
+        stats.pages = len(pages)
+        for name, terms in shards.items():
+            data = json.dumps(terms, sort_keys=True, separators=(',', ':')).encode('utf-8')
+            write_atomic(os.path.join(search_dir, name + '.json'), data)
+            stats.terms += len(terms)
+            stats.postings += sum(len(term_postings) for term_postings in terms.values()) // 2
+            stats.bytes_written += len(data)
+        stats.shards = len(shards)
+        index = {'version': SEARCH_INDEX_VERSION, 'prefix_length': self.prefix_length,
+                 'pages': pages, 'shards': sorted(shards)}
+        data = json.dumps(index, separators=(',', ':')).encode('utf-8')
+        write_atomic(os.path.join(search_dir, SEARCH_INDEX_NAME), data)
+        stats.bytes_written += len(data)
+
+        for filename in os.listdir(search_dir):
+            name, extension = os.path.splitext(filename)
+            if extension == '.json' and filename != SEARCH_INDEX_NAME and name not in shards:
+                os.remove(os.path.join(search_dir, filename))
+                stats.removed_shards += 1
+        return stats
+
+    def summary(self):
+        return f'{len(self.pages)} pages'
+
+    def __repr__(self):
+        return f'SearchIndex({self.summary()})'
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from assets import copy_files, file_hash, load_manifest, remove_file, save_manifest, walk_files
+from cache import write_atomic
+from stats import Stats
+
+SHARD_MANIFEST_NAME = 'shard-manifest.json'
+SHARD_MANIFEST_VERSION = 1
+
+class MergeStats(Stats):
+    FIELDS = ('shards', 'files', 'duplicate_files', 'bytes_copied', 'removed_files')
+    SUMMARY = ('merged {files} files ({bytes_copied} bytes) from {shards} shards, '
+               '{duplicate_files} identical files built by several shards, '
+               'removed {removed_files} files an earlier merge wrote that no shard built')
+
+def parse_shard(text):
+    '''Parses "i/N" into (i, N), where 1 <= i <= N'''
+    index, _, count = text.partition('/')
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        raise ValueError(f'shard must look like i/N, not {text!r}')
+    if not 1 <= index <= count:
+        raise ValueError(f'shard {text} is out of range, i must be between 1 and N')
+    return index, count
+
+def page_shard(rel_path, count):
+    '''Returns the shard, 1 to count, a page belongs to
+
+    Based on a hash of the page's path with / separators, so every machine
+    and every run puts a page in the same shard.
+    '''
+    digest = hashlib.sha256(rel_path.replace(os.sep, '/').encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % count + 1
+
+def in_shard(rel_path, shard):
+    '''Whether a page is built by shard, an (i, N) pair, or by every build when shard is None'''
+    return shard is None or page_shard(rel_path, shard[1]) == shard[0]
+
+def write_shard_manifest(output_dir, shard, cache_path=None, workers=None):
+    '''Records every file a shard built in output_dir as {path: [size, sha256]}
+
+    With cache_path, digests are cached there by size and mtime, as
+    fingerprint_assets does, so files copied unchanged into a clean output,
+    such as static images, are not rehashed on every shard build.
+    '''
+    old_hashes = load_manifest(cache_path) if cache_path else {}
+    new_hashes = {}
+    to_hash = []
+    for rel_path, st in walk_files(output_dir):
+        if rel_path == SHARD_MANIFEST_NAME:
+            continue
+        entry = old_hashes.get(rel_path)
+        if entry is not None and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            new_hashes[rel_path] = entry
+        else:
+            to_hash.append((rel_path, st))
+    if workers is None:
+        workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = executor.map(file_hash, [os.path.join(output_dir, rel_path) for rel_path, _ in to_hash])
+        for (rel_path, st), digest in zip(to_hash, digests):
+            new_hashes[rel_path] = [st.st_size, st.st_mtime_ns, digest]
+    if cache_path:
+        save_manifest(cache_path, new_hashes)
+    manifest = {
+        rel_path.replace(os.sep, '/'): [size, digest]
+        for rel_path, (size, _, digest) in sorted(new_hashes.items())
+    }
+    data = json.dumps({'version': SHARD_MANIFEST_VERSION, 'shard': list(shard), 'files': manifest},
+                      indent=2, sort_keys=True)
+    write_atomic(os.path.join(output_dir, SHARD_MANIFEST_NAME), data.encode('utf-8'))
+    return manifest
+
+def load_shard_manifest(shard_dir):
+    path = os.path.join(shard_dir, SHARD_MANIFEST_NAME)
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise Exception(f'{shard_dir} has no readable shard manifest: {e}')
+    if manifest.get('version') != SHARD_MANIFEST_VERSION:
+        raise Exception(f'{path} has an unsupported version')
+    return manifest
+
+def merge_shards(shard_dirs, public_dir, manifest_path, workers=None, mode='copy'):
+    '''Combines the outputs of every shard of a build into public_dir
+
+    The shards must be exactly 1/N to N/N. A file built by several shards,
+    such as a static file, must have the same contents in all of them;
+    otherwise nothing is copied and an Exception lists the conflicting
+    paths. The manifest records every file a merge wrote, as prune_pages'
+    does for pages, so files an earlier merge wrote that no shard built any
+    more, such as deleted pages, are removed and anything else in
+    public_dir is left alone. Returns a MergeStats.
+    '''
+    old_manifest = load_manifest(manifest_path)
+    stats = MergeStats()
+    manifests = [(shard_dir, load_shard_manifest(shard_dir)) for shard_dir in shard_dirs]
+    manifests.sort(key=lambda item: item[1]['shard'][0])
+    counts = {manifest['shard'][1] for _, manifest in manifests}
+    indexes = sorted(manifest['shard'][0] for _, manifest in manifests)
+    if len(counts) != 1 or indexes != list(range(1, counts.pop() + 1)):
+        raise Exception(f'expected shards 1/N to N/N once each, got {indexes} of {len(manifests)} shard manifests')
+    stats.shards = len(manifests)
+
+    sources = {}  # path -> (shard dir, [size, sha256])
+    conflicts = []
+    for shard_dir, manifest in manifests:
+        for rel_path, entry in sorted(manifest['files'].items()):
+            existing = sources.get(rel_path)
+            if existing is None:
+                sources[rel_path] = (shard_dir, entry)
+            elif existing[1] == entry:
+                stats.duplicate_files += 1
+            else:
+                conflicts.append(f'{rel_path} differs between {existing[0]} and {shard_dir}')
+    if conflicts:
+        raise Exception(f'{len(conflicts)} conflicting files:\n' + '\n'.join(conflicts))
+
+    pairs = []
+    for rel_path, (shard_dir, (size, _)) in sorted(sources.items()):
+        native_path = rel_path.replace('/', os.sep)
+        pairs.append((os.path.join(shard_dir, native_path), os.path.join(public_dir, native_path)))
+        stats.bytes_copied += size
+    for rel_path in sorted(old_manifest.keys() - sources.keys()):
+        native_path = rel_path.replace('/', os.sep)
+        if os.path.exists(os.path.join(public_dir, native_path)):
+            remove_file(public_dir, native_path)
+            stats.removed_files += 1
+    copy_files(pairs, workers, mode)
+    stats.files = len(pairs)
+    save_manifest(manifest_path, {rel_path: entry for rel_path, (_, entry) in sources.items()})
+    return stats
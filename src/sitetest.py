@@ -0,0 +1,35 @@
+import os
+import tempfile
+import unittest
+
+def read_tree(root):
+    '''Returns {relative path: bytes} for every file under root'''
+    tree = {}
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, "rb") as f:
+                tree[os.path.relpath(path, root)] = f.read()
+    return tree
+
+class SiteTestCase(unittest.TestCase):
+    '''A test case with a temporary site directory, self.tmp, removed after every test
+
+    write() puts files under WRITE_DIR, a directory of the temporary site
+    ("" for its top), unless given another root or an absolute path.
+    '''
+    WRITE_DIR = ""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path, data, root=None):
+        '''Writes str or bytes data to path, creating its directories, and returns the full path'''
+        path = os.path.join(root or os.path.join(self.tmp.name, self.WRITE_DIR), path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb" if isinstance(data, bytes) else "w") as f:
+            f.write(data)
+        return path
@@ -0,0 +1,19 @@
+class Stats():
+    '''Counters kept by one step of the build, reported on one line
+
+    Subclasses name their counters in FIELDS, which all start at 0, and
+    word their summary in SUMMARY, a str.format template over them.
+    '''
+    FIELDS = ()
+    SUMMARY = ''
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+
+    def summary(self):
+        '''Returns a one line, human readable summary of the counters'''
+        return self.SUMMARY.format(**vars(self))
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.summary()})'
@@ -0,0 +1,80 @@
+import os
+import re
+
+SLOT_PATTERN = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+URL_ATTRIBUTE_PATTERN = re.compile(r'\b(href|src)="([^"]*)"')
+
+class Template():
+    '''A page template parsed once into literal segments and {{ Name }} slots
+
+    Rendering joins (or streams) the segments with the slot values, so the
+    template text is never rescanned per page.
+    '''
+    def __init__(self, source):
+        self.source = source
+        parts = SLOT_PATTERN.split(source)
+        self.segments = parts[0::2]  # always one more segment than slots
+        self.slots = parts[1::2]
+        self._rewritten = None  # (asset_urls, Template) from the last with_asset_urls call
+
+    def iter_render(self, values):
+        '''Yields the rendered template piece by piece
+
+        Each slot value is either a str or an iterable of str, such as
+        HTMLNode.iter_html(), which is consumed in place.
+        '''
+        for segment, slot in zip(self.segments, self.slots):
+            yield segment
+            if slot not in values:
+                raise ValueError(f'missing value for template slot {slot}')
+            value = values[slot]
+            if isinstance(value, str):
+                yield value
+            else:
+                yield from value
+        yield self.segments[-1]
+
+    def render(self, values):
+        return ''.join(self.iter_render(values))
+
+    def write_to(self, stream, values):
+        stream.writelines(self.iter_render(values))
+
+    def with_asset_urls(self, asset_urls):
+        '''Returns this template with href/src attributes mapped through asset_urls
+
+        The rewrite happens once per mapping, not per rendered page.
+        '''
+        if not asset_urls:
+            return self
+        if self._rewritten is not None and self._rewritten[0] is asset_urls:
+            return self._rewritten[1]
+        source = URL_ATTRIBUTE_PATTERN.sub(lambda m: f'{m[1]}="{asset_urls.get(m[2], m[2])}"', self.source)
+        template = Template(source)
+        self._rewritten = (asset_urls, template)
+        return template
+
+    def __repr__(self):
+        return f'Template(slots={self.slots})'
+
+# path -> ((mtime_ns, size), Template)
+_compiled = {}
+
+def load_template(path):
+    '''Returns the compiled Template for path, reparsing only when the file changes'''
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    cached = _compiled.get(path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+    with open(path, encoding='utf-8') as f:
+        template = Template(f.read())
+    _compiled[path] = (stamp, template)
+    return template
+
+def compiled_templates():
+    '''Returns the number of compiled templates held in memory'''
+    return len(_compiled)
+
+def clear_template_cache():
+    _compiled.clear()
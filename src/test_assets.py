@@ -0,0 +1,120 @@
+import os
+import unittest
+from assets import sync_dir, load_manifest, copy_tree, copy_file, walk_files
+from sitetest import SiteTestCase
+
+class TestSyncDir(SiteTestCase):
+    WRITE_DIR = "static"
+
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.tmp.name, "static")
+        self.destination = os.path.join(self.tmp.name, "public")
+        self.manifest = os.path.join(self.tmp.name, ".cache", "manifest.json")
+        self.write("index.css", "body {}")
+        self.write("images/logo.png", "png bytes")
+
+    def read(self, rel_path):
+        with open(os.path.join(self.destination, rel_path)) as f:
+            return f.read()
+
+    def test_first_sync_copies_everything(self):
+        stats = sync_dir(self.source, self.destination, self.manifest)
+        self.assertEqual(stats.copied_files, 2)
+        self.assertEqual(stats.copied_bytes, len("body {}") + len("png bytes"))
+        self.assertEqual(stats.skipped_files, 0)
+        self.assertEqual(self.read("images/logo.png"), "png bytes")
+        self.assertIn("index.css", load_manifest(self.manifest))
+
+    def test_second_sync_skips_unchanged(self):
+        sync_dir(self.source, self.destination, self.manifest)
+        mtime = os.stat(os.path.join(self.destination, "index.css")).st_mtime_ns
+        stats = sync_dir(self.source, self.destination, self.manifest)
+        self.assertEqual(stats.copied_files, 0)
+        self.assertEqual(stats.skipped_files, 2)
+        self.assertEqual(mtime, os.stat(os.path.join(self.destination, "index.css")).st_mtime_ns)
+
+    def test_changed_and_missing_files_are_copied(self):
+        sync_dir(self.source, self.destination, self.manifest)
+        path = self.write("index.css", "body { color: red; }")
+        os.utime(path, ns=(1, 1))
+        os.remove(os.path.join(self.destination, "images", "logo.png"))
+        stats = sync_dir(self.source, self.destination, self.manifest)
+        self.assertEqual(stats.copied_files, 2)
+        self.assertEqual(self.read("index.css"), "body { color: red; }")
+
+    def test_hash_skips_touched_but_identical_files(self):
+        sync_dir(self.source, self.destination, self.manifest, use_hash=True)
+        os.utime(os.path.join(self.source, "index.css"), ns=(1, 1))
+        stats = sync_dir(self.source, self.destination, self.manifest, use_hash=True)
+        self.assertEqual(stats.copied_files, 0)
+        self.assertEqual(stats.skipped_files, 2)
+
+    def test_orphans_deleted_but_other_files_kept(self):
+        sync_dir(self.source, self.destination, self.manifest)
+        self.write("index.html", "<html></html>", root=self.destination)
+        os.remove(os.path.join(self.source, "images", "logo.png"))
+        stats = sync_dir(self.source, self.destination, self.manifest)
+        self.assertEqual(stats.deleted_files, 1)
+        self.assertFalse(os.path.exists(os.path.join(self.destination, "images")))
+        self.assertEqual(self.read("index.html"), "<html></html>")
+
+    def test_missing_source(self):
+        with self.assertRaises(Exception):
+            sync_dir(os.path.join(self.tmp.name, "nope"), self.destination, self.manifest)
+
+
+class TestCopyTree(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.tmp.name, "static")
+        self.destination = os.path.join(self.tmp.name, "public")
+        for i in range(20):
+            self.write(os.path.join(self.source, f"dir{i % 3}", "nested", f"file{i}.txt"),
+                       f"content {i}" * (i * 1000 + 1))
+
+    def assertTreesEqual(self):
+        source_files = dict(walk_files(self.source))
+        destination_files = dict(walk_files(self.destination))
+        self.assertEqual(source_files.keys(), destination_files.keys())
+        for rel_path in source_files:
+            with open(os.path.join(self.source, rel_path), "rb") as a, open(os.path.join(self.destination, rel_path), "rb") as b:
+                self.assertEqual(a.read(), b.read())
+            self.assertEqual(source_files[rel_path].st_mtime_ns, destination_files[rel_path].st_mtime_ns)
+
+    def test_copy_tree_parallel(self):
+        stale = os.path.join(self.destination, "stale.txt")
+        os.makedirs(self.destination)
+        open(stale, "w").close()
+        stats = copy_tree(self.source, self.destination, workers=4)
+        self.assertEqual(stats.copied_files, 20)
+        self.assertFalse(os.path.exists(stale))
+        self.assertTreesEqual()
+
+    def test_copy_tree_serial(self):
+        copy_tree(self.source, self.destination, workers=1)
+        self.assertTreesEqual()
+
+    def test_copy_tree_hardlink(self):
+        copy_tree(self.source, self.destination, mode="hardlink")
+        self.assertTreesEqual()
+        rel_path = os.path.join("dir0", "nested", "file0.txt")
+        self.assertTrue(os.path.samefile(os.path.join(self.source, rel_path), os.path.join(self.destination, rel_path)))
+
+    def test_copy_tree_reflink_falls_back(self):
+        copy_tree(self.source, self.destination, mode="reflink")
+        self.assertTreesEqual()
+
+    def test_copy_file_replaces_hardlink(self):
+        source = os.path.join(self.source, "dir0", "nested", "file0.txt")
+        destination = os.path.join(self.tmp.name, "linked.txt")
+        copy_file(source, destination, mode="hardlink")
+        copy_file(source, destination)
+        self.assertFalse(os.path.samefile(source, destination))
+
+    def test_copy_file_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            copy_file("a", "b", mode="teleport")
+
+if __name__ == "__main__":
+    unittest.main()
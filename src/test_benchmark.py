@@ -0,0 +1,50 @@
+import unittest
+from benchmark import StageResult, bench_nodes, bench_pipeline, compare_to_baseline
+from corpus import CorpusGenerator
+from markdown import markdown_to_html_node
+
+class TestCorpusGenerator(unittest.TestCase):
+    def test_deterministic(self):
+        self.assertEqual(CorpusGenerator(seed=7).document(), CorpusGenerator(seed=7).document())
+        self.assertNotEqual(CorpusGenerator(seed=7).document(), CorpusGenerator(seed=8).document())
+
+    def test_documents_render(self):
+        for generator in (CorpusGenerator(seed=1), CorpusGenerator(seed=2, pathological=10, inline_density=0.5)):
+            html = markdown_to_html_node(generator.document()).to_html()
+            self.assertTrue(html.startswith("<div>"))
+
+    def test_block_mix(self):
+        document = CorpusGenerator(blocks=5, block_mix={"code": 1}).document()
+        self.assertEqual(document.count("```"), 10)
+
+
+class TestBenchPipeline(unittest.TestCase):
+    def test_smoke(self):
+        generator = CorpusGenerator(seed=3, blocks=20)
+        results = bench_pipeline([generator.document() for _ in range(2)], repeat=1)
+        names = [result.name for result in results]
+        self.assertIn("text_to_textnodes", names)
+        self.assertIn("iter_numbered_blocks", names)
+        self.assertTrue(all(result.items > 0 for result in results))
+
+    def test_bench_nodes_reports_per_node(self):
+        results = bench_nodes(1000, repeat=1)
+        names = [result.name for result in results]
+        self.assertIn("TextNode() with __dict__", names)
+        self.assertIn("LeafNode() with __dict__", names)
+        report = results[0].report()
+        self.assertIn("ns/node", report)
+        self.assertIn("bytes/node", report)
+
+
+class TestCompareToBaseline(unittest.TestCase):
+    def test_regressions(self):
+        results = [StageResult("fast", 1.0, 0), StageResult("slow", 2.0, 0), StageResult("new", 5.0, 0)]
+        baseline = {"fast": 1.0, "slow": 1.0}
+        regressions = compare_to_baseline(results, baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertTrue(regressions[0].startswith("slow:"))
+
+
+if __name__ == "__main__":
+    unittest.main()
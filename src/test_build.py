@@ -0,0 +1,188 @@
+import contextlib
+import io
+import os
+import unittest
+from unittest import mock
+import main
+from build import RenderOptions, build_site, chunk_pages, find_pages, output_path_for, prune_pages
+from cache import PageCache
+from markdown import disable_inline_memo
+from sitetest import SiteTestCase, read_tree
+
+class TestBuildSite(SiteTestCase):
+    WRITE_DIR = "content"
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        for i in range(30):
+            self.write(os.path.join(f"section{i % 4}", f"page{i}.md"),
+                       f"# Page {i}\n\nSome **bold** text.\n\n" + "- item\n" * i + "- last")
+        self.write("notes.txt", "not markdown")
+
+    def test_build_site_serial(self):
+        public = os.path.join(self.tmp.name, "public")
+        stats = build_site(self.content, public, workers=1)
+        self.assertEqual(stats.pages, 30)
+        with open(os.path.join(public, "section0", "page4.html")) as f:
+            html = f.read()
+        self.assertTrue(html.startswith('<div><h1 id="page-4">Page 4</h1><p>Some <b>bold</b> text.</p><ul>'))
+        self.assertNotIn("notes.html", os.listdir(public))
+
+    def test_parallel_build_matches_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        parallel = os.path.join(self.tmp.name, "parallel")
+        serial_stats = build_site(self.content, serial, workers=1)
+        parallel_stats = build_site(self.content, parallel, workers=3)
+        self.assertEqual(read_tree(serial), read_tree(parallel))
+        self.assertEqual(serial_stats.summary(), parallel_stats.summary())
+
+    def test_cached_build_matches_uncached(self):
+        uncached = os.path.join(self.tmp.name, "uncached")
+        cached = os.path.join(self.tmp.name, "cached")
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        build_site(self.content, uncached, workers=1)
+
+        cache = PageCache(cache_dir)
+        stats = build_site(self.content, cached, workers=2, cache=cache)
+        self.assertEqual((stats.cached_pages, cache.hits, cache.misses), (0, 0, 30))
+        self.assertEqual(read_tree(uncached), read_tree(cached))
+
+        with open(os.path.join(self.content, "section1", "page1.md"), "a") as f:
+            f.write("\n\nA new paragraph")
+        cache = PageCache(cache_dir)
+        stats = build_site(self.content, cached, workers=2, cache=cache)
+        self.assertEqual((stats.cached_pages, cache.hits, cache.misses), (29, 29, 1))
+        with open(os.path.join(cached, "section1", "page1.html")) as f:
+            self.assertTrue(f.read().endswith("<p>A new paragraph</p></div>"))
+
+    def write_template(self, text):
+        return self.write(os.path.join(self.tmp.name, "template.html"), text)
+
+    def test_cache_key_includes_template(self):
+        cache = PageCache(os.path.join(self.tmp.name, "cache"))
+        build_site(self.content, os.path.join(self.tmp.name, "a"), workers=1, cache=cache)
+        template_path = self.write_template("<main>{{ Content }}</main>")
+        stats = build_site(self.content, os.path.join(self.tmp.name, "b"), workers=1, cache=cache,
+                           options=RenderOptions(template_path))
+        self.assertEqual(stats.cached_pages, 0)
+
+    def test_template_wraps_pages(self):
+        template_path = self.write_template("<title>{{ Title }}</title><article>{{ Content }}</article>")
+        serial = os.path.join(self.tmp.name, "serial")
+        parallel = os.path.join(self.tmp.name, "parallel")
+        build_site(self.content, serial, workers=1, options=RenderOptions(template_path))
+        build_site(self.content, parallel, workers=3, options=RenderOptions(template_path))
+        self.assertEqual(read_tree(serial), read_tree(parallel))
+        with open(os.path.join(serial, "section0", "page4.html")) as f:
+            html = f.read()
+        self.assertTrue(html.startswith('<title>Page 4</title><article><div><h1 id="page-4">Page 4</h1>'))
+        self.assertTrue(html.endswith("</div></article>"))
+
+    def test_template_title_is_escaped(self):
+        with open(os.path.join(self.content, "section0", "page0.md"), "w") as f:
+            f.write("# Fish & <Chips>")
+        template_path = self.write_template("<title>{{ Title }}</title>{{ Content }}")
+        public = os.path.join(self.tmp.name, "public")
+        build_site(self.content, public, workers=1, options=RenderOptions(template_path))
+        with open(os.path.join(public, "section0", "page0.html")) as f:
+            self.assertEqual(f.read(), '<title>Fish &amp; &lt;Chips&gt;</title><div><h1 id="fish--chips">Fish &amp; &lt;Chips&gt;</h1></div>')
+
+    def test_empty_pages_render_an_empty_div(self):
+        self.write("empty.md", "")
+        self.write("blank.md", "  \n\n\t\n")
+        template_path = self.write_template("<title>{{ Title }}</title>{{ Content }}")
+        public = os.path.join(self.tmp.name, "public")
+        stats = build_site(self.content, public, workers=2, options=RenderOptions(template_path))
+        self.assertEqual(stats.pages, 32)
+        for name in ("empty.html", "blank.html"):
+            with open(os.path.join(public, name)) as f:
+                self.assertEqual(f.read(), "<title></title><div></div>")
+        streamed = os.path.join(self.tmp.name, "streamed")
+        with mock.patch("build.STREAM_THRESHOLD", 0):
+            build_site(self.content, streamed, workers=1, options=RenderOptions(template_path))
+        self.assertEqual(read_tree(public), read_tree(streamed))
+
+    def test_streamed_pages_match_rendered_pages_with_template(self):
+        template_path = self.write_template("<title>{{ Title }}</title>{{ Content }}")
+        rendered = os.path.join(self.tmp.name, "rendered")
+        streamed = os.path.join(self.tmp.name, "streamed")
+        build_site(self.content, rendered, workers=1, options=RenderOptions(template_path))
+        with mock.patch("build.STREAM_THRESHOLD", 0):
+            build_site(self.content, streamed, workers=1, options=RenderOptions(template_path))
+        self.assertEqual(read_tree(rendered), read_tree(streamed))
+
+    def test_inline_memo_matches_unmemoized_build(self):
+        plain = os.path.join(self.tmp.name, "plain")
+        memoized = os.path.join(self.tmp.name, "memoized")
+        build_site(self.content, plain, workers=1)
+        try:
+            stats = build_site(self.content, memoized, workers=2, options=RenderOptions(memo_size=16))
+            self.assertGreater(stats.memo_hits, 0)
+            self.assertIn("hit rate", stats.summary())
+            stats = build_site(self.content, memoized, workers=1, options=RenderOptions(memo_size=16))
+            self.assertGreater(stats.memo_hits, 0)
+        finally:
+            disable_inline_memo()
+        self.assertEqual(read_tree(plain), read_tree(memoized))
+
+    def test_streamed_pages_match_rendered_pages(self):
+        rendered = os.path.join(self.tmp.name, "rendered")
+        streamed = os.path.join(self.tmp.name, "streamed")
+        build_site(self.content, rendered, workers=1)
+        with mock.patch("build.STREAM_THRESHOLD", 0):
+            stats = build_site(self.content, streamed, workers=1, cache=PageCache(os.path.join(self.tmp.name, "cache")))
+        self.assertEqual(stats.cached_pages, 0)
+        self.assertEqual(read_tree(rendered), read_tree(streamed))
+
+    def test_chunk_pages(self):
+        pages = find_pages(self.content)
+        chunks = chunk_pages(pages, 8)
+        self.assertEqual([path for chunk in chunks for path in chunk], [path for path, _ in pages])
+        self.assertLessEqual(len(chunks), 9)
+
+    def test_output_path_for(self):
+        self.assertEqual(output_path_for("public", os.path.join("blog", "post.md")),
+                         os.path.join("public", "blog", "post.html"))
+
+    def test_missing_content(self):
+        with self.assertRaises(Exception):
+            build_site(os.path.join(self.tmp.name, "nope"), self.tmp.name)
+
+    def test_prune_pages(self):
+        public = os.path.join(self.tmp.name, "public")
+        manifest = os.path.join(self.tmp.name, "cache", "page-manifest.json")
+        build_site(self.content, public, workers=1)
+        self.assertEqual(prune_pages(self.content, public, manifest), [])
+        self.write(os.path.join(public, "section3", "extra.html"), "not from a page")
+        os.remove(os.path.join(self.content, "section1", "page1.md"))
+        for i in range(3, 30, 4):
+            os.remove(os.path.join(self.content, "section3", f"page{i}.md"))
+        removed = prune_pages(self.content, public, manifest)
+        self.assertEqual(removed[0], os.path.join("section1", "page1.html"))
+        self.assertEqual(len(removed), 8)
+        self.assertFalse(os.path.exists(os.path.join(public, "section1", "page1.html")))
+        self.assertTrue(os.path.exists(os.path.join(public, "section1", "page5.html")))
+        # Only what a page build wrote is deleted
+        self.assertEqual(os.listdir(os.path.join(public, "section3")), ["extra.html"])
+        self.assertEqual(prune_pages(self.content, public, manifest), [])
+
+    def test_rebuild_removes_deleted_pages(self):
+        site = self.tmp.name
+        self.write(os.path.join(site, "static", "index.css"), "body {}")
+        self.write(os.path.join("blog", "post.md"), "# Post\n\n" + "A long post. " * 200)
+        argv = ["--site", site, "--workers", "1", "--gzip"]
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.main(argv)
+            post = os.path.join(site, "public", "blog", "post.html")
+            self.assertTrue(os.path.exists(post + ".gz"))
+            os.remove(os.path.join(self.content, "blog", "post.md"))
+            main.main(argv)
+        self.assertFalse(os.path.exists(post))
+        self.assertFalse(os.path.exists(post + ".gz"))
+        self.assertFalse(os.path.exists(os.path.dirname(post)))
+        self.assertTrue(os.path.exists(os.path.join(site, "public", "section0", "page0.html")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import unittest
+from cache import PageCache, content_key
+from sitetest import SiteTestCase
+
+class TestPageCache(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.cache_dir = os.path.join(self.tmp.name, "pages")
+
+    def test_get_and_put(self):
+        cache = PageCache(self.cache_dir)
+        self.assertIsNone(cache.get("a" * 64))
+        cache.put("a" * 64, b"<p>cached</p>")
+        self.assertEqual(cache.get("a" * 64), b"<p>cached</p>")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_survives_across_runs(self):
+        cache = PageCache(self.cache_dir)
+        cache.put("b" * 64, b"<p>persisted</p>")
+        cache.save()
+        cache = PageCache(self.cache_dir)
+        self.assertEqual(cache.get("b" * 64), b"<p>persisted</p>")
+
+    def test_lru_eviction(self):
+        cache = PageCache(self.cache_dir, max_bytes=20)
+        cache.put("1" * 64, b"x" * 10)
+        cache.put("2" * 64, b"x" * 10)
+        cache.get("1" * 64)
+        cache.put("3" * 64, b"x" * 10)
+        cache.save()
+        self.assertEqual(cache.evictions, 1)
+        self.assertIsNone(cache.get("2" * 64))
+        self.assertFalse(os.path.exists(cache.entry_path("2" * 64)))
+        self.assertIsNotNone(cache.get("1" * 64))
+        self.assertIsNotNone(cache.get("3" * 64))
+        self.assertEqual(cache.total_bytes, 20)
+
+    def test_missing_entry_file_is_a_miss(self):
+        cache = PageCache(self.cache_dir)
+        cache.put("c" * 64, b"data")
+        os.remove(cache.entry_path("c" * 64))
+        self.assertIsNone(cache.get("c" * 64))
+        self.assertEqual(cache.total_bytes, 0)
+
+    def test_read_leaves_the_index_to_count_lookup(self):
+        cache = PageCache(self.cache_dir)
+        cache.put("d" * 64, b"data")
+        cache.put("e" * 64, b"more")
+        self.assertEqual(cache.read("d" * 64), b"data")
+        self.assertIsNone(cache.read("f" * 64))
+        self.assertEqual((cache.hits, cache.misses, list(cache.entries)), (0, 0, ["d" * 64, "e" * 64]))
+        cache.count_lookup("d" * 64, b"data")
+        cache.count_lookup("f" * 64, None)
+        self.assertEqual((cache.hits, cache.misses, list(cache.entries)), (1, 1, ["e" * 64, "d" * 64]))
+        cache.touch("e" * 64)
+        self.assertEqual((cache.hits, cache.misses, list(cache.entries)), (1, 1, ["d" * 64, "e" * 64]))
+
+    def test_content_key(self):
+        self.assertEqual(content_key("a", b"b"), content_key(b"a", "b"))
+        self.assertNotEqual(content_key("ab", "c"), content_key("a", "bc"))
+
+
+if __name__ == "__main__":
+    unittest.main()
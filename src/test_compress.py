@@ -0,0 +1,83 @@
+import gzip
+import os
+import unittest
+from compress import compress_dir, compress_paths, gzip_bytes
+from sitetest import SiteTestCase
+
+class TestCompressDir(SiteTestCase):
+    WRITE_DIR = "public"
+
+    def setUp(self):
+        super().setUp()
+        self.public = os.path.join(self.tmp.name, "public")
+        self.manifest = os.path.join(self.tmp.name, "cache", "gzip-manifest.json")
+        self.write("index.html", b"<p>hello world</p>" * 200)
+        self.write("css/index.css", b"body { color: red; }\n" * 100)
+        self.write("tiny.css", b"a{}")
+        self.write("random.js", os.urandom(4096))
+        self.write("images/logo.png", b"\x89PNG" * 1000)
+
+    def gz_exists(self, rel_path):
+        return os.path.exists(os.path.join(self.public, rel_path + ".gz"))
+
+    def test_writes_gz_siblings(self):
+        stats = compress_dir(self.public, self.manifest, workers=2)
+        self.assertEqual((stats.compressed_files, stats.small_files, stats.poor_ratio_files), (2, 1, 1))
+        with open(os.path.join(self.public, "index.html.gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), b"<p>hello world</p>" * 200)
+        self.assertTrue(self.gz_exists("css/index.css"))
+        self.assertFalse(self.gz_exists("tiny.css"))
+        self.assertFalse(self.gz_exists("random.js"))
+        self.assertFalse(self.gz_exists("images/logo.png"))
+
+    def test_skips_unchanged_content(self):
+        compress_dir(self.public, self.manifest)
+        # Rewriting identical content (as every build does for pages) is not a change
+        self.write("index.html", b"<p>hello world</p>" * 200)
+        self.write("css/index.css", b"body { color: blue; }\n" * 100)
+        stats = compress_dir(self.public, self.manifest)
+        self.assertEqual((stats.compressed_files, stats.unchanged_files), (1, 1))
+        with open(os.path.join(self.public, "css", "index.css.gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), b"body { color: blue; }\n" * 100)
+
+    def test_level_change_and_missing_gz_recompress(self):
+        compress_dir(self.public, self.manifest)
+        os.remove(os.path.join(self.public, "index.html.gz"))
+        stats = compress_dir(self.public, self.manifest)
+        self.assertEqual((stats.compressed_files, stats.unchanged_files), (1, 1))
+        stats = compress_dir(self.public, self.manifest, level=1)
+        self.assertEqual(stats.compressed_files, 2)
+
+    def test_removes_stale_gz(self):
+        compress_dir(self.public, self.manifest)
+        os.remove(os.path.join(self.public, "css", "index.css"))
+        self.write("index.html", b"<p>short</p>")
+        stats = compress_dir(self.public, self.manifest)
+        self.assertEqual(stats.removed_files, 2)
+        self.assertFalse(self.gz_exists("css/index.css"))
+        self.assertFalse(self.gz_exists("index.html"))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "css")))
+
+    def test_compress_paths_refreshes_rewritten_files(self):
+        compress_dir(self.public, self.manifest)
+        self.write("index.html", b"<p>changed</p>" * 200)
+        self.write("css/index.css", b"a{}")
+        stats = compress_paths(self.public, ["index.html", os.path.join("css", "index.css")], self.manifest)
+        self.assertEqual((stats.compressed_files, stats.small_files, stats.removed_files), (1, 1, 1))
+        with open(os.path.join(self.public, "index.html.gz"), "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()), b"<p>changed</p>" * 200)
+        self.assertFalse(self.gz_exists("css/index.css"))
+        self.assertEqual(compress_dir(self.public, self.manifest).compressed_files, 0)
+
+    def test_gzip_bytes_is_reproducible(self):
+        data = b"same input" * 100
+        self.assertEqual(gzip_bytes(data), gzip_bytes(data))
+        self.assertEqual(gzip.decompress(gzip_bytes(data, level=1)), data)
+
+    def test_invalid_level(self):
+        with self.assertRaises(ValueError):
+            compress_dir(self.public, self.manifest, level=10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,5 @@
+import io
+import time
 import unittest
 from textnode import TextNode, TextType
 from conversions import *
@@ -158,6 +160,109 @@ class TestConversions(unittest.TestCase):
         ]
         self.assertListEqual(correct_result, text_to_textnodes(text))
 
+    def test_text_to_textnodes_unmatched_delimiters(self):
+        text = 'A **bold** word, a stray _underscore and a `tick'
+        correct_result = [
+            TextNode("A ", TextType.TEXT),
+            TextNode("bold", TextType.BOLD),
+            TextNode(" word, a stray _underscore and a `tick", TextType.TEXT),
+        ]
+        self.assertListEqual(correct_result, text_to_textnodes(text))
+
+    def test_text_to_textnodes_nested_delimiters(self):
+        text = '**bold and _italic_** then _italic with `code`_'
+        correct_result = [
+            TextNode("bold and _italic_", TextType.BOLD, children=[
+                TextNode("bold and ", TextType.TEXT),
+                TextNode("italic", TextType.ITALIC),
+            ]),
+            TextNode(" then ", TextType.TEXT),
+            TextNode("italic with `code`", TextType.ITALIC, children=[
+                TextNode("italic with ", TextType.TEXT),
+                TextNode("code", TextType.CODE),
+            ]),
+        ]
+        self.assertListEqual(correct_result, text_to_textnodes(text))
+        # Code spans are literal, nothing nests inside them
+        self.assertListEqual([TextNode("**not bold**", TextType.CODE)], text_to_textnodes("`**not bold**`"))
+
+    def test_text_to_textnodes_link_inside_bold(self):
+        text = 'See **[the docs](/docs) now** or _![logo](/l.png)_'
+        links = []
+        nodes = text_to_textnodes(text, links)
+        self.assertListEqual(nodes, [
+            TextNode("See ", TextType.TEXT),
+            TextNode("[the docs](/docs) now", TextType.BOLD, children=[
+                TextNode("the docs", TextType.LINK, "/docs"),
+                TextNode(" now", TextType.TEXT),
+            ]),
+            TextNode(" or ", TextType.TEXT),
+            TextNode("![logo](/l.png)", TextType.ITALIC, children=[TextNode("logo", TextType.IMAGE, "/l.png")]),
+        ])
+        self.assertEqual([(offset, node.url) for offset, node in links],
+                         [(text.index("[the"), "/docs"), (text.index("![logo"), "/l.png")])
+        html = "".join(text_node_to_html_node(node).to_html() for node in nodes)
+        self.assertEqual(html, 'See <b><a href="/docs">the docs</a> now</b> or <i><img src="/l.png" alt="logo"></img></i>')
+
+    def test_text_to_textnodes_empty_pairs_stay_text(self):
+        for text in ["__init__ method", "****", "``", "a ____ b"]:
+            self.assertListEqual([TextNode(text, TextType.TEXT)], text_to_textnodes(text), text)
+        self.assertListEqual(text_to_textnodes("**** and **bold**"), [
+            TextNode("**** and ", TextType.TEXT),
+            TextNode("bold", TextType.BOLD),
+        ])
+
+    def test_text_to_textnodes_intraword_underscores(self):
+        text = 'snake_case and [l](http://a_b)'
+        correct_result = [
+            TextNode("snake_case and ", TextType.TEXT),
+            TextNode("l", TextType.LINK, "http://a_b"),
+        ]
+        self.assertListEqual(correct_result, text_to_textnodes(text))
+        text = '_open and [l](http://a_b)'
+        correct_result = [
+            TextNode("_open and ", TextType.TEXT),
+            TextNode("l", TextType.LINK, "http://a_b"),
+        ]
+        self.assertListEqual(correct_result, text_to_textnodes(text))
+        self.assertListEqual([TextNode("snake_case", TextType.ITALIC)], text_to_textnodes('_snake_case_'))
+
+    def test_text_to_textnodes_image_inside_link(self):
+        text = '[![badge](https://img.example/b.png)](https://example.com)'
+        correct_result = [
+            TextNode("[", TextType.TEXT),
+            TextNode("badge", TextType.IMAGE, "https://img.example/b.png"),
+            TextNode("](https://example.com)", TextType.TEXT),
+        ]
+        self.assertListEqual(correct_result, text_to_textnodes(text))
+
+    def test_text_to_textnodes_adversarial_inputs(self):
+        def best_time(text):
+            timings = []
+            for _ in range(3):
+                start = time.perf_counter()
+                text_to_textnodes(text)
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        adversarial_patterns = [
+            lambda n: '[' * n,
+            lambda n: '[a](' * n,
+            lambda n: '![' * n + '](',
+            lambda n: '_' + 'a' * n,
+            lambda n: '**' * n + '*',
+            lambda n: '[x' * n + '](' + 'y' * n,
+        ]
+        size = 10000
+        for pattern in adversarial_patterns:
+            small, large = best_time(pattern(size)), best_time(pattern(size * 4))
+            # Quadratic scanning would make the large input ~16x slower
+            self.assertLess(large, max(small, 0.001) * 8)
+
+    def test_text_to_textnodes_unmatched_brackets_stay_text(self):
+        text = '[' * 1000 + 'a](' * 1000
+        self.assertListEqual([TextNode(text, TextType.TEXT)], text_to_textnodes(text))
+
     def test_markdown_to_blocks(self):
         md = """
 This is **bolded** paragraph
@@ -196,5 +301,17 @@ This is the same paragraph on a new line
         ]
         self.assertListEqual(correct_result, markdown_to_blocks(md))
 
+    def test_iter_blocks_matches_markdown_to_blocks(self):
+        md = "\n\n# Heading\n\n\nparagraph\nline two\n  \n\n\n\n- a\n- b\n\n   \n"
+        expected = markdown_to_blocks(md)
+        self.assertListEqual(expected, list(iter_blocks(md)))
+        self.assertListEqual(expected, list(iter_blocks(io.StringIO(md))))
+        self.assertListEqual(expected, list(iter_blocks(io.BytesIO(md.encode("utf-8")))))
+
+    def test_iter_blocks_is_lazy(self):
+        blocks = iter_blocks(io.StringIO("first\n\nsecond"))
+        self.assertEqual("first", next(blocks))
+        self.assertEqual("second", next(blocks))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
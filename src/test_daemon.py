@@ -0,0 +1,129 @@
+import os
+import subprocess
+import sys
+import time
+import unittest
+from unittest import mock
+import client
+import main
+from daemon import BuildDaemon, memory_usage
+from sitetest import SiteTestCase
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+class FakeBuilder():
+    def __init__(self):
+        self.calls = []
+
+    def build(self, argv):
+        self.calls.append(("build", argv))
+        print("built")
+
+    def rebuild(self, paths):
+        if not paths:
+            raise ValueError("nothing to rebuild")
+        return [("page", path) for path in paths]
+
+    def status(self):
+        return {"builds": len(self.calls)}
+
+    def trim(self):
+        self.calls.append(("trim",))
+
+class TestBuildDaemon(unittest.TestCase):
+    def test_handle(self):
+        builder = FakeBuilder()
+        daemon = BuildDaemon("unused.sock", builder)
+        response = daemon.handle({"command": "build", "args": ["--no-cache"]})
+        self.assertEqual((response["ok"], response["output"]), (True, "built\n"))
+        self.assertEqual(daemon.handle({"command": "rebuild", "paths": ["a.md"]})["output"],
+                         "Rebuilt 1 outputs: a.md\n")
+        failed = daemon.handle({"command": "rebuild", "paths": []})
+        self.assertFalse(failed["ok"])
+        self.assertIn("nothing to rebuild", failed["output"])
+        self.assertFalse(daemon.handle({"command": "unknown"})["ok"])
+        status = daemon.handle({"command": "status"})["status"]
+        self.assertEqual((status["requests"], status["caches"]), (4, {"builds": 1}))
+        self.assertGreater(status["memory_bytes"], 0)
+        self.assertEqual(builder.calls, [("build", ["--no-cache"])])
+
+    def test_memory_cap_trims_caches(self):
+        builder = FakeBuilder()
+        daemon = BuildDaemon("unused.sock", builder, max_memory=1)
+        daemon.handle({"command": "build"})
+        self.assertEqual(builder.calls[-1], ("trim",))
+        self.assertEqual(daemon.trims, 1)
+
+    def test_memory_cap_trims_again_only_after_growing(self):
+        builder = FakeBuilder()
+        daemon = BuildDaemon("unused.sock", builder, max_memory=800)
+        # RSS seen after each request and, when it trims, right after the trim
+        usage = iter([1000, 950, 990, 1100, 700, 790, 810, 700])
+        with mock.patch("daemon.memory_usage", lambda: (next(usage), 0)):
+            for _ in range(5):
+                daemon.handle({"command": "build"})
+        self.assertEqual(daemon.trims, 3)
+        self.assertEqual([call for call in builder.calls if call[0] == "trim"], [("trim",)] * 3)
+
+    def test_memory_usage(self):
+        current, peak = memory_usage()
+        self.assertGreater(current, 0)
+        self.assertGreaterEqual(peak, current // 2)
+
+class TestDaemonProcess(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.site = self.tmp.name
+        self.socket_path = os.path.join(self.site, "d.sock")
+        self.write(os.path.join("static", "index.css"), "body {}")
+        self.page = self.write(os.path.join("content", "index.md"), "# Hello")
+
+    def test_importing_main_does_not_build(self):
+        self.assertFalse(main.parse_args([]).daemon)
+
+    def test_merging_and_profiling_are_rejected(self):
+        daemon = BuildDaemon("unused.sock", main.SiteBuilder(["--site", self.site, "--daemon"]))
+        for args in (["--merge-shards", "shard1"], ["--profile"], ["--cprofile", "build.prof"]):
+            response = daemon.handle({"command": "build", "args": args})
+            self.assertFalse(response["ok"])
+            self.assertIn("can't be combined with --daemon", response["output"])
+        with self.assertRaisesRegex(SystemExit, "daemon builds"):
+            main.SiteBuilder(["--site", self.site]).build(["--profile"])
+        self.assertFalse(os.path.exists(os.path.join(self.site, "public")))
+
+    def test_build_rebuild_status_stop(self):
+        process = subprocess.Popen([sys.executable, MAIN, "--site", self.site, "--workers", "1",
+                                    "--daemon", "--socket", self.socket_path], stdout=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 30
+            while not os.path.exists(self.socket_path):
+                self.assertIsNone(process.poll())
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.05)
+            output = os.path.join(self.site, "public", "index.html")
+            with open(output) as f:
+                self.assertIn('<h1 id="hello">Hello</h1>', f.read())
+
+            with open(self.page, "w") as f:
+                f.write("# Changed")
+            response = client.send(self.socket_path, client.request_for("rebuild", [self.page]))
+            self.assertTrue(response["ok"], response["output"])
+            self.assertEqual(response["output"], "Rebuilt 1 outputs: index.md\n")
+            with open(output) as f:
+                self.assertIn('<h1 id="changed">Changed</h1>', f.read())
+
+            # The rebuild bypassed the page cache, the first build refills it for the second
+            for cached in ("0 from cache", "1 from cache"):
+                response = client.send(self.socket_path, client.request_for("build", ["--no-image-sizes"]))
+                self.assertTrue(response["ok"], response["output"])
+                self.assertIn(f"Pages: built 1 pages ({cached}", response["output"])
+            status = client.send(self.socket_path, client.request_for("status", []))["status"]
+            self.assertEqual((status["caches"]["builds"], status["caches"]["rebuilds"]), (3, 1))
+
+            self.assertTrue(client.send(self.socket_path, client.request_for("stop", []))["ok"])
+            self.assertEqual(process.wait(timeout=30), 0)
+            self.assertFalse(os.path.exists(self.socket_path))
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
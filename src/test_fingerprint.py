@@ -0,0 +1,72 @@
+import json
+import os
+import unittest
+from build import RenderOptions, build_site
+from conversions import set_asset_urls, text_node_to_html_node
+from fingerprint import ASSET_MANIFEST_NAME, fingerprint_assets, fingerprinted_path
+from sitetest import SiteTestCase
+from textnode import TextNode, TextType
+
+class TestFingerprint(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.public = os.path.join(self.tmp.name, "public")
+        self.cache_path = os.path.join(self.tmp.name, "cache", "fingerprints.json")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.static, "images", "tolkien.png"), "png bytes")
+
+    def tearDown(self):
+        set_asset_urls(None)
+        super().tearDown()
+
+    def test_fingerprinted_path(self):
+        self.assertEqual(fingerprinted_path(os.path.join("images", "tolkien.png"), "3f2a9c1d00ff"),
+                         os.path.join("images", "tolkien.3f2a9c1d.png"))
+        self.assertEqual(fingerprinted_path("LICENSE", "3f2a9c1d00ff"), "LICENSE.3f2a9c1d")
+
+    def test_fingerprint_assets(self):
+        urls, stats = fingerprint_assets(self.static, self.public, self.cache_path)
+        self.assertEqual(sorted(urls), ["/images/tolkien.png", "/index.css"])
+        self.assertRegex(urls["/images/tolkien.png"], r"^/images/tolkien\.[0-9a-f]{8}\.png$")
+        with open(os.path.join(self.public, urls["/index.css"].lstrip("/"))) as f:
+            self.assertEqual(f.read(), "body {}")
+        with open(os.path.join(self.public, ASSET_MANIFEST_NAME)) as f:
+            self.assertEqual(json.load(f), urls)
+        self.assertEqual((stats.hashed_files, stats.copied_files), (2, 2))
+
+        _, stats = fingerprint_assets(self.static, self.public, self.cache_path)
+        self.assertEqual((stats.hashed_files, stats.cached_hashes, stats.copied_files), (0, 2, 0))
+
+    def test_changed_file_replaces_old_fingerprint(self):
+        old_urls, _ = fingerprint_assets(self.static, self.public, self.cache_path)
+        self.write(os.path.join(self.static, "index.css"), "body { color: red; }")
+        st = os.stat(os.path.join(self.static, "index.css"))
+        os.utime(os.path.join(self.static, "index.css"), ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+        urls, stats = fingerprint_assets(self.static, self.public, self.cache_path)
+        self.assertNotEqual(urls["/index.css"], old_urls["/index.css"])
+        self.assertEqual((stats.hashed_files, stats.copied_files, stats.removed_files), (1, 1, 1))
+        self.assertFalse(os.path.exists(os.path.join(self.public, old_urls["/index.css"].lstrip("/"))))
+
+    def test_text_node_urls_are_rewritten(self):
+        set_asset_urls({"/images/tolkien.png": "/images/tolkien.3f2a9c1d.png"})
+        image = text_node_to_html_node(TextNode("Tolkien", TextType.IMAGE, "/images/tolkien.png"))
+        self.assertEqual(image.props["src"], "/images/tolkien.3f2a9c1d.png")
+        link = text_node_to_html_node(TextNode("elsewhere", TextType.LINK, "https://boot.dev"))
+        self.assertEqual(link.props["href"], "https://boot.dev")
+
+    def test_build_site_rewrites_pages_and_template(self):
+        urls, _ = fingerprint_assets(self.static, self.public, self.cache_path)
+        content = os.path.join(self.tmp.name, "content")
+        self.write(os.path.join(content, "index.md"), "# Home\n\n![Tolkien](/images/tolkien.png)")
+        template_path = os.path.join(self.tmp.name, "template.html")
+        self.write(template_path, '<link href="/index.css" rel="stylesheet">{{ Content }}')
+        for workers in (1, 2):
+            build_site(content, self.public, workers=workers, options=RenderOptions(template_path, asset_urls=urls))
+            with open(os.path.join(self.public, "index.html")) as f:
+                self.assertEqual(f.read(), f'<link href="{urls["/index.css"]}" rel="stylesheet"><div><h1 id="home">Home</h1>'
+                                           f'<p><img src="{urls["/images/tolkien.png"]}" alt="Tolkien"></img></p></div>')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
+import io
+import sys
 import unittest
-from htmlnode import HTMLNode, LeafNode, ParentNode
+from htmlnode import HTMLNode, LeafNode, ParentNode, escape_html
 
 class TestHTMLNode(unittest.TestCase):
     def test_eq(self):
@@ -14,6 +16,10 @@ class TestHTMLNode(unittest.TestCase):
         self.assertIsNone(node.children)
         self.assertIsNone(node.props)
 
+    def test_slots(self):
+        for node in (HTMLNode(), LeafNode("b", "bold"), ParentNode("p", [LeafNode(None, "text")])):
+            self.assertFalse(hasattr(node, "__dict__"), type(node).__name__)
+
     def test_props_to_html(self):
         node_empty_props = HTMLNode(props={})
         node_multiple_props = HTMLNode(props={"key1": "abc", "key2": "xyz"})
@@ -31,6 +37,10 @@ class TestHTMLNode(unittest.TestCase):
         with self.assertRaises(ValueError):
             node.to_html()
 
+    def test_leaf_empty_value(self):
+        node = LeafNode("img", "", {"src": "tolkien.png", "alt": ""})
+        self.assertEqual(node.to_html(), '<img src="tolkien.png" alt=""></img>')
+
     def test_leaf_no_tag(self):
         node = LeafNode(tag=None, value="This is some text")
         self.assertEqual(node.to_html(), node.value)
@@ -75,5 +85,52 @@ class TestHTMLNode(unittest.TestCase):
         self.assertEqual(parent_node.to_html(), '<div class="container"><span>child</span></div>')
 
 
+    def test_iter_html_matches_to_html(self):
+        parent_node = ParentNode("div", [
+            ParentNode("p", [LeafNode(None, "Hello, "), LeafNode("b", "world")]),
+            LeafNode("a", "link", {"href": "https://boot.dev"}),
+        ])
+        self.assertEqual(
+            list(parent_node.iter_html()),
+            ['<div>', '<p>', 'Hello, ', '<b>world</b>', '</p>', '<a href="https://boot.dev">link</a>', '</div>'],
+        )
+
+    def test_write_to(self):
+        parent_node = ParentNode("div", [LeafNode("span", "child")], {"class": "container"})
+        stream = io.StringIO()
+        parent_node.write_to(stream)
+        self.assertEqual(stream.getvalue(), parent_node.to_html())
+
+    def test_to_html_deep_tree(self):
+        depth = sys.getrecursionlimit() * 10
+        node = LeafNode("span", "leaf")
+        for _ in range(depth):
+            node = ParentNode("div", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith('<div>' * depth + '<span>leaf</span></div>'))
+        self.assertEqual(len(html), depth * len('<div></div>') + len('<span>leaf</span>'))
+
+    def test_escape_html(self):
+        text = "plain text"
+        self.assertIs(escape_html(text), text)
+        self.assertEqual(escape_html('a < b && "c" > d'), "a &lt; b &amp;&amp; &quot;c&quot; &gt; d")
+
+    def test_leaf_escapes_value_and_props(self):
+        node = LeafNode("a", "<script>", {"href": '/q?a=1&b="2"'})
+        self.assertEqual(node.to_html(), '<a href="/q?a=1&amp;b=&quot;2&quot;">&lt;script&gt;</a>')
+        self.assertEqual(LeafNode(None, "1 < 2").to_html(), "1 &lt; 2")
+
+    def test_props_cache_follows_mutation(self):
+        node = LeafNode("a", "link", {"href": "/one"})
+        self.assertEqual(node.props_to_html(), ' href="/one"')
+        node.props["href"] = "/two"
+        self.assertEqual(node.props_to_html(), ' href="/two"')
+        self.assertEqual(LeafNode("a", "link", {"href": "/one"}).props_to_html(), ' href="/one"')
+        self.assertEqual(HTMLNode(props={"data": ["unhashable"]}).props_to_html(), " data=\"['unhashable']\"")
+
+    def test_base_node_to_html(self):
+        with self.assertRaises(NotImplementedError):
+            HTMLNode().to_html()
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,81 @@
+import os
+import struct
+import unittest
+from build import RenderOptions, build_site, set_page_assets
+from imagesize import index_image_sizes, read_image_size
+from sitetest import SiteTestCase
+
+def png(width, height):
+    return b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", width, height) + b"\x08\x06\x00\x00\x00"
+
+def gif(width, height):
+    return b"GIF89a" + struct.pack("<HH", width, height) + b"\x00" * 20
+
+def jpeg(width, height):
+    app0 = b"\xff\xe0" + struct.pack(">H", 16) + b"JFIF\x00" + b"\x00" * 9
+    sof0 = b"\xff\xc0" + struct.pack(">HBHHB", 11, 8, height, width, 1) + b"\x01\x11\x00"
+    return b"\xff\xd8" + app0 + b"\xff" + sof0 + b"\xff\xda" + b"\x00" * 100
+
+def webp(chunk, payload):
+    return b"RIFF" + struct.pack("<I", 100) + b"WEBP" + chunk + struct.pack("<I", len(payload)) + payload
+
+class TestReadImageSize(SiteTestCase):
+    def size_of(self, data):
+        return read_image_size(self.write("image", data))
+
+    def test_formats(self):
+        self.assertEqual(self.size_of(png(640, 480)), (640, 480))
+        self.assertEqual(self.size_of(gif(32, 16)), (32, 16))
+        self.assertEqual(self.size_of(jpeg(1024, 768)), (1024, 768))
+        lossy = b"\x00\x00\x00" + b"\x9d\x01\x2a" + struct.pack("<HH", 300, 200) + b"\x00" * 8
+        self.assertEqual(self.size_of(webp(b"VP8 ", lossy)), (300, 200))
+        bits = (300 - 1) | ((200 - 1) << 14)
+        lossless = b"\x2f" + bits.to_bytes(4, "little") + b"\x00" * 8
+        self.assertEqual(self.size_of(webp(b"VP8L", lossless)), (300, 200))
+        extended = b"\x00" * 4 + (300 - 1).to_bytes(3, "little") + (200 - 1).to_bytes(3, "little")
+        self.assertEqual(self.size_of(webp(b"VP8X", extended)), (300, 200))
+
+    def test_unknown_and_truncated(self):
+        self.assertIsNone(self.size_of(b"not an image"))
+        self.assertIsNone(self.size_of(jpeg(10, 10)[:15]))
+
+
+class TestImageIndex(SiteTestCase):
+    WRITE_DIR = "static"
+
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.index_path = os.path.join(self.tmp.name, "cache", "image-sizes.json")
+        self.write(os.path.join("images", "tolkien.png"), png(500, 300))
+        self.write("photo.JPG", jpeg(80, 60))
+        self.write("broken.gif", b"GIF")
+        self.write("index.css", b"body {}")
+
+    def tearDown(self):
+        set_page_assets(None, None)
+        super().tearDown()
+
+    def test_index_is_persisted_and_reused(self):
+        sizes, stats = index_image_sizes(self.static, self.index_path)
+        self.assertEqual(sizes, {"/images/tolkien.png": (500, 300), "/photo.JPG": (80, 60)})
+        self.assertEqual((stats.read_files, stats.unknown_files), (3, 1))
+        sizes, stats = index_image_sizes(self.static, self.index_path)
+        self.assertEqual(sizes["/images/tolkien.png"], (500, 300))
+        self.assertEqual((stats.read_files, stats.cached_files), (0, 3))
+
+    def test_pages_get_dimensions(self):
+        sizes, _ = index_image_sizes(self.static, self.index_path)
+        content = os.path.join(self.tmp.name, "content")
+        os.makedirs(content)
+        with open(os.path.join(content, "index.md"), "w") as f:
+            f.write("![Tolkien](/images/tolkien.png) and ![other](/other.png)")
+        public = os.path.join(self.tmp.name, "public")
+        build_site(content, public, workers=1, options=RenderOptions(image_sizes=sizes))
+        with open(os.path.join(public, "index.html")) as f:
+            self.assertEqual(f.read(), '<div><p><img src="/images/tolkien.png" alt="Tolkien" width="500" height="300">'
+                                       '</img> and <img src="/other.png" alt="other"></img></p></div>')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import json
+import os
+import tempfile
+import unittest
+import instrument
+from build import build_site
+from markdown import markdown_to_html_node
+
+class TestInstrument(unittest.TestCase):
+    def tearDown(self):
+        instrument.disable()
+
+    def test_disabled_by_default(self):
+        self.assertIsNone(instrument.active())
+        with instrument.stage("anything"):
+            instrument.count("anything")
+        markdown_to_html_node("Some **bold** text")
+        self.assertIsNone(instrument.active())
+
+    def test_collects_stages_and_counters(self):
+        profiler = instrument.enable()
+        markdown_to_html_node("# Title\n\nSome **bold** text\n\n- a\n- b")
+        report = profiler.report()
+        self.assertEqual(report["counters"]["blocks"], 3)
+        self.assertEqual(report["stages"]["block_to_block_type"]["calls"], 3)
+        self.assertIn("text_to_textnodes", report["stages"])
+        self.assertGreaterEqual(report["stages"]["text_to_textnodes"]["wall_seconds"], 0)
+
+    def test_slowest_pages(self):
+        profiler = instrument.Profiler(slowest=2)
+        for i, wall in enumerate([0.3, 0.1, 0.5, 0.2]):
+            profiler.page(f"page{i}.md", wall)
+        report = profiler.report()
+        self.assertEqual(report["pages"], 4)
+        self.assertEqual([page["path"] for page in report["slowest_pages"]], ["page2.md", "page0.md"])
+
+    def test_merge(self):
+        worker = instrument.Profiler(slowest=2)
+        worker.add_stage("render", 1.0, 0.5)
+        worker.count("blocks", 3)
+        worker.page("a.md", 0.1)
+        worker.page("b.md", 0.2)
+        worker.page("c.md", 0.3)
+        profiler = instrument.Profiler(slowest=2)
+        profiler.add_stage("render", 1.0, 0.5)
+        profiler.merge(worker.snapshot())
+        self.assertEqual(profiler.stages["render"], [2.0, 1.0, 2])
+        self.assertEqual(profiler.counters["blocks"], 3)
+        self.assertEqual(profiler.pages, 3)
+
+    def test_parallel_build_report(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            content = os.path.join(tmp, "content")
+            os.makedirs(content)
+            for i in range(6):
+                with open(os.path.join(content, f"page{i}.md"), "w") as f:
+                    f.write(f"# Page {i}\n\ntext")
+            profiler = instrument.enable(slowest=3)
+            build_site(content, os.path.join(tmp, "public"), workers=2)
+            report_path = os.path.join(tmp, "report.json")
+            profiler.write_report(report_path)
+            with open(report_path) as f:
+                report = json.load(f)
+        self.assertEqual(report["pages"], 6)
+        self.assertEqual(report["counters"]["blocks"], 12)
+        self.assertEqual(len(report["slowest_pages"]), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
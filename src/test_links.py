@@ -0,0 +1,92 @@
+import os
+import unittest
+from build import build_site
+from cache import PageCache
+from links import LinkIndex, page_url, static_urls
+from sitetest import SiteTestCase
+
+class TestLinkIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = LinkIndex()
+        self.index.add_page("index.md", [], ["home"])
+        self.index.add_page(os.path.join("blog", "index.md"), [], [])
+        self.index.add_page(os.path.join("blog", "post.md"), [], ["intro", "my-heading"])
+
+    def check(self, target, source=os.path.join("blog", "post.md")):
+        self.index.links = []
+        self.index.add_page(source, [(1, "link", target)], self.index.anchors[page_url(source)])
+        return [link.reason for link in self.index.check({"/images/cat.png"})]
+
+    def test_page_url(self):
+        self.assertEqual(page_url(os.path.join("blog", "post.md")), "/blog/post.html")
+
+    def test_resolves_pages_and_static_files(self):
+        for target in ["/index.html", "/", "/blog/", "/blog", "post.html", "./post", "../index.html",
+                       "/images/cat.png", "../images/cat.png", "/blog/post.html?x=1", "/blog/po%73t.html",
+                       "https://example.com/missing", "mailto:me@example.com", "//cdn.example.com/x.js"]:
+            self.assertEqual(self.check(target), [], target)
+
+    def test_missing_targets(self):
+        for target in ["/missing.html", "post.md", "/images/dog.png", "images/cat.png", "/blog/post/"]:
+            self.assertEqual(self.check(target), ["no such page or file"], target)
+
+    def test_anchors(self):
+        self.assertEqual(self.check("#intro"), [])
+        self.assertEqual(self.check("/blog/post.html#my-heading"), [])
+        self.assertEqual(self.check("/#home"), [])
+        self.assertEqual(self.check("#outro"), ["no such heading"])
+        self.assertEqual(self.check("/index.html#intro"), ["no such heading"])
+        # Static files have no known anchors
+        self.assertEqual(self.check("/images/cat.png#part"), [])
+
+    def test_broken_links_are_sorted_and_formatted(self):
+        index = LinkIndex()
+        index.add_page("b.md", [(3, "image", "/x.png"), (1, "link", "/y")], [])
+        index.add_page("a.md", [(2, "link", "#nope")], [])
+        self.assertEqual([str(link) for link in index.check()], [
+            "a.md:2: link #nope: no such heading",
+            "b.md:1: link /y: no such page or file",
+            "b.md:3: image /x.png: no such page or file",
+        ])
+
+class TestCheckSite(SiteTestCase):
+    WRITE_DIR = "content"
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.static = os.path.join(self.tmp.name, "static")
+        self.public = os.path.join(self.tmp.name, "public")
+        self.write(os.path.join(self.static, "images", "cat.png"), b"png")
+        self.write("index.md", "# Home\n\n[post](/blog/post) and [gone](/gone)\n\n![cat](/images/cat.png)")
+        self.write(os.path.join("blog", "post.md"), "# Post\n\n## Part one\n\n- [home](../)\n- [part](#part-two)")
+
+    def broken(self, **kwargs):
+        index = LinkIndex()
+        build_site(self.content, self.public, indexes={"links": index}, **kwargs)
+        return [str(link) for link in index.check(static_urls(self.static))]
+
+    def test_build_collects_links(self):
+        expected = [
+            f"{os.path.join('blog', 'post.md')}:6: link #part-two: no such heading",
+            "index.md:3: link /gone: no such page or file",
+        ]
+        self.assertEqual(self.broken(workers=1), expected)
+        self.assertEqual(self.broken(workers=2), expected)
+
+    def test_cached_pages_report_links(self):
+        cache = PageCache(os.path.join(self.tmp.name, "cache"))
+        first = self.broken(workers=1, cache=cache)
+        stats_cache = PageCache(os.path.join(self.tmp.name, "cache"))
+        index = LinkIndex()
+        stats = build_site(self.content, self.public, workers=1, cache=stats_cache, indexes={"links": index})
+        self.assertEqual(stats.cached_pages, 2)
+        self.assertEqual([str(link) for link in index.check(static_urls(self.static))], first)
+
+    def test_cached_pages_without_links_are_rebuilt(self):
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        build_site(self.content, self.public, workers=1, cache=PageCache(cache_dir))
+        index = LinkIndex()
+        stats = build_site(self.content, self.public, workers=1, cache=PageCache(cache_dir), indexes={"links": index})
+        self.assertEqual(stats.cached_pages, 0)
+        self.assertEqual(len(index.links), 5)
@@ -1,4 +1,9 @@
+import io
+import os
+import sys
+import tracemalloc
 import unittest
+from unittest import mock
 from markdown import *
 from htmlnode import ParentNode, LeafNode
 
@@ -56,7 +61,7 @@ code
         correct_result = ParentNode('div', children=[
             ParentNode('h6', children=[
                 LeafNode(None, 'THIS IS A HEADING'),
-            ])
+            ], props={'id': 'this-is-a-heading'})
         ])
         self.assertEqual(correct_result.__repr__(), markdown_to_html_node(md).__repr__())
 
@@ -67,6 +72,11 @@ code
         ])
         self.assertEqual(correct_result.__repr__(), markdown_to_html_node(md).__repr__())
 
+    def test_markdown_to_html_node_empty(self):
+        for md in ("", "\n\n   \n"):
+            self.assertEqual(markdown_to_html_node(md).to_html(), "<div></div>")
+            self.assertEqual("".join(iter_markdown_html(md)), "<div></div>")
+
     def test_markdown_to_html_node_quote(self):
         md = "> This is a quote\n> with multiple lines"
         correct_result = ParentNode('div', children=[
@@ -107,7 +117,7 @@ This is a **paragraph** with _style_.
         correct_result = ParentNode('div', children=[
             ParentNode('h2', children=[
                 LeafNode(None, 'Heading')
-            ]),
+            ], props={'id': 'heading'}),
             ParentNode('p', children=[
                 LeafNode(None, 'This is a '),
                 LeafNode('b', 'paragraph'),
@@ -119,4 +129,184 @@ This is a **paragraph** with _style_.
                 LeafNode(None, 'This is a quote'),
             ])
         ])
-        self.assertEqual(correct_result.__repr__(), markdown_to_html_node(md).__repr__())
\ No newline at end of file
+        self.assertEqual(correct_result.__repr__(), markdown_to_html_node(md).__repr__())
+
+    def test_write_markdown_html_matches_to_html(self):
+        md = "# Title\n\nSome **bold** text\n\n- one\n- two\n\n```code```\n\n> quoted"
+        stream = io.StringIO()
+        write_markdown_html(io.BytesIO(md.encode("utf-8")), stream)
+        self.assertEqual(stream.getvalue(), markdown_to_html_node(md).to_html())
+
+    def test_write_markdown_html_bounded_memory(self):
+        block = "A paragraph with **bold**, _italic_ and a [link](https://boot.dev). " * 20
+        md = "\n\n".join(f"## Section {i}\n\n{block}" for i in range(1000))
+        source = io.BytesIO(md.encode("utf-8"))
+        del md
+        meta = PageMeta()
+        tracemalloc.start()
+        with open(os.devnull, "w") as sink:
+            sink.writelines(iter_markdown_html(source, meta))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # Only the heading ids, kept to make them unique, grow with the page
+        anchors = sys.getsizeof(meta.anchors) + sum(sys.getsizeof(anchor) for anchor in meta.anchors)
+        self.assertLess(peak - anchors, len(source.getvalue()) / 10)
+
+    def test_page_meta_title_is_first_h1(self):
+        md = "Intro\n\n## Not this\n\n# The **Real** Title\n\n# Second"
+        meta = PageMeta()
+        markdown_to_html_node(md, meta)
+        self.assertEqual(meta.title, "The Real Title")
+        self.assertEqual(extract_title(md), "The Real Title")
+        self.assertIsNone(extract_title("## Only h2"))
+
+    def test_headings_get_their_anchor_as_id(self):
+        md = "## Install Steps\n\n[x](#install-steps)\n\n## Install Steps"
+        html = markdown_to_html_node(md).to_html()
+        self.assertTrue(html.startswith('<div><h2 id="install-steps">Install Steps</h2>'))
+        self.assertTrue(html.endswith('<h2 id="install-steps-1">Install Steps</h2></div>'))
+        meta = PageMeta(collect_links=True)
+        self.assertEqual(''.join(iter_markdown_html(md, meta)), html)
+        self.assertEqual(meta.anchors, {"install-steps", "install-steps-1"})
+
+        html = markdown_to_html_node("# ???\n\n## - -\n\n## Section").to_html()
+        self.assertEqual(html, '<div><h1 id="section">???</h1><h2 id="section-1">- -</h2>'
+                               '<h2 id="section-2">Section</h2></div>')
+
+    def test_page_meta_links_and_anchors(self):
+        md = ("# Intro\n\nSee [a](/a.html) and\n![img](/b.png) here.\n\n\n"
+              "- [c](c.html)\n- plain\n- [d](#intro)\n\n## Intro!\n\n> [e](/e)")
+        meta = PageMeta(collect_links=True)
+        markdown_to_html_node(md, meta)
+        self.assertEqual(meta.links, [
+            (3, "link", "/a.html"), (4, "image", "/b.png"),
+            (7, "link", "c.html"), (9, "link", "#intro"), (13, "link", "/e"),
+        ])
+        self.assertEqual(meta.anchors, {"intro", "intro-1"})
+        self.assertIsNone(PageMeta().links)
+
+    def test_page_meta_links_with_inline_memo(self):
+        md = "- [a](/a)\n- [a](/a)"
+        enable_inline_memo(8)
+        try:
+            meta = PageMeta(collect_links=True)
+            markdown_to_html_node(md, meta)
+        finally:
+            disable_inline_memo()
+        self.assertEqual(meta.links, [(1, "link", "/a"), (2, "link", "/a")])
+
+    def test_nested_inline_spans(self):
+        md = "# The **[Real](/r)** Title\n\n- **[a](/a)** and _b_\n- **[a](/a)** and _b_"
+        expected = ('<div><h1 id="the-real-title">The <b><a href="/r">Real</a></b> Title</h1>'
+                    '<ul><li><b><a href="/a">a</a></b> and <i>b</i></li><li><b><a href="/a">a</a></b> and <i>b</i></li></ul></div>')
+        meta = PageMeta(collect_links=True)
+        self.assertEqual(markdown_to_html_node(md, meta).to_html(), expected)
+        self.assertEqual(meta.title, "The Real Title")
+        self.assertEqual(meta.links, [(1, "link", "/r"), (3, "link", "/a"), (4, "link", "/a")])
+        memo = enable_inline_memo(8)
+        try:
+            self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+            self.assertEqual(memo.hits, 1)
+        finally:
+            disable_inline_memo()
+
+    def test_page_meta_terms(self):
+        md = "Intro **text** a\n\n# Title\n\n```\nprint(text)\n```\n\n## Part Two\n\n- [Link text](/x) title"
+        meta = PageMeta(collect_terms=True)
+        markdown_to_html_node(md, meta)
+        self.assertEqual(meta.terms, {"intro": "", "text": "", "title": "title", "print": "title",
+                                      "part": "part-two", "two": "part-two", "link": "part-two"})
+        self.assertEqual(meta.anchors, {"title", "part-two"})
+        self.assertIsNone(meta.links)
+
+    def test_heading_anchor(self):
+        self.assertEqual(heading_anchor("Hello, World! 2"), "hello-world-2")
+        self.assertEqual(heading_anchor("already-dashed_name"), "already-dashed_name")
+
+    def test_inline_memo(self):
+        md = "- [Read more](/a) **now**\n- [Read more](/a) **now**\n- other"
+        expected = markdown_to_html_node(md).to_html()
+        memo = enable_inline_memo(8)
+        try:
+            self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+            self.assertEqual((memo.hits, memo.misses), (1, 2))
+            # Nodes handed out are copies, mutating them leaves the memo intact
+            first = text_to_children("[Read more](/a) **now**")
+            first[0].props["href"] = "/changed"
+            first[1].value = "changed"
+            self.assertEqual(markdown_to_html_node(md).to_html(), expected)
+        finally:
+            disable_inline_memo()
+        self.assertIsNone(inline_memo())
+
+    def test_classify_block_returns_cleaned_lines(self):
+        self.assertEqual(classify_block("## Heading\ncontinued"), (BlockType.HEADING, "h2", ["Heading", "continued"]))
+        self.assertEqual(classify_block("```\ncode\n```"), (BlockType.CODE, "code", ["code"]))
+        self.assertEqual(classify_block("> one\n>two"), (BlockType.QUOTE, "blockquote", [(1, "one"), (1, "two")]))
+        self.assertEqual(classify_block("- a\n- b"), (BlockType.UNORDERED_LIST, "ul", [(0, "ul", "a"), (0, "ul", "b")]))
+        self.assertEqual(classify_block("1. a\n2. b"), (BlockType.ORDERED_LIST, "ol", [(0, "ol", "a"), (0, "ol", "b")]))
+        self.assertEqual(classify_block("1. a\n3. b"), (BlockType.PARAGRAPH, "p", ["1. a", "3. b"]))
+        self.assertEqual(classify_block("####### seven"), (BlockType.PARAGRAPH, "p", ["####### seven"]))
+        self.assertEqual(classify_block("#"), (BlockType.PARAGRAPH, "p", ["#"]))
+
+    def test_nested_lists(self):
+        md = "- one\n  - one.a\n    1. first\n    2. second\n  - one.b\n- two\n\t- tabbed"
+        self.assertEqual(markdown_to_html_node(md).to_html(),
+                         "<div><ul><li>one<ul><li>one.a<ol><li>first</li><li>second</li></ol></li>"
+                         "<li>one.b</li></ul></li><li>two<ul><li>tabbed</li></ul></li></ul></div>")
+        self.assertEqual(block_to_block_type("1. a\n   - b\n2. c"), BlockType.ORDERED_LIST)
+        # Every nested list counts from 1 on its own
+        self.assertEqual(block_to_block_type("1. a\n   1. b\n   3. c"), BlockType.PARAGRAPH)
+        # Marker kinds can't change within one list
+        self.assertEqual(block_to_block_type("- a\n1. b"), BlockType.PARAGRAPH)
+        # A dedent closes every deeper list
+        self.assertEqual(markdown_to_html_node("- a\n    - b\n        - c\n- d").to_html(),
+                         "<div><ul><li>a<ul><li>b<ul><li>c</li></ul></li></ul></li><li>d</li></ul></div>")
+
+    def test_list_items_keep_leading_dashes_and_spaces(self):
+        # lstrip('- ') used to strip every leading '-' and ' ' rather than the marker
+        self.assertEqual(markdown_to_html_node("- -5 degrees\n- - dash").to_html(),
+                         "<div><ul><li>-5 degrees</li><li>- dash</li></ul></div>")
+        self.assertEqual(get_list_items_for_block(BlockType.UNORDERED_LIST, "- -5\n- b"), ["-5", "b"])
+
+    def test_nested_quotes(self):
+        md = "> outer\n> still outer\n> > inner **bold**\n>>> deepest\n> back out"
+        self.assertEqual(markdown_to_html_node(md).to_html(),
+                         "<div><blockquote>outer\nstill outer<blockquote>inner <b>bold</b>"
+                         "<blockquote>deepest</blockquote></blockquote>back out</blockquote></div>")
+        self.assertEqual(markdown_to_html_node(">>> skips levels").to_html(),
+                         "<div><blockquote><blockquote><blockquote>skips levels</blockquote></blockquote>"
+                         "</blockquote></div>")
+        self.assertEqual(get_text_for_block(BlockType.QUOTE, ">> a\n> b"), "> a\nb")
+
+    def test_deep_nesting_needs_no_recursion(self):
+        depth = sys.getrecursionlimit() * 2
+        md = "\n".join("  " * level + f"- item{level}" for level in range(depth))
+        html = markdown_to_html_node(md).to_html()
+        self.assertEqual(html.count("<ul>"), depth)
+        self.assertTrue(html.endswith("</li></ul>" * depth + "</div>"))
+        quote = markdown_to_html_node(">" * depth + " deep").to_html()
+        self.assertEqual(quote.count("<blockquote>"), depth)
+
+    def test_links_in_nested_blocks_keep_their_lines(self):
+        md = "> [a](/a)\n> more\n> > [b](/b)\n> [c](/c)\n\n- x\n  - [d](/d)"
+        meta = PageMeta(collect_links=True)
+        markdown_to_html_node(md, meta)
+        self.assertEqual([(line, url) for line, _, url in meta.links], [(1, "/a"), (3, "/b"), (4, "/c"), (7, "/d")])
+
+    def test_register_block_type(self):
+        def classify_note(block, lines):
+            if block.startswith("!!! "):
+                return "note", "aside", [block[4:]]
+            return None
+
+        def render_note(tag, lines):
+            return ParentNode(tag, text_to_children(lines[0]), {"class": "note"})
+
+        with mock.patch.dict(BLOCK_CLASSIFIERS), mock.patch.dict(BLOCK_RENDERERS):
+            register_block_type("note", "!", classify_note, render_note)
+            self.assertEqual(
+                markdown_to_html_node("!!! Be **careful**\n\n!not a note").to_html(),
+                '<div><aside class="note">Be <b>careful</b></aside><p>!not a note</p></div>',
+            )
+        self.assertNotIn("!", BLOCK_CLASSIFIERS)
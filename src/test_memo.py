@@ -0,0 +1,35 @@
+import unittest
+from memo import LRUMemo
+
+class TestLRUMemo(unittest.TestCase):
+    def test_get_put(self):
+        memo = LRUMemo(2)
+        self.assertIsNone(memo.get("a"))
+        memo.put("a", 1)
+        self.assertEqual(memo.get("a"), 1)
+        self.assertEqual((memo.hits, memo.misses), (1, 1))
+        self.assertEqual(memo.hit_rate(), 0.5)
+
+    def test_evicts_least_recently_used(self):
+        memo = LRUMemo(2)
+        memo.put("a", 1)
+        memo.put("b", 2)
+        memo.get("a")
+        memo.put("c", 3)
+        self.assertEqual(list(memo.entries), ["a", "c"])
+        self.assertEqual(memo.evictions, 1)
+        self.assertIsNone(memo.get("b"))
+
+    def test_summary(self):
+        memo = LRUMemo(4)
+        memo.put("a", 1)
+        memo.get("a")
+        self.assertEqual(memo.summary(), "1 hits, 0 misses (100.0% hit rate), 0 evictions, 1/4 entries")
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            LRUMemo(0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import contextlib
+import io
+import os
+import unittest
+import main
+from build import build_site
+from cache import PageCache
+from pageindex import PageIndex, page_date, page_metadata
+from sitetest import SiteTestCase
+
+class TestPageMetadata(unittest.TestCase):
+    def test_page_metadata(self):
+        md = "Intro with *three words*\n\n# The Title\n\n```\nnot counted here\n```\n\n## Part\n\n## Part\n\n- it's [well-known](/x)"
+        title, headings, word_count = page_metadata(md)
+        self.assertEqual(title, "The Title")
+        self.assertEqual(headings, [(1, "The Title", "the-title"), (2, "Part", "part"), (2, "Part", "part-1")])
+        self.assertEqual(word_count, 4 + 2 + 1 + 1 + 2)
+
+    def test_page_date(self):
+        self.assertEqual(page_date(os.path.join("blog", "2024-01-31-launch.md")), "2024-01-31")
+        self.assertIsNone(page_date("launch-2024-01-31.md"))
+
+class TestPageIndex(SiteTestCase):
+    WRITE_DIR = "content"
+
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.db_path = os.path.join(self.tmp.name, "cache", "pages.sqlite")
+        self.write("index.md", "# Home\n\nWelcome")
+        self.write(os.path.join("blog", "2024-01-31-launch.md"), "# Launch\n\n## Why\n\nWe launched")
+        self.write(os.path.join("blog", "2024-03-01-update.md"), "# Update\n\nNews")
+        self.write(os.path.join("blog", "about.md"), "# About")
+        self.write(os.path.join("blogroll", "2025-01-01-links.md"), "# Links")
+
+    def test_listing_and_headings(self):
+        with PageIndex(self.db_path) as index:
+            stats = index.update(self.content)
+            self.assertEqual((stats.indexed_pages, stats.unchanged_pages, len(index)), (5, 0, 5))
+            listing = index.listing("blog")
+            self.assertEqual([(row["url"], row["title"], row["date"]) for row in listing], [
+                ("/blog/2024-03-01-update.html", "Update", "2024-03-01"),
+                ("/blog/2024-01-31-launch.html", "Launch", "2024-01-31"),
+                ("/blog/about.html", "About", None),
+            ])
+            self.assertEqual([row["path"] for row in index.listing(limit=2)],
+                             ["blogroll/2025-01-01-links.md", "blog/2024-03-01-update.md"])
+            self.assertEqual([(row["level"], row["anchor"]) for row in index.headings("blog/2024-01-31-launch.md")],
+                             [(1, "launch"), (2, "why")])
+            self.assertEqual(len(index.headings()), 6)
+            self.assertEqual(index.page("index.md")["word_count"], 2)
+
+    def test_incremental_update(self):
+        with PageIndex(self.db_path) as index:
+            index.update(self.content)
+        self.write("index.md", "# New Home\n\nWelcome back, friends")
+        os.remove(os.path.join(self.content, "blog", "about.md"))
+        with PageIndex(self.db_path) as index:
+            stats = index.update(self.content)
+            self.assertEqual((stats.indexed_pages, stats.unchanged_pages, stats.removed_pages), (1, 3, 1))
+            self.assertEqual(index.page("index.md")["title"], "New Home")
+            self.assertEqual([row["text"] for row in index.headings("index.md")], ["New Home"])
+            self.assertIsNone(index.page("blog/about.md"))
+            self.assertEqual(index.update(self.content).unchanged_pages, 4)
+
+    def test_build_hands_over_rendered_pages(self):
+        with PageIndex(os.path.join(self.tmp.name, "parsed.sqlite")) as index:
+            index.update(self.content)
+            parsed = [tuple(row) for row in index.listing()], [tuple(row) for row in index.headings()]
+        cache = PageCache(os.path.join(self.tmp.name, "page-cache"))
+        public = os.path.join(self.tmp.name, "public")
+        for db_name, cached_pages in (("built.sqlite", 0), ("cached.sqlite", 5)):
+            with PageIndex(os.path.join(self.tmp.name, db_name)) as index:
+                cache.hits = cache.misses = 0
+                build_stats = build_site(self.content, public, workers=1, cache=cache, indexes={"outline": index})
+                self.assertEqual(build_stats.cached_pages, cached_pages)
+                # The outline cached with each page is not a lookup of its own
+                self.assertEqual((cache.hits, cache.misses), (cached_pages, 5 - cached_pages))
+                stats = index.update(self.content)
+                self.assertEqual((stats.indexed_pages, stats.parsed_pages), (5, 0))
+                self.assertEqual(([tuple(row) for row in index.listing()], [tuple(row) for row in index.headings()]),
+                                 parsed)
+
+    def test_pipeline_builds_refuse_the_page_index(self):
+        with contextlib.redirect_stderr(io.StringIO()) as errors, self.assertRaises(SystemExit):
+            main.parse_args(["--page-index", "--pipeline"])
+        self.assertIn("--page-index can't be combined with --pipeline", errors.getvalue())
+
+    def test_listing_uses_the_date_index(self):
+        with PageIndex(self.db_path) as index:
+            plan = index.connection.execute(
+                "EXPLAIN QUERY PLAN SELECT path FROM pages ORDER BY date DESC, path").fetchall()
+        self.assertIn("pages_by_date", " ".join(row["detail"] for row in plan))
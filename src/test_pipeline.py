@@ -0,0 +1,92 @@
+import os
+import threading
+import unittest
+from unittest import mock
+from build import RenderOptions, build_site
+from cache import PageCache
+from conversions import set_asset_urls
+from pipeline import build_site_pipelined
+from sitetest import SiteTestCase, read_tree
+
+class TestPipeline(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        for i in range(25):
+            self.write(os.path.join(self.content, f"section{i % 3}", f"page{i}.md"),
+                       f"# Page {i}\n\nSome _text_ & more.\n\n" + "- item\n" * i + "- last")
+        self.template = self.write("template.html", "<title>{{ Title }}</title>{{ Content }}")
+        self.expected = os.path.join(self.tmp.name, "expected")
+        build_site(self.content, self.expected, workers=1, options=RenderOptions(self.template))
+
+    def test_matches_build_site(self):
+        public = os.path.join(self.tmp.name, "public")
+        stats = build_site_pipelined(self.content, public, workers=1, options=RenderOptions(self.template),
+                                     io_threads=3, queue_size=1)
+        self.assertEqual(stats.pages, 25)
+        self.assertEqual(read_tree(public), read_tree(self.expected))
+
+    def test_process_workers(self):
+        public = os.path.join(self.tmp.name, "public")
+        build_site_pipelined(self.content, public, workers=2, options=RenderOptions(self.template))
+        self.assertEqual(read_tree(public), read_tree(self.expected))
+
+    def test_cache_and_streamed_pages(self):
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        public = os.path.join(self.tmp.name, "public")
+        cache = PageCache(cache_dir)
+        build_site_pipelined(self.content, public, workers=1, cache=cache, options=RenderOptions(self.template))
+        self.assertEqual(len(cache.entries), 25)
+        cache = PageCache(cache_dir)
+        stats = build_site_pipelined(self.content, public, workers=1, cache=cache, options=RenderOptions(self.template))
+        self.assertEqual(stats.cached_pages, 25)
+        self.assertEqual(read_tree(public), read_tree(self.expected))
+
+        # Cached pages are read on the I/O threads, never on the event loop thread
+        threads = set()
+        read = cache.read
+        def record_thread(key):
+            threads.add(threading.get_ident())
+            return read(key)
+        with mock.patch.object(cache, "read", record_thread):
+            stats = build_site_pipelined(self.content, public, workers=1, cache=cache,
+                                         options=RenderOptions(self.template))
+        self.assertEqual(stats.cached_pages, 25)
+        self.assertTrue(threads)
+        self.assertNotIn(threading.get_ident(), threads)
+
+        streamed = os.path.join(self.tmp.name, "streamed")
+        with mock.patch("pipeline.STREAM_THRESHOLD", 0), mock.patch("build.STREAM_THRESHOLD", 0):
+            build_site_pipelined(self.content, streamed, workers=1, options=RenderOptions(self.template))
+        self.assertEqual(read_tree(streamed), read_tree(self.expected))
+
+    def test_asset_urls(self):
+        with open(os.path.join(self.content, "image.md"), "w") as f:
+            f.write("![logo](/logo.png)")
+        asset_urls = {"/logo.png": "/logo.0123abcd.png"}
+        expected = os.path.join(self.tmp.name, "expected-assets")
+        try:
+            build_site(self.content, expected, workers=1, options=RenderOptions(self.template, asset_urls=asset_urls))
+            for workers in (1, 2):
+                public = os.path.join(self.tmp.name, f"public{workers}")
+                build_site_pipelined(self.content, public, workers=workers,
+                                     options=RenderOptions(self.template, asset_urls=asset_urls))
+                self.assertEqual(read_tree(public), read_tree(expected))
+        finally:
+            set_asset_urls(None)
+        with open(os.path.join(expected, "image.html")) as f:
+            self.assertIn('src="/logo.0123abcd.png"', f.read())
+
+    def test_errors_propagate(self):
+        with open(os.path.join(self.content, "bad.md"), "wb") as f:
+            f.write(b"\xff\xfe not utf-8")
+        with self.assertRaises(UnicodeDecodeError):
+            build_site_pipelined(self.content, os.path.join(self.tmp.name, "public"), workers=1, queue_size=1)
+
+    def test_missing_content(self):
+        with self.assertRaises(Exception):
+            build_site_pipelined(os.path.join(self.tmp.name, "nope"), self.tmp.name)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import json
+import os
+import unittest
+from build import build_site
+from cache import PageCache
+from search import SearchIndex, shard_name
+from sitetest import SiteTestCase
+
+class TestSearchIndex(unittest.TestCase):
+    def test_shard_name(self):
+        self.assertEqual(shard_name("python"), "py")
+        self.assertEqual(shard_name("x"), "x")
+        self.assertEqual(shard_name("él"), "_c3a96c")
+        self.assertEqual(shard_name("__init__"), "_5f5f")
+
+    def test_delta_encoded_postings(self):
+        index = SearchIndex()
+        index.add_page("c.md", "C", ["usage"], {"python": "usage"})
+        index.add_page("a.md", "A", [], {"python": "", "rust": ""})
+        index.add_page("b.md", "B", ["intro", "setup"], {"rust": "setup"})
+        pages, shards = index.shards()
+        self.assertEqual(pages, [["/a.html", "A", []], ["/b.html", "B", ["intro", "setup"]],
+                                 ["/c.html", "C", ["usage"]]])
+        self.assertEqual(shards, {"py": {"python": [0, 0, 2, 1]}, "ru": {"rust": [0, 0, 1, 2]}})
+
+    def test_order_of_pages_does_not_matter(self):
+        pages = [("a.md", "A", [], {"one": "", "two": ""}), ("b.md", "B", ["x"], {"two": "x"})]
+        forward, backward = SearchIndex(), SearchIndex()
+        for page in pages:
+            forward.add_page(*page)
+        for page in reversed(pages):
+            backward.add_page(*page)
+        self.assertEqual(forward.shards(), backward.shards())
+
+class TestBuildSearchIndex(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.tmp.name, "content")
+        for i in range(12):
+            self.write(os.path.join(self.content, f"section{i % 3}", f"page{i}.md"),
+                       f"# Page {i}\n\nShared words here.\n\n## Topic{i % 4}\n\n- unique{i} item")
+
+    def read_search(self, public):
+        search_dir = os.path.join(public, "search")
+        tree = {}
+        for filename in os.listdir(search_dir):
+            with open(os.path.join(search_dir, filename), "rb") as f:
+                tree[filename] = f.read()
+        return tree
+
+    def build(self, public, **kwargs):
+        index = SearchIndex()
+        build_site(self.content, public, indexes={"search": index}, **kwargs)
+        return index.write(public)
+
+    def test_index_contents(self):
+        public = os.path.join(self.tmp.name, "public")
+        stats = self.build(public, workers=1)
+        self.assertEqual(stats.pages, 12)
+        with open(os.path.join(public, "search", "index.json")) as f:
+            index = json.load(f)
+        self.assertEqual(index["pages"][0], ["/section0/page0.html", "Page 0", ["page-0", "topic0"]])
+        with open(os.path.join(public, "search", "un.json")) as f:
+            shard = json.load(f)
+        # /section0/page3.html is page 1, unique3 is under its second heading
+        self.assertEqual(shard["unique3"], [1, 2])
+        with open(os.path.join(public, "search", "sh.json")) as f:
+            # Every page has it under its title heading
+            self.assertEqual(json.load(f)["shared"], [0, 1] + [1, 1] * 11)
+
+    def test_parallel_and_cached_builds_match_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        self.build(serial, workers=1)
+        expected = self.read_search(serial)
+        parallel = os.path.join(self.tmp.name, "parallel")
+        self.build(parallel, workers=3)
+        self.assertEqual(self.read_search(parallel), expected)
+
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        cached = os.path.join(self.tmp.name, "cached")
+        self.build(cached, workers=2, cache=PageCache(cache_dir))
+        index = SearchIndex()
+        stats = build_site(self.content, cached, workers=2, cache=PageCache(cache_dir), indexes={"search": index})
+        self.assertEqual(stats.cached_pages, 12)
+        index.write(cached)
+        self.assertEqual(self.read_search(cached), expected)
+
+    def test_stale_shards_are_removed(self):
+        public = os.path.join(self.tmp.name, "public")
+        zebra = os.path.join(self.content, "zebra.md")
+        with open(zebra, "w") as f:
+            f.write("# Zebra\n\nzoology")
+        self.build(public, workers=1)
+        self.assertTrue(os.path.exists(os.path.join(public, "search", "zo.json")))
+        os.remove(zebra)
+        stats = self.build(public, workers=1)
+        self.assertEqual(stats.removed_shards, 2)
+        self.assertEqual(sorted(self.read_search(public)), sorted(["index.json"] + [
+            name + ".json" for name in json.loads(self.read_search(public)["index.json"])["shards"]]))
+        self.assertFalse(os.path.exists(os.path.join(public, "search", "zo.json")))
@@ -0,0 +1,131 @@
+import os
+import struct
+import subprocess
+import sys
+import unittest
+from unittest import mock
+import shard
+from shard import (SHARD_MANIFEST_NAME, in_shard, merge_shards, page_shard, parse_shard,
+                   write_shard_manifest)
+from sitetest import SiteTestCase, read_tree
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+
+class TestShard(SiteTestCase):
+    def test_parse_shard(self):
+        self.assertEqual(parse_shard("2/4"), (2, 4))
+        for text in ["0/4", "5/4", "2", "a/b"]:
+            with self.assertRaises(ValueError):
+                parse_shard(text)
+
+    def test_every_page_is_in_exactly_one_shard(self):
+        paths = [os.path.join(f"section{i % 7}", f"page{i}.md") for i in range(200)]
+        counts = [sum(in_shard(path, (index, 4)) for index in range(1, 5)) for path in paths]
+        self.assertEqual(counts, [1] * 200)
+        self.assertEqual(page_shard("a/b.md", 4), page_shard(os.path.join("a", "b.md"), 4))
+        self.assertTrue(all(in_shard(path, None) for path in paths))
+
+    def test_shard_manifest_reuses_cached_hashes(self):
+        self.write("out/a.html", b"a")
+        self.write("out/images/cat.png", b"not really a png")
+        out = os.path.join(self.tmp.name, "out")
+        cache = os.path.join(self.tmp.name, "shard-hashes.json")
+        with mock.patch("shard.file_hash", wraps=shard.file_hash) as file_hash:
+            files = write_shard_manifest(out, (1, 2), cache)
+            self.assertEqual(file_hash.call_count, 2)
+            self.assertEqual(write_shard_manifest(out, (1, 2), cache), files)
+            self.assertEqual(file_hash.call_count, 2)
+            self.write("out/a.html", b"new a")
+            files = write_shard_manifest(out, (1, 2), cache)
+            self.assertEqual(file_hash.call_count, 3)
+        self.assertEqual(files, write_shard_manifest(out, (1, 2)))
+        self.assertEqual(sorted(files), ["a.html", "images/cat.png"])
+
+    def test_merge_detects_conflicts(self):
+        self.write("one/index.css", b"body {}")
+        self.write("one/a.html", b"a")
+        self.write("two/index.css", b"body { color: red }")
+        self.write("two/b.html", b"b")
+        for index, name in [(1, "one"), (2, "two")]:
+            write_shard_manifest(os.path.join(self.tmp.name, name), (index, 2))
+        shards = [os.path.join(self.tmp.name, name) for name in ["one", "two"]]
+        public = os.path.join(self.tmp.name, "public")
+        manifest = os.path.join(self.tmp.name, "merge-manifest.json")
+        with self.assertRaisesRegex(Exception, "index.css differs"):
+            merge_shards(shards, public, manifest)
+        self.assertFalse(os.path.exists(public))
+
+        self.write("two/index.css", b"body {}")
+        write_shard_manifest(os.path.join(self.tmp.name, "two"), (2, 2))
+        stats = merge_shards(list(reversed(shards)), public, manifest)
+        self.assertEqual((stats.files, stats.duplicate_files), (3, 1))
+        self.assertEqual(read_tree(public), {"index.css": b"body {}", "a.html": b"a", "b.html": b"b"})
+
+    def test_merge_removes_only_files_an_earlier_merge_wrote(self):
+        self.write("one/a.html", b"a")
+        self.write("one/deleted/page.html", b"deleted before the next merge")
+        self.write("two/b.html", b"b")
+        shards = [os.path.join(self.tmp.name, name) for name in ["one", "two"]]
+        for index, shard in enumerate(shards, start=1):
+            write_shard_manifest(shard, (index, 2))
+        self.write("public/CNAME", b"example.com")
+        self.write("public/.git/HEAD", b"ref: refs/heads/main")
+        public = os.path.join(self.tmp.name, "public")
+        manifest = os.path.join(self.tmp.name, "merge-manifest.json")
+        stats = merge_shards(shards, public, manifest)
+        self.assertEqual((stats.files, stats.removed_files), (3, 0))
+
+        os.remove(os.path.join(shards[0], "deleted", "page.html"))
+        self.write("one/a.html", b"new a")
+        write_shard_manifest(shards[0], (1, 2))
+        stats = merge_shards(shards, public, manifest)
+        self.assertEqual((stats.files, stats.removed_files), (2, 1))
+        self.assertEqual(read_tree(public), {"a.html": b"new a", "b.html": b"b", "CNAME": b"example.com",
+                                             os.path.join(".git", "HEAD"): b"ref: refs/heads/main"})
+        self.assertFalse(os.path.exists(os.path.join(public, "deleted")))
+
+    def test_merge_needs_every_shard(self):
+        self.write("one/a.html", b"a")
+        write_shard_manifest(os.path.join(self.tmp.name, "one"), (1, 2))
+        with self.assertRaisesRegex(Exception, "expected shards"):
+            merge_shards([os.path.join(self.tmp.name, "one")], os.path.join(self.tmp.name, "public"),
+                         os.path.join(self.tmp.name, "merge-manifest.json"))
+
+    def test_sharded_build_matches_single_build(self):
+        site = os.path.join(self.tmp.name, "site")
+        self.write("site/static/index.css", b"body { margin: 0 }\n" * 100)
+        self.write("site/static/images/cat.png",
+                   b"\x89PNG\r\n\x1a\n" + struct.pack(">I", 13) + b"IHDR" + struct.pack(">II", 4, 3) + b"\x00" * 5)
+        self.write("site/template.html", b"<html><link href=\"/index.css\"><title>{{ Title }}</title>{{ Content }}</html>")
+        for i in range(20):
+            self.write(f"site/content/section{i % 3}/page{i}.md",
+                       f"# Page {i}\n\n![cat](/images/cat.png) and **text**\n\n".encode() + b"- item\n" * 300)
+
+        def run(*args):
+            return subprocess.Popen([sys.executable, MAIN, "--site", site, "--workers", "1", "--fingerprint",
+                                     "--gzip", *args], stdout=subprocess.DEVNULL)
+
+        count = 3
+        outputs = [os.path.join(self.tmp.name, f"shard{index}") for index in range(1, count + 1)]
+        # Left over from earlier builds with another shard count
+        self.write("shard1/section0/page99.html", b"stale")
+        # Placed by hand, not built, so the merge must leave it alone
+        self.write("merged/CNAME", b"example.com")
+        processes = [
+            run("--shard", f"{index}/{count}", "--output", output, "--cache-dir", output + "-cache")
+            for index, output in enumerate(outputs, start=1)
+        ]
+        processes.append(run("--output", os.path.join(self.tmp.name, "single"),
+                             "--cache-dir", os.path.join(self.tmp.name, "single-cache")))
+        self.assertEqual([process.wait() for process in processes], [0] * (count + 1))
+        self.assertTrue(all(read_tree(output) for output in outputs))
+
+        merged = os.path.join(self.tmp.name, "merged")
+        merge = run("--output", merged, "--cache-dir", merged + "-cache", "--merge-shards", *outputs)
+        self.assertEqual(merge.wait(), 0)
+        single = read_tree(os.path.join(self.tmp.name, "single"))
+        self.assertEqual(len([path for path in single if path.endswith(".html")]), 20)
+        merged_tree = read_tree(merged)
+        self.assertNotIn(SHARD_MANIFEST_NAME, merged_tree)
+        self.assertEqual(merged_tree.pop("CNAME"), b"example.com")
+        self.assertEqual(merged_tree, single)
@@ -0,0 +1,19 @@
+import unittest
+from stats import Stats
+
+class CopyStats(Stats):
+    FIELDS = ("files", "bytes")
+    SUMMARY = "copied {files} files ({bytes} bytes)"
+
+class TestStats(unittest.TestCase):
+    def test_counters_and_summary(self):
+        stats = CopyStats()
+        self.assertEqual((stats.files, stats.bytes), (0, 0))
+        stats.files += 2
+        stats.bytes += 10
+        self.assertEqual(stats.summary(), "copied 2 files (10 bytes)")
+        self.assertEqual(repr(stats), "CopyStats(copied 2 files (10 bytes))")
+
+
+if __name__ == "__main__":
+    unittest.main()
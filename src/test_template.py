@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+from template import Template, load_template
+
+class TestTemplate(unittest.TestCase):
+    def test_parse(self):
+        template = Template("<title>{{ Title }}</title><body>{{Content}}</body>")
+        self.assertEqual(template.segments, ["<title>", "</title><body>", "</body>"])
+        self.assertEqual(template.slots, ["Title", "Content"])
+
+    def test_render(self):
+        template = Template("<title>{{ Title }}</title>{{ Content }}{{ Title }}")
+        html = template.render({"Title": "Home", "Content": iter(["<p>", "hi", "</p>"])})
+        self.assertEqual(html, "<title>Home</title><p>hi</p>Home")
+
+    def test_no_slots(self):
+        self.assertEqual(Template("plain").render({}), "plain")
+
+    def test_missing_value(self):
+        with self.assertRaises(ValueError):
+            Template("{{ Title }}").render({})
+
+    def test_load_template_reparses_on_change(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as f:
+                f.write("<p>{{ Content }}</p>")
+            template = load_template(path)
+            self.assertIs(load_template(path), template)
+            with open(path, "w") as f:
+                f.write("<div>{{ Content }}</div>")
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+            self.assertEqual(load_template(path).render({"Content": "x"}), "<div>x</div>")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,6 @@
 import unittest
 from textnode import TextNode, TextType
-from conversions import text_node_to_html_node, split_all_delimiters
+from conversions import TEXT_TYPE_TO_HTML, text_node_to_html_node, split_all_delimiters
 
 class TestTextNode(unittest.TestCase):
     def test_eq(self):
@@ -18,6 +18,20 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("test node", TextType.ITALIC, "https://www.hotmail.com")
         self.assertNotEqual(node, node2)
 
+    def test_slots(self):
+        node = TextNode("text", TextType.TEXT)
+        self.assertFalse(hasattr(node, "__dict__"))
+        with self.assertRaises(AttributeError):
+            node.extra = 1
+
+    def test_text_type_coercion(self):
+        self.assertIs(TextNode("text", TextType.BOLD).text_type, TextType.BOLD)
+        # Raw values are coerced to their TextType, invalid ones are rejected
+        self.assertIs(TextNode("text", "bold").text_type, TextType.BOLD)
+        self.assertEqual(TextNode("text", "link", "/a"), TextNode("text", TextType.LINK, "/a"))
+        with self.assertRaises(ValueError):
+            TextNode("text", "underline")
+
     def test_text(self):
         node = TextNode("This is a text node", TextType.TEXT)
         html_node = text_node_to_html_node(node)
@@ -38,6 +52,13 @@ class TestTextNode(unittest.TestCase):
         self.assertEqual(html_node.props['src'], 'www.msn.com')
         self.assertEqual(html_node.props['alt'], 'This is an image node')
 
+    def test_conversion_table(self):
+        # Every TextType has a (tag, value getter, props builder) entry
+        self.assertEqual(set(TEXT_TYPE_TO_HTML), set(TextType))
+        link = text_node_to_html_node(TextNode("docs", TextType.LINK, "/docs"))
+        self.assertEqual((link.tag, link.value, link.props), ("a", "docs", {"href": "/docs"}))
+        self.assertIsNone(text_node_to_html_node(TextNode("code", TextType.CODE)).props)
+
     def test_split_all_delimiters_code(self):
         node = TextNode("This is text with a `code block` word", TextType.TEXT)
         new_node = split_all_delimiters([node])
@@ -0,0 +1,197 @@
+import contextlib
+import gzip
+import io
+import json
+import os
+import unittest
+from unittest import mock
+from compress import compress_dir
+from fingerprint import fingerprint_assets
+from imagesize import index_image_sizes
+from sitetest import SiteTestCase
+from test_imagesize import png
+from watch import DependencyGraph, SiteWatcher, PAGE, STATIC
+
+class TestDependencyGraph(unittest.TestCase):
+    def test_affected(self):
+        graph = DependencyGraph()
+        graph.add((PAGE, "a.md"), ["content/a.md", "template.html"])
+        graph.add((PAGE, "b.md"), ["content/b.md", "template.html"])
+        graph.add((STATIC, "index.css"), ["static/index.css"])
+        self.assertEqual(graph.affected(["content/a.md"]), [(PAGE, "a.md")])
+        self.assertEqual(graph.affected(["template.html"]), [(PAGE, "a.md"), (PAGE, "b.md")])
+        self.assertEqual(graph.affected(["unrelated"]), [])
+
+    def test_remove(self):
+        graph = DependencyGraph()
+        graph.add((PAGE, "a.md"), ["content/a.md", "template.html"])
+        graph.remove((PAGE, "a.md"))
+        self.assertEqual(graph.affected(["content/a.md", "template.html"]), [])
+        self.assertEqual(dict(graph.dependents), {})
+
+
+class TestSiteWatcher(SiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.content = os.path.join(self.tmp.name, "content")
+        self.public = os.path.join(self.tmp.name, "public")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        self.write(self.template, "{{ Content }}")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "post.md"), "A post")
+        self.watcher = SiteWatcher(self.static, self.content, self.public, self.template)
+
+    def write(self, path, text):
+        path = super().write(path, text)
+        # Make sure the change is visible even on coarse mtime filesystems
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_no_changes(self):
+        self.assertEqual(self.watcher.poll(), [])
+
+    def test_changed_page_rebuilds_only_that_page(self):
+        self.write(os.path.join(self.content, "blog", "post.md"), "An **edited** post")
+        self.assertEqual(self.watcher.poll(), [(PAGE, os.path.join("blog", "post.md"))])
+        with open(os.path.join(self.public, "blog", "post.html")) as f:
+            self.assertEqual(f.read(), "<div><p>An <b>edited</b> post</p></div>")
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.html")))
+
+    def test_changed_template_rebuilds_dependent_pages(self):
+        self.write(self.template, "<html>{{ Content }}</html>")
+        self.assertEqual(self.watcher.poll(), [(PAGE, os.path.join("blog", "post.md")), (PAGE, "index.md")])
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertEqual(f.read(), '<html><div><h1 id="home">Home</h1></div></html>')
+
+    def test_changed_static_file_resyncs_only_that_file(self):
+        self.write(os.path.join(self.static, "index.css"), "body { color: red; }")
+        self.assertEqual(self.watcher.poll(), [(STATIC, "index.css")])
+        with open(os.path.join(self.public, "index.css")) as f:
+            self.assertEqual(f.read(), "body { color: red; }")
+
+    def test_changed_static_file_is_refingerprinted_everywhere(self):
+        self.write(self.template, '<link href="/index.css">{{ Content }}')
+        self.write(os.path.join(self.static, "tolkien.png"), png(500, 300))
+        self.write(os.path.join(self.content, "index.md"), "![Tolkien](/tolkien.png)")
+        asset_urls, _ = fingerprint_assets(self.static, self.public, os.path.join(self.tmp.name, "fingerprints.json"))
+        image_sizes, _ = index_image_sizes(self.static, os.path.join(self.tmp.name, "image-sizes.json"))
+        watcher = SiteWatcher(self.static, self.content, self.public, self.template, asset_urls, image_sizes)
+        old_css = asset_urls["/index.css"]
+
+        self.write(os.path.join(self.static, "index.css"), "body { color: red; }")
+        self.write(os.path.join(self.static, "tolkien.png"), png(640, 480))
+        self.assertEqual(watcher.poll(), [
+            (PAGE, os.path.join("blog", "post.md")), (PAGE, "index.md"),
+            (STATIC, "index.css"), (STATIC, "tolkien.png"),
+        ])
+        new_css, new_png = watcher.asset_urls["/index.css"], watcher.asset_urls["/tolkien.png"]
+        self.assertNotEqual(new_css, old_css)
+        self.assertFalse(os.path.exists(self.public + old_css))
+        with open(self.public + new_css) as f:
+            self.assertEqual(f.read(), "body { color: red; }")
+        with open(os.path.join(self.public, "asset-manifest.json")) as f:
+            self.assertEqual(json.load(f), watcher.asset_urls)
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertEqual(f.read(), f'<link href="{new_css}"><div><p>'
+                             f'<img src="{new_png}" alt="Tolkien" width="640" height="480"></img></p></div>')
+
+        os.remove(os.path.join(self.static, "tolkien.png"))
+        watcher.poll()
+        self.assertNotIn("/tolkien.png", watcher.asset_urls)
+        self.assertNotIn("/tolkien.png", watcher.image_sizes)
+        self.assertFalse(os.path.exists(self.public + new_png))
+
+    def test_refingerprinted_static_files_are_recompressed(self):
+        # A one entry asset manifest is too small to shrink, so keep every .gz
+        options = {"manifest_path": os.path.join(self.tmp.name, "gzip-manifest.json"), "min_size": 0, "max_ratio": 10}
+        asset_urls, _ = fingerprint_assets(self.static, self.public, os.path.join(self.tmp.name, "fingerprints.json"))
+        compress_dir(self.public, **options)
+        old_css = asset_urls["/index.css"]
+        self.assertTrue(os.path.exists(self.public + old_css + ".gz"))
+        watcher = SiteWatcher(self.static, self.content, self.public, self.template, asset_urls, gzip=options)
+
+        self.write(os.path.join(self.static, "index.css"), "body { color: red; }")
+        watcher.poll()
+        new_css = watcher.asset_urls["/index.css"]
+        self.assertFalse(os.path.exists(self.public + old_css + ".gz"))
+        with gzip.open(self.public + new_css + ".gz", "rt") as f:
+            self.assertEqual(f.read(), "body { color: red; }")
+        with gzip.open(os.path.join(self.public, "asset-manifest.json.gz"), "rt") as f:
+            self.assertEqual(json.load(f), watcher.asset_urls)
+
+    def test_new_and_deleted_pages(self):
+        self.write(os.path.join(self.content, "new.md"), "New page")
+        self.assertEqual(self.watcher.poll(), [(PAGE, "new.md")])
+        self.assertTrue(os.path.exists(os.path.join(self.public, "new.html")))
+        os.remove(os.path.join(self.content, "new.md"))
+        self.assertEqual(self.watcher.poll(), [(PAGE, "new.md")])
+        self.assertFalse(os.path.exists(os.path.join(self.public, "new.html")))
+        self.assertEqual(self.watcher.graph.affected([os.path.join(self.content, "new.md")]), [])
+
+    def test_failed_rebuilds_are_reported_and_retried(self):
+        post = os.path.join(self.content, "blog", "post.md")
+        # Caught half written, in the middle of a multi-byte character
+        self.write(post, "caf\u00e9".encode()[:-1] + b"!")
+        self.write(os.path.join(self.content, "index.md"), "# New home")
+        self.assertEqual(self.watcher.poll(), [(PAGE, "index.md")])
+        failure = self.watcher.failures[(PAGE, os.path.join("blog", "post.md"))]
+        self.assertIsInstance(failure, UnicodeDecodeError)
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            reported = self.watcher.report_failures()
+            self.watcher.report_failures(reported)
+        self.assertEqual(output.getvalue().count("Failed to rebuild"), 1)
+
+        # Finished with the same size and mtime, so only the retry can pick it up
+        st = os.stat(post)
+        with open(post, "wb") as f:
+            f.write(b"cafe!")
+        os.utime(post, ns=(st.st_atime_ns, st.st_mtime_ns))
+        self.assertEqual(self.watcher.poll(), [(PAGE, os.path.join("blog", "post.md"))])
+        self.assertEqual(self.watcher.failures, {})
+        with open(os.path.join(self.public, "blog", "post.html")) as f:
+            self.assertEqual(f.read(), "<div><p>cafe!</p></div>")
+
+    def test_missing_template_fails_pages_until_it_is_back(self):
+        os.remove(self.template)
+        self.assertEqual(self.watcher.poll(), [])
+        self.assertEqual(sorted(self.watcher.failures), [(PAGE, os.path.join("blog", "post.md")), (PAGE, "index.md")])
+        self.write(self.template, "<main>{{ Content }}</main>")
+        self.assertEqual(self.watcher.poll(), [(PAGE, os.path.join("blog", "post.md")), (PAGE, "index.md")])
+        self.assertEqual(self.watcher.failures, {})
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertEqual(f.read(), '<main><div><h1 id="home">Home</h1></div></main>')
+
+    def test_run_keeps_polling_after_errors(self):
+        polls = []
+        def poll():
+            polls.append(1)
+            if len(polls) == 1:
+                raise FileNotFoundError("vanished mid-walk")
+            if len(polls) == 3:
+                raise KeyboardInterrupt
+            return []
+        with mock.patch.object(self.watcher, "poll", poll), contextlib.redirect_stdout(io.StringIO()) as output:
+            self.watcher.run(interval=0)
+        self.assertEqual(len(polls), 3)
+        self.assertIn("vanished mid-walk", output.getvalue())
+
+    def test_rebuilt_pages_are_recompressed(self):
+        options = {"manifest_path": os.path.join(self.tmp.name, "gzip-manifest.json"), "min_size": 0}
+        body = "\n\nwords " * 50
+        self.write(os.path.join(self.content, "index.md"), "# Hello" + body)
+        self.watcher.poll()
+        self.assertEqual(compress_dir(self.public, **options).compressed_files, 1)
+        watcher = SiteWatcher(self.static, self.content, self.public, self.template, gzip=options)
+        self.write(os.path.join(self.content, "index.md"), "# Changed" + body)
+        watcher.poll()
+        with gzip.open(os.path.join(self.public, "index.html.gz"), "rt") as f:
+            self.assertTrue(f.read().startswith('<div><h1 id="changed">Changed</h1>'))
+        os.remove(os.path.join(self.content, "index.md"))
+        watcher.poll()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.html.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -9,15 +9,23 @@ class TextType(Enum):
 	IMAGE = 'image'
 
 class TextNode():
-	def __init__(self, text, text_type, url=None):
+	__slots__ = ('text', 'text_type', 'url', 'children')
+
+	def __init__(self, text, text_type, url=None, children=None):
 		self.text = text
-		self.text_type = TextType(text_type)
+		# Only coerce when given a raw value, most callers already pass a TextType
+		self.text_type = text_type if text_type.__class__ is TextType else TextType(text_type)
 		self.url = url
+		# Inline nodes nested in a bold or italic span, None when its text is plain
+		self.children = children
 
 	def __eq__(self, node):
 		'''Check equality of two TextNodes'''
-		return self.text == node.text and self.text_type == node.text_type and self.url == node.url
+		return (self.text == node.text and self.text_type == node.text_type and self.url == node.url
+				and self.children == node.children)
 
 	def __repr__(self):
 		'''Return string representation of a TextNode'''
+		if self.children is not None:
+			return f"TextNode({self.text}, {self.text_type.value}, {self.url}, {self.children})"
 		return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
\ No newline at end of file
@@ -0,0 +1,273 @@
+import os
+import struct
+import time
+from collections import defaultdict
+from assets import copy_file, remove_file, walk_files
+from build import MARKDOWN_EXTENSION, build_page, output_path_for, set_page_assets
+from compress import compress_paths
+from fingerprint import ASSET_MANIFEST_NAME, asset_url, fingerprint_file, write_asset_manifest
+from imagesize import IMAGE_EXTENSIONS, read_image_size
+
+PAGE = 'page'
+STATIC = 'static'
+
+class DependencyGraph():
+    '''Maps input files to the outputs (targets) built from them
+
+    A target is a (kind, relative path) tuple such as ('page', 'blog/post.md')
+    or ('static', 'index.css'). Lookups in both directions are dict/set
+    operations, so finding what a change affects never scans the site.
+    '''
+    def __init__(self):
+        self.dependents = defaultdict(set)   # input path -> targets
+        self.dependencies = {}               # target -> input paths
+
+    def add(self, target, inputs):
+        '''Records that target is built from inputs, replacing any earlier inputs'''
+        self.remove(target)
+        self.dependencies[target] = set(inputs)
+        for path in inputs:
+            self.dependents[path].add(target)
+
+    def remove(self, target):
+        for path in self.dependencies.pop(target, ()):
+            self.dependents[path].discard(target)
+            if not self.dependents[path]:
+                del self.dependents[path]
+
+    def affected(self, changed_paths):
+        '''Returns the targets that depend on any of changed_paths, sorted'''
+        targets = set()
+        for path in changed_paths:
+            targets.update(self.dependents.get(path, ()))
+        return sorted(targets)
+
+def snapshot(root_dir):
+    '''Returns {absolute path: (size, mtime_ns)} for every file under root_dir
+
+    root_dir may also be a single file, such as a template.
+    '''
+    if os.path.isfile(root_dir):
+        st = os.stat(root_dir)
+        return {root_dir: (st.st_size, st.st_mtime_ns)}
+    if not os.path.exists(root_dir):
+        return {}
+    return {
+        os.path.join(root_dir, rel_path): (st.st_size, st.st_mtime_ns)
+        for rel_path, st in walk_files(root_dir)
+    }
+
+def changed_paths(old, new):
+    '''Returns the paths added, removed or modified between two snapshots'''
+    changed = {path for path, stat in new.items() if old.get(path) != stat}
+    changed.update(old.keys() - new.keys())
+    return changed
+
+class SiteWatcher():
+    '''Polls static/, content/ and the page template and rebuilds only what changed
+
+    Pages are rendered with asset_urls and image_sizes, as the initial build
+    left them. A changed static file is synced under its original name and,
+    when fingerprinting, copied to its new fingerprinted name; if that
+    changes its URL or image size, every page is rebuilt. gzip holds the
+    keyword arguments for compress_paths, which gives every rewritten
+    output a fresh .gz sibling. Targets whose rebuild failed are kept in
+    failures, mapped to their exception.
+    '''
+    def __init__(self, static_dir, content_dir, public_dir, template_path=None, asset_urls=None,
+                 image_sizes=None, gzip=None):
+        self.static_dir = os.path.abspath(static_dir)
+        self.content_dir = os.path.abspath(content_dir)
+        self.public_dir = os.path.abspath(public_dir)
+        self.template_path = os.path.abspath(template_path) if template_path else None
+        self.template_paths = [self.template_path] if template_path else []
+        self.asset_urls = asset_urls
+        self.image_sizes = image_sizes
+        self.gzip = gzip
+        self.graph = DependencyGraph()
+        self.failures = {}
+        self.snapshots = {}
+        for root_dir in self.watched_roots():
+            self.snapshots[root_dir] = snapshot(root_dir)
+            for path in self.snapshots[root_dir]:
+                self.track(path)
+
+    def watched_roots(self):
+        return [self.static_dir, self.content_dir] + self.template_paths
+
+    def target_for(self, path):
+        '''Returns the target built from a static or content file, or None'''
+        for kind, root_dir in ((STATIC, self.static_dir), (PAGE, self.content_dir)):
+            if path.startswith(root_dir + os.sep):
+                rel_path = os.path.relpath(path, root_dir)
+                if kind == PAGE and not rel_path.endswith(MARKDOWN_EXTENSION):
+                    return None
+                return kind, rel_path
+        return None
+
+    def inputs_for(self, target, path):
+        if target[0] == PAGE:
+            return [path] + self.template_paths
+        return [path]
+
+    def track(self, path):
+        target = self.target_for(path)
+        if target is not None:
+            self.graph.add(target, self.inputs_for(target, path))
+
+    def poll(self):
+        '''Checks every watched root once and rebuilds affected targets, returning them'''
+        # Snapshots are only replaced once all were taken, so a failed walk loses no changes
+        snapshots = {root_dir: snapshot(root_dir) for root_dir in self.watched_roots()}
+        changed = set()
+        for root_dir, new in snapshots.items():
+            changed.update(changed_paths(self.snapshots.get(root_dir, {}), new))
+        self.snapshots.update(snapshots)
+        return self.rebuild_changed(changed)
+
+    def rebuild_changed(self, changed):
+        '''Rebuilds the targets affected by a set of changed absolute paths, returning those rebuilt
+
+        A target whose rebuild raises, as it does for a page caught half
+        written or a template briefly missing while an editor saves it, is
+        recorded in failures and retried by every later call until it
+        builds, so its change is never lost. The other targets still build.
+        '''
+        for path in changed:
+            # New inputs need to be in the graph before asking what they affect
+            if path not in self.graph.dependents:
+                self.track(path)
+
+        targets = set(self.graph.affected(changed)).union(self.failures)
+        asset_urls, image_sizes = self.asset_urls, self.image_sizes
+        outputs = []
+        rebuilt = self.rebuild_targets((target for target in targets if target[0] == STATIC), outputs)
+        if self.asset_urls is not asset_urls or self.image_sizes is not image_sizes:
+            # Any page, or the template they are all rendered with, may refer to the changed asset
+            targets.update(target for target in self.graph.dependencies if target[0] == PAGE)
+        rebuilt += self.rebuild_targets((target for target in targets if target[0] == PAGE), outputs)
+        rebuilt.sort()
+        if self.gzip is not None and outputs:
+            compress_paths(self.public_dir, outputs, **self.gzip)
+        return rebuilt
+
+    def rebuild_targets(self, targets, outputs):
+        '''Rebuilds targets in order, adding the outputs they wrote or removed to outputs'''
+        rebuilt = []
+        for target in sorted(targets):
+            try:
+                outputs.extend(self.rebuild(target))
+            except Exception as e:
+                self.failures[target] = e
+            else:
+                self.failures.pop(target, None)
+                rebuilt.append(target)
+        return rebuilt
+
+    def output_for(self, target):
+        '''Returns the path of a target's output, relative to public_dir'''
+        kind, rel_path = target
+        return rel_path if kind == STATIC else output_path_for('', rel_path)
+
+    def rebuild(self, target):
+        '''Rebuilds one target, returning the paths relative to public_dir it wrote or removed'''
+        kind, rel_path = target
+        if kind == STATIC:
+            source_path = os.path.join(self.static_dir, rel_path)
+            if os.path.exists(source_path):
+                destination_path = os.path.join(self.public_dir, rel_path)
+                os.makedirs(os.path.dirname(destination_path), exist_ok=True)
+                copy_file(source_path, destination_path)
+            else:
+                remove_file(self.public_dir, rel_path)
+                self.graph.remove(target)
+            return [rel_path] + self.update_assets(rel_path)
+        else:
+            if os.path.exists(os.path.join(self.content_dir, rel_path)):
+                set_page_assets(self.asset_urls, self.image_sizes)
+                build_page(self.content_dir, self.public_dir, rel_path, template_path=self.template_path)
+            else:
+                remove_file(self.public_dir, self.output_for(target))
+                self.graph.remove(target)
+            return [self.output_for(target)]
+
+    def update_assets(self, rel_path):
+        '''Refreshes the fingerprint and image size of a changed or deleted static file
+
+        asset_urls and image_sizes are replaced rather than updated in place
+        when an entry changes, since rewritten templates are memoized per
+        mapping. A superseded fingerprinted copy is removed. Returns the
+        paths relative to public_dir that were written or removed, such as
+        the fingerprinted copies and the asset manifest.
+        '''
+        source_path = os.path.join(self.static_dir, rel_path)
+        exists = os.path.exists(source_path)
+        url = asset_url(rel_path)
+        outputs = []
+        if self.asset_urls is not None:
+            old_url = self.asset_urls.get(url)
+            new_path = fingerprint_file(self.static_dir, self.public_dir, rel_path) if exists else None
+            new_url = asset_url(new_path) if new_path is not None else None
+            if new_url != old_url:
+                asset_urls = dict(self.asset_urls)
+                if old_url is not None:
+                    old_path = old_url[1:].replace('/', os.sep)
+                    remove_file(self.public_dir, old_path)
+                    outputs.append(old_path)
+                    del asset_urls[url]
+                if new_url is not None:
+                    outputs.append(new_path)
+                    asset_urls[url] = new_url
+                write_asset_manifest(self.public_dir, asset_urls)
+                outputs.append(ASSET_MANIFEST_NAME)
+                self.asset_urls = asset_urls
+        if self.image_sizes is not None and rel_path.lower().endswith(IMAGE_EXTENSIONS):
+            size = None
+            if exists:
+                try:
+                    size = read_image_size(source_path)
+                except (OSError, struct.error):
+                    pass
+            if size != self.image_sizes.get(url):
+                image_sizes = dict(self.image_sizes)
+                if size is None:
+                    del image_sizes[url]
+                else:
+                    image_sizes[url] = size
+                self.image_sizes = image_sizes
+        return outputs
+
+    def report_failures(self, reported=None):
+        '''Prints the failures not in reported, a {target: message} dict, and returns the current ones'''
+        current = {target: f'{type(e).__name__}: {e}' for target, e in self.failures.items()}
+        for target, message in current.items():
+            if (reported or {}).get(target) != message:
+                print(f"Failed to rebuild {target[1]}: {message}")
+        return current
+
+    def run(self, interval=0.25):
+        '''Polls forever, printing what each change rebuilt and how long it took
+
+        Errors are printed and polling goes on; failed targets are retried on
+        every poll, but each failure is only printed once.
+        '''
+        print(f"Watching {', '.join(self.watched_roots())} (Ctrl+C to stop)")
+        reported = {}
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    targets = self.poll()
+                except Exception as e:
+                    # Such as a file vanishing mid-walk; the next poll sees the same changes again
+                    print(f"Watch poll failed: {type(e).__name__}: {e}")
+                    targets = []
+                if targets:
+                    elapsed = (time.perf_counter() - start) * 1000
+                    print(f"Rebuilt {len(targets)} outputs in {elapsed:.0f} ms: "
+                          + ', '.join(rel_path for _, rel_path in targets[:5])
+                          + (' ...' if len(targets) > 5 else ''))
+                reported = self.report_failures(reported)
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass